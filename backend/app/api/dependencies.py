@@ -1,8 +1,9 @@
 """API dependencies."""
 
 from typing import Optional
-from fastapi import Header, HTTPException
-from ...core.kerag_client import client
+from fastapi import Header, Request, Response
+from ..core.kerag_client import client
+from ..core.sessions import sessions, NavigationSession, SESSION_COOKIE, SESSION_HEADER
 
 
 async def verify_api_key(x_api_key: Optional[str] = Header(None)):
@@ -16,3 +17,13 @@ async def verify_api_key(x_api_key: Optional[str] = Header(None)):
 def get_kerag_client():
     """Get KERAG client instance."""
     return client
+
+
+def get_navigation_session(request: Request, response: Response) -> NavigationSession:
+    """Get the caller's navigation session from the session header or cookie."""
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    session, _ = sessions.get_or_create(session_id)
+    if request.cookies.get(SESSION_COOKIE) != session.id:
+        response.set_cookie(SESSION_COOKIE, session.id, httponly=True, samesite="lax")
+    response.headers[SESSION_HEADER] = session.id
+    return session
@@ -0,0 +1,43 @@
+"""Slow-request and profiling endpoints."""
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from ...core.profiling import (
+    AUTO_PROFILE_AFTER, PROFILE_TOKEN, SAMPLE_INTERVAL, is_admin, recent_profiles, slow_requests
+)
+
+
+def require_admin(request: Request):
+    """With ``KERAG_PROFILE_TOKEN`` set, only requests carrying it may read profiles."""
+    if PROFILE_TOKEN and not is_admin(request.scope):
+        raise HTTPException(status_code=403, detail="Profiling token required")
+
+
+router = APIRouter(prefix="/debug", tags=["debug"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/slow")
+async def get_slow_requests():
+    """Get the slowest recent requests of this worker, slowest first."""
+    return {
+        "success": True,
+        "data": slow_requests.entries(),
+        "metadata": {
+            **slow_requests.stats(),
+            "on_demand_profiling": bool(PROFILE_TOKEN),
+            "auto_profile_after_ms": AUTO_PROFILE_AFTER * 1000,
+            "sample_interval_ms": SAMPLE_INTERVAL * 1000,
+        }
+    }
+
+
+@router.get("/profiles/{request_id}")
+async def get_profile(request_id: str):
+    """Get the profile of a request profiled on demand."""
+    entry = recent_profiles.get(request_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"No profile for request: {request_id}")
+    return {
+        "success": True,
+        "data": entry,
+        "metadata": {}
+    }
@@ -0,0 +1,50 @@
+"""Server-Sent Events stream of knowledge base changes."""
+
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from ...core.cluster import cluster
+from ...core.events import corpus_state, event_bus, format_event
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+# How often an idle stream checks for other workers' changes, and sends a keep-alive
+CATCH_UP_SECONDS = 1.0
+KEEPALIVE_SECONDS = 15.0
+
+
+@router.get("")
+async def stream_events():
+    """Stream change events (``text/event-stream``).
+
+    The first event is the current ``corpus`` state; after that, a
+    ``corpus`` event follows every change with the modules that changed
+    (their generation was bumped) or were removed. Clients reconnecting
+    compare the first event's module generations with the ones they know.
+    """
+    queue = event_bus.subscribe()
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            await cluster.catch_up()
+            yield format_event(corpus_state())
+            idle = 0.0
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=CATCH_UP_SECONDS)
+                except asyncio.TimeoutError:
+                    # Replaying other workers' module changes publishes their events here
+                    await cluster.catch_up()
+                    idle += CATCH_UP_SECONDS
+                    if idle >= KEEPALIVE_SECONDS:
+                        idle = 0.0
+                        yield ": keep-alive\n\n"
+                    continue
+                idle = 0.0
+                yield format_event(event)
+        finally:
+            event_bus.unsubscribe(queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
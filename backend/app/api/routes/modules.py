@@ -1,19 +1,31 @@
 """Module management endpoints."""
 
+import asyncio
+import logging
 import traceback
-import sys
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
 from ...core.kerag_client import client
+from ...core.worker_pool import pools, PoolSaturatedError
+from ...core.corpus import corpus
+from ...core.cluster import cluster
+from ...core.jobs import jobs
+from ...core.node_views import etag_matches, view_cache
+from ...core.skeleton import DEFAULT_DEPTH as SKELETON_DEPTH, render_skeleton, skeleton_key
 
 
 router = APIRouter(prefix="/modules", tags=["modules"])
+logger = logging.getLogger(__name__)
 
 
-def handle_exception(e: Exception, endpoint_name: str, status_code: int = 500) -> HTTPException:
+def handle_exception(e: Exception, endpoint_name: str, status_code: int = 500) -> Exception:
     """统一错误处理函数，打印详细错误并返回HTTPException"""
+    if isinstance(e, PoolSaturatedError):
+        # Left to the app-wide handler, which sheds load with 503
+        return e
     error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-    print(f"\n{'='*80}\n[ERROR] {endpoint_name} ({status_code}):\n{error_detail}\n{'='*80}\n", file=sys.stderr)
+    logger.error("%s (%d):\n%s", endpoint_name, status_code, error_detail)
     return HTTPException(status_code=status_code, detail=error_detail)
 
 
@@ -21,7 +33,7 @@ def handle_exception(e: Exception, endpoint_name: str, status_code: int = 500) -
 async def get_all_modules():
     """Get all modules."""
     try:
-        result = client.api.get_all_modules()
+        result = await client.call("get_all_modules")
         if not result.get("success"):
             raise handle_exception(Exception(result.get("error", "Failed to get modules")), "/modules", 500)
 
@@ -34,7 +46,7 @@ async def get_all_modules():
 async def get_loaded_roots():
     """Get all loaded module root nodes."""
     try:
-        result = client.api.get_loaded_roots()
+        result = await client.call("get_loaded_roots")
         if not result.get("success"):
              raise handle_exception(Exception(result.get("error", "Failed to get roots")), "/modules/roots", 500)
 
@@ -43,47 +55,134 @@ async def get_loaded_roots():
         raise handle_exception(e, "/modules/roots")
 
 
-@router.post("/load")
-async def load_module(module_name: str = Query(..., description="Name of the module to load")):
-    """Load a module."""
-    try:
-        result = client.api.load_module(module_name)
-        if not result.get("success"):
-            error_msg = result.get("error", "Unknown error")
-            raise handle_exception(Exception(error_msg), "/modules/load", 400)
+@router.get("/skeleton")
+async def get_module_skeleton(
+    request: Request,
+    module_name: str = Query(..., description="Name of a loaded module"),
+    depth: int = Query(SKELETON_DEPTH, ge=0, le=256, description="Deepest level to include (roots are 0)")
+):
+    """Get a loaded module's node hierarchy as flat parallel arrays, without content."""
+    snapshot = corpus.snapshot()
+    tree = snapshot.modules.get(module_name)
+    if tree is None:
+        raise HTTPException(status_code=404, detail=f"Module not loaded: {module_name}")
 
-        return result
-    except HTTPException:
-        raise
+    key = skeleton_key(module_name, depth, tree.generation)
+    try:
+        view = view_cache.get(key)
+        if view is None:
+            view = await pools.get("default").run(render_skeleton, tree, depth)
+            view_cache.put(key, view, len(view.body))
+
+        headers = {"ETag": view.etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), view.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=view.body, media_type="application/json", headers=headers)
     except Exception as e:
-        raise handle_exception(e, "/modules/load")
+        raise handle_exception(e, "/modules/skeleton")
 
 
-@router.delete("/unload")
-async def unload_module(module_name: str = Query(..., description="Name of the module to unload")):
-    """Unload a module."""
-    try:
-        result = client.api.unload_module(module_name)
-        if not result.get("success"):
-            error_msg = result.get("error", "Unknown error")
-            raise handle_exception(Exception(error_msg), "/modules/unload", 400)
+class BulkLoadRequest(BaseModel):
+    """Modules to load in one job."""
+    modules: List[str] = Field(..., min_length=1)
 
-        return result
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise handle_exception(e, "/modules/unload")
+
+BACKGROUND_DESCRIPTION = "Return the job at once; poll /modules/jobs/{job_id} for progress"
+
+
+def _job_response(job) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "data": job.to_dict(),
+        "metadata": {"job_id": job.id}
+    }
+
+
+async def _job_result(job, endpoint_name: str, module_name: Optional[str] = None) -> Dict[str, Any]:
+    """Wait for ``job`` and answer with KERAG's result, as before jobs existed (400 if it failed)."""
+    # Shielded, so a client that goes away does not cancel the job
+    await asyncio.shield(job.task)
+    if job.state == "failed":
+        error_msg = "; ".join(job.errors.values()) or "Unknown error"
+        raise handle_exception(Exception(error_msg), endpoint_name, 400)
+    return {
+        "success": True,
+        "data": job.results.get(module_name) if module_name else job.results,
+        "metadata": {"job_id": job.id, "errors": job.errors}
+    }
+
+
+@router.post("/load")
+async def load_module(
+    module_name: str = Query(..., description="Name of the module to load"),
+    background: bool = Query(False, description=BACKGROUND_DESCRIPTION)
+):
+    """Load a module; with ``background``, start loading it and return the job."""
+    job = jobs.submit("load", [module_name])
+    if background:
+        return _job_response(job)
+    return await _job_result(job, "/modules/load", module_name)
+
+
+@router.post("/load/bulk")
+async def load_modules(
+    request: BulkLoadRequest,
+    background: bool = Query(False, description=BACKGROUND_DESCRIPTION)
+):
+    """Load several modules, indexing each while the next one is parsed.
+
+    ``data`` maps each loaded module to KERAG's result and
+    ``metadata.errors`` each failed one to its error.
+    """
+    # Keep the requested order, without duplicates
+    job = jobs.submit("load", list(dict.fromkeys(request.modules)))
+    if background:
+        return _job_response(job)
+    return await _job_result(job, "/modules/load/bulk")
+
+
+@router.delete("/unload")
+async def unload_module(
+    module_name: str = Query(..., description="Name of the module to unload"),
+    background: bool = Query(False, description=BACKGROUND_DESCRIPTION)
+):
+    """Unload a module; with ``background``, start unloading it and return the job."""
+    job = jobs.submit("unload", [module_name])
+    if background:
+        return _job_response(job)
+    return await _job_result(job, "/modules/unload", module_name)
+
+
+@router.get("/jobs")
+async def get_module_jobs():
+    """Get recent module load/unload jobs, newest first."""
+    return {
+        "success": True,
+        "data": [job.to_dict() for job in jobs.recent()],
+        "metadata": {}
+    }
+
+
+@router.get("/jobs/{job_id}")
+async def get_module_job(job_id: str):
+    """Get the state and progress of a module job."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return _job_response(job)
 
 
 @router.post("/purge")
 async def purge_modules():
     """Unload all modules."""
     try:
-        result = client.api.purge()
+        result = await cluster.call("purge")
         if not result.get("success"):
             error_msg = result.get("error", "Unknown error")
             raise handle_exception(Exception(error_msg), "/modules/purge", 400)
 
+        # Update the search indexes for the changed modules
+        await client.run(corpus.sync, pool="modules")
         return result
     except HTTPException:
         raise
@@ -1,22 +1,34 @@
 """Node navigation and content endpoints."""
 
+import asyncio
 import traceback
-import sys
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
 from urllib.parse import unquote
 import logging
+from ...core.ancestry import breadcrumb as build_breadcrumb, lookup as lookup_ancestry
 from ...core.kerag_client import client
+from ...core.worker_pool import pools, PoolSaturatedError
+from ...core.corpus import corpus
+from ...core.encoding import EncodedResponse, loads
+from ...core.node_views import NodeViewError, etag_matches, render_view, view_cache, view_key
+from ...core.resolver import resolve_target, resolve_with
+from ...core.snapshots import indexes_loaded
+from ...core.sessions import NavigationSession, read_node
+from ..dependencies import get_navigation_session
 
 
 router = APIRouter(prefix="/nodes", tags=["nodes"])
 
 
-def handle_exception(e: Exception, endpoint_name: str) -> HTTPException:
+def handle_exception(e: Exception, endpoint_name: str) -> Exception:
     """统一错误处理函数，打印详细错误并返回HTTPException"""
+    if isinstance(e, PoolSaturatedError):
+        # Left to the app-wide handler, which sheds load with 503
+        return e
     error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-    print(f"\n{'='*80}\n[ERROR] {endpoint_name} - Exception:\n{error_detail}\n{'='*80}\n", file=sys.stderr)
+    logger.error("%s - Exception:\n%s", endpoint_name, error_detail)
     return HTTPException(status_code=500, detail=error_detail)
 
 # 配置日志
@@ -27,16 +39,66 @@ class NavigateRequest(BaseModel):
     current_id: Optional[str] = None
 
 
+MAX_BATCH_ITEMS = 500
+
+
+class BatchItem(BaseModel):
+    """One operation of a batch request."""
+    node_id: str
+    op: str = Field(..., pattern="^(children|preview_children|detail)$")
+    node_type: str = Field("all", pattern="^(all|section|content)$")
+    sort_by: str = Field("order", pattern="^(order|title|label)$")
+    depth: int = Field(1, ge=0, le=5)
+    include_content: bool = True
+    include_see_also: bool = True
+    format: str = Field("text", pattern="^(text|markdown|tree|json)$")
+    show_metadata: bool = False
+    display_mode: str = Field("none", pattern="^(none|label|full_id)$")
+
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+
+
+class AncestryBatchRequest(BaseModel):
+    """Nodes to describe together, e.g. a page of search results."""
+    node_ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+    ancestor: Optional[str] = None
+
+
+class ResolveBatchRequest(BaseModel):
+    """Targets to resolve together, e.g. every link of a rendered page."""
+    targets: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+
+
 def decode_node_id(encoded_id: str) -> str:
     """Decode URL-encoded node ID, preserving original characters like :: and /"""
     return unquote(encoded_id)
 
 
+def _node_result(api, node_id: str) -> dict:
+    """Build a navigation response for ``node_id`` with its breadcrumb."""
+    node = read_node(api, node_id)
+    if node is None:
+        return {"success": False, "data": None, "error": f"Node not found: {node_id}", "metadata": {}}
+    return {
+        "success": True,
+        "data": node,
+        "metadata": {"breadcrumb": build_breadcrumb(api, node_id)}
+    }
+
+
 @router.get("/current")
-async def get_current_node():
+async def get_current_node(session: NavigationSession = Depends(get_navigation_session)):
     """Get current node."""
+    def current(api):
+        with session.lock:
+            session.ensure_started()
+            node_id = session.current_id
+        return _node_result(api, node_id)
+
     try:
-        result = client.api.get_current_node()
+        result = await client.run(current)
         if not result.get("success"):
             raise HTTPException(status_code=404, detail=result.get("error", "No current node"))
 
@@ -44,39 +106,90 @@ async def get_current_node():
     except HTTPException:
         raise
     except Exception as e:
-        error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-        logger.error(f"Error in get_current_node: {error_detail}")
-        raise HTTPException(status_code=500, detail=error_detail)
+        raise handle_exception(e, "get_current_node")
 
 
 @router.post("/navigate")
-async def navigate_to(target: str = Query(..., description="Target node ID"), current_id: Optional[str] = None):
+async def navigate_to(
+    target: str = Query(..., description="Target node ID"),
+    current_id: Optional[str] = None,
+    session: NavigationSession = Depends(get_navigation_session)
+):
     """Navigate to a node."""
-    try:
-        if current_id:
-            # 如果有 current_id，先切换到该节点（此处可能需要处理返回结果，但保持逻辑简单）
-            client.api.navigate_to(current_id)
+    def navigate(api):
+        resolved = resolve_target(corpus.snapshot(), target) or api.resolve_target_id(target)
+        data = (resolved.get("data") or {}) if resolved.get("success") else {}
+        node_id = data.get("node_id") or data.get("id")
+        if not node_id:
+            candidates = data.get("candidates") or []
+            error = f"Ambiguous target: {target}" if candidates else resolved.get("error", "Navigation failed")
+            return {"success": False, "data": None, "error": error, "metadata": {"candidates": candidates}}
+
+        node = read_node(api, node_id)
+        if node is None:
+            return None
+
+        with session.lock:
+            session.ensure_started(current_id)
+            if current_id:
+                session.visit(current_id)
+            already_at_target = node_id == session.current_id
+            session.visit(node_id)
+
+        if already_at_target:
+            return {"success": True, "data": {**node, "already_at_target": True}, "metadata": {}}
+        return {
+            "success": True,
+            "data": node,
+            "metadata": {"breadcrumb": build_breadcrumb(api, node_id)}
+        }
 
-        result = client.api.navigate_to(target)
-
-        if not result.get("success"):
-            error_msg = result.get("error", "Navigation failed")
+    try:
+        result = await client.run(navigate)
+        module = target.partition("::")[0] if "::" in target else ""
+        if (result is None or not result.get("success")) and module and module not in corpus.snapshot().modules:
+            # Loading is a background job of its own; the client starts it and navigates again
+            raise HTTPException(
+                status_code=404,
+                detail=f"Module not loaded: {module}. Load it with POST /api/modules/load?module_name={module} "
+                       f"and navigate again once the job is done"
+            )
+
+        if result is None or not result.get("success"):
+            error_msg = (result or {}).get("error", "Navigation failed")
             raise HTTPException(status_code=400, detail=error_msg)
 
         return result
     except HTTPException:
         raise
     except Exception as e:
-        error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-        logger.error(f"Error in navigate_to: {error_detail}")
-        raise HTTPException(status_code=500, detail=error_detail)
+        raise handle_exception(e, "navigate_to")
+
+
+def _history_move(session: NavigationSession, steps: int):
+    """Build a worker-pool callable that moves ``steps`` through session history."""
+    def move(api):
+        with session.lock:
+            session.ensure_started()
+            target = max(0, min(len(session.history) - 1, session.cursor + steps))
+            if target == session.cursor:
+                direction = "back" if steps < 0 else "forward"
+                return {"success": False, "data": None, "error": f"Cannot go {direction}", "metadata": {}}
+            session.move(target - session.cursor)
+            node_id = session.current_id
+        return _node_result(api, node_id)
+
+    return move
 
 
 @router.post("/back")
-async def go_back(steps: int = Query(1, ge=1)):
+async def go_back(
+    steps: int = Query(1, ge=1),
+    session: NavigationSession = Depends(get_navigation_session)
+):
     """Go back in history."""
     try:
-        result = client.api.navigate_back(steps)
+        result = await client.run(_history_move(session, -steps))
 
         if not result.get("success"):
             raise HTTPException(status_code=400, detail=result.get("error"))
@@ -85,16 +198,17 @@ async def go_back(steps: int = Query(1, ge=1)):
     except HTTPException:
         raise
     except Exception as e:
-        error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-        logger.error(f"Error in go_back: {error_detail}")
-        raise HTTPException(status_code=500, detail=error_detail)
+        raise handle_exception(e, "go_back")
 
 
 @router.post("/forward")
-async def go_forward(steps: int = Query(1, ge=1)):
+async def go_forward(
+    steps: int = Query(1, ge=1),
+    session: NavigationSession = Depends(get_navigation_session)
+):
     """Go forward in history."""
     try:
-        result = client.api.navigate_forward(steps)
+        result = await client.run(_history_move(session, steps))
 
         if not result.get("success"):
             raise HTTPException(status_code=400, detail=result.get("error"))
@@ -103,16 +217,34 @@ async def go_forward(steps: int = Query(1, ge=1)):
     except HTTPException:
         raise
     except Exception as e:
-        error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-        logger.error(f"Error in go_forward: {error_detail}")
-        raise HTTPException(status_code=500, detail=error_detail)
+        raise handle_exception(e, "go_forward")
 
 
 @router.post("/up")
-async def go_up(levels: int = Query(1, ge=1)):
+async def go_up(
+    levels: int = Query(1, ge=1),
+    session: NavigationSession = Depends(get_navigation_session)
+):
     """Move up in hierarchy."""
+    def up(api):
+        with session.lock:
+            session.ensure_started()
+            start_id = session.current_id
+        node_id = start_id
+        for _ in range(levels):
+            node = read_node(api, node_id)
+            parent_id = node.get("parent_id") if node else None
+            if not parent_id:
+                break
+            node_id = parent_id
+        if node_id == start_id:
+            return {"success": False, "data": None, "error": "Already at the top level", "metadata": {}}
+        with session.lock:
+            session.visit(node_id)
+        return _node_result(api, node_id)
+
     try:
-        result = client.api.up(levels)
+        result = await client.run(up)
 
         if not result.get("success"):
             raise HTTPException(status_code=400, detail=result.get("error"))
@@ -121,29 +253,70 @@ async def go_up(levels: int = Query(1, ge=1)):
     except HTTPException:
         raise
     except Exception as e:
-        error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-        logger.error(f"Error in go_up: {error_detail}")
-        raise HTTPException(status_code=500, detail=error_detail)
+        raise handle_exception(e, "go_up")
+
+
+async def resolve_targets(targets: List[str]) -> List[Dict[str, Any]]:
+    """KERAG-shaped resolution results from the resolution index, asking KERAG about the rest in one call."""
+    if not corpus.ready:
+        return await client.run(lambda api: [api.resolve_target_id(target) for target in targets])
+    snapshot = corpus.snapshot()
+    results: List[Optional[Dict[str, Any]]] = [None] * len(targets)
+    if indexes_loaded(snapshot.modules.values(), "resolve"):
+        # A few dict lookups each: no need for the pool
+        results = [resolve_target(snapshot, target) for target in targets]
+    missing = [target for target, result in zip(targets, results) if result is None]
+    if missing:
+        fetched = iter(await client.run(lambda api: resolve_with(api, snapshot, missing)))
+        results = [result or next(fetched) for result in results]
+    return results
 
 
 @router.get("/resolve")
 async def resolve_node_id(target: str = Query(..., description="Shorthand or index to resolve")):
     """Resolve shorthand ID to full node ID."""
     try:
-        result = client.api.resolve_target_id(target)
+        result = (await resolve_targets([target]))[0]
         if not result.get("success"):
              raise HTTPException(status_code=400, detail=result.get("error", "Resolution failed"))
         return result
     except HTTPException:
         raise
     except Exception as e:
-        error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-        logger.error(f"Error in resolve_node_id: {error_detail}")
-        raise HTTPException(status_code=500, detail=error_detail)
+        raise handle_exception(e, "resolve_node_id")
+
+
+@router.post("/resolve/batch")
+async def resolve_node_ids(request: ResolveBatchRequest):
+    """Resolve several shorthand IDs in one call.
+
+    ``data`` has one ``{"target", "success", "data", "error"}`` entry per
+    target, in request order; failures do not fail the batch.
+    """
+    try:
+        targets = request.targets
+        results = await resolve_targets(targets)
+        items = [
+            {
+                "target": target,
+                "success": bool(result.get("success")),
+                "data": result.get("data"),
+                "error": result.get("error"),
+            }
+            for target, result in zip(targets, results)
+        ]
+        return {
+            "success": True,
+            "data": items,
+            "metadata": {"count": len(items), "resolved": sum(1 for item in items if item["success"])}
+        }
+    except Exception as e:
+        raise handle_exception(e, "resolve_node_ids")
 
 
 @router.get("/detail")
 async def get_node(
+    request: Request,
     node_id: str = Query(..., description="Node ID"),
     depth: int = Query(1, ge=0, le=5),
     include_content: bool = Query(True),
@@ -152,29 +325,30 @@ async def get_node(
     show_metadata: bool = Query(False),
     display_mode: str = Query("none", pattern="^(none|label|full_id)$")
 ):
-    """Get node details."""
+    """Get node details.
+
+    Rendered views are cached per rendering option and module generation and
+    carry a strong ETag; a matching If-None-Match gets 304 Not Modified.
+    """
     full_node_id = decode_node_id(node_id)
+    key = view_key(full_node_id, depth, include_content, include_see_also, format,
+                   show_metadata, display_mode, corpus.generation_of(full_node_id))
+    if_none_match = request.headers.get("if-none-match")
     try:
-        result = client.api.get_node_view(
-            node_id=full_node_id,
-            depth=depth,
-            include_content=include_content,
-            include_see_also=include_see_also,
-            format=format,
-            show_metadata=show_metadata,
-            display_mode=display_mode
-        )
-
-        if not result.get("success"):
-            raise HTTPException(status_code=404, detail=result.get("error"))
-
-        return result
+        view = view_cache.get(key)
+        if view is None:
+            view = await client.run(lambda api: render_view(api, key))
+
+        headers = {"ETag": view.etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, view.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=view.body, media_type="application/json", headers=headers)
+    except NodeViewError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
-        error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-        logger.error(f"Error in get_node: {error_detail}")
-        raise HTTPException(status_code=500, detail=error_detail)
+        raise handle_exception(e, "get_node")
 
 
 @router.get("/children")
@@ -184,12 +358,10 @@ async def get_children(
     """Get children of a node."""
     full_node_id = decode_node_id(node_id)
     try:
-        result = client.api.get_children(full_node_id)
-        return result
+        result = await client.call("get_children", full_node_id)
+        return EncodedResponse(result)
     except Exception as e:
-        error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-        logger.error(f"Error in get_children: {error_detail}")
-        raise HTTPException(status_code=500, detail=error_detail)
+        raise handle_exception(e, "get_children")
 
 
 @router.get("/preview_children")
@@ -201,37 +373,157 @@ async def preview_children(
     """Get children of a node with preview information."""
     full_node_id = decode_node_id(node_id)
     try:
-        result = client.api.preview_children(full_node_id, node_type, sort_by)
-        return result
+        result = await client.call("preview_children", full_node_id, node_type, sort_by)
+        return EncodedResponse(result)
     except Exception as e:
-        error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-        logger.error(f"Error in preview_children: {error_detail}")
-        raise HTTPException(status_code=500, detail=error_detail)
+        raise handle_exception(e, "preview_children")
+
+
+def _run_batch_item(api, item: BatchItem) -> dict:
+    """Execute one batch operation, turning failures into a per-item error."""
+    node_id = decode_node_id(item.node_id)
+    try:
+        if item.op == "detail":
+            key = view_key(node_id, item.depth, item.include_content, item.include_see_also,
+                           item.format, item.show_metadata, item.display_mode, corpus.generation_of(node_id))
+            view = view_cache.get(key) or render_view(api, key)
+            result = loads(view.body)
+        elif item.op == "children":
+            result = api.get_children(node_id)
+        else:
+            result = api.preview_children(node_id, item.node_type, item.sort_by)
+    except NodeViewError as e:
+        result = {"success": False, "error": str(e)}
+    except Exception as e:
+        logger.error("Error in batch %s for %s: %s", item.op, node_id, e)
+        result = {"success": False, "error": str(e)}
+
+    return {
+        "node_id": item.node_id,
+        "op": item.op,
+        "success": bool(result.get("success")),
+        "data": result.get("data"),
+        "error": result.get("error"),
+    }
+
+
+@router.post("/batch")
+async def batch(request: BatchRequest):
+    """Run many children, preview_children and detail operations in one call.
+
+    Items are spread over the worker pool and run concurrently. Each item
+    reports its own success or error; one failure does not fail the batch.
+    """
+    items = request.items
+    workers = min(pools.get("default").max_workers, len(items))
+    chunks = [list(range(i, len(items), workers)) for i in range(workers)]
+
+    def run_chunk(indices):
+        return lambda api: [_run_batch_item(api, items[i]) for i in indices]
+
+    outcomes = await asyncio.gather(
+        *(client.run(run_chunk(indices)) for indices in chunks),
+        return_exceptions=True
+    )
+
+    results: List[Optional[dict]] = [None] * len(items)
+    for indices, outcome in zip(chunks, outcomes):
+        for position, i in enumerate(indices):
+            if isinstance(outcome, BaseException):
+                results[i] = {
+                    "node_id": items[i].node_id,
+                    "op": items[i].op,
+                    "success": False,
+                    "data": None,
+                    "error": str(outcome),
+                }
+            else:
+                results[i] = outcome[position]
+
+    failed = sum(1 for result in results if not result["success"])
+    return EncodedResponse({
+        "success": True,
+        "data": results,
+        "metadata": {"count": len(results), "failed": failed}
+    })
+
+
+def _current_id(session: NavigationSession) -> str:
+    """The session's current node, starting the session if needed (takes its lock; run on a pool)."""
+    with session.lock:
+        session.ensure_started()
+        return session.current_id
+
+
+async def ancestry_of(node_ids: List[str], ancestor: Optional[str] = None) -> List[Optional[Dict[str, Any]]]:
+    """Breadcrumbs and depths from the skeleton index; KERAG is only asked about what it cannot answer."""
+    snapshot = corpus.snapshot()
+    if corpus.ready and indexes_loaded(snapshot.modules.values(), "skeleton"):
+        entries = lookup_ancestry(snapshot, node_ids, ancestor)
+        if entries is not None:
+            return entries
+    return await client.run(lambda api: lookup_ancestry(snapshot, node_ids, ancestor, api))
 
 
 @router.get("/breadcrumb")
 async def get_breadcrumb(
-    node_id: Optional[str] = Query(None, description="Node ID (optional)")
+    node_id: Optional[str] = Query(None, description="Node ID (optional)"),
+    session: NavigationSession = Depends(get_navigation_session)
 ):
     """Get breadcrumb path."""
     try:
-        # 如果提供了 node_id，API 目前不支持获取非当前位置的 breadcrumb，
-        # 除非先导航过去。由于 API 有状态，我们保持现状。
-        result = client.api.get_breadcrumb()
-        return result
+        if node_id:
+            target = decode_node_id(node_id)
+        else:
+            target = await pools.get("default").run(_current_id, session)
+        entry = (await ancestry_of([target]))[0] if target else None
+        items = entry["breadcrumb"] if entry else []
+        return {"success": True, "data": items, "metadata": {"depth": entry["depth"] if entry else None}}
     except Exception as e:
-        error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-        logger.error(f"Error in get_breadcrumb: {error_detail}")
-        raise HTTPException(status_code=500, detail=error_detail)
+        raise handle_exception(e, "get_breadcrumb")
+
+
+@router.get("/ancestry")
+async def get_ancestry(
+    node_id: str = Query(..., description="Node ID"),
+    ancestor: Optional[str] = Query(None, description="Node ID to test as an ancestor of node_id")
+):
+    """Breadcrumb and depth of any node, and optionally whether ``ancestor`` is above it."""
+    try:
+        entry = (await ancestry_of([decode_node_id(node_id)], ancestor))[0]
+        if entry is None:
+            raise HTTPException(status_code=404, detail=f"Node not found: {node_id}")
+        return {"success": True, "data": entry, "metadata": {}}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise handle_exception(e, "get_ancestry")
+
+
+@router.post("/ancestry/batch")
+async def get_ancestry_batch(request: AncestryBatchRequest):
+    """Breadcrumbs and depths of several nodes; unknown nodes get null."""
+    try:
+        entries = await ancestry_of(request.node_ids, request.ancestor)
+        return {
+            "success": True,
+            "data": entries,
+            "metadata": {"count": len(entries), "found": sum(1 for entry in entries if entry is not None)}
+        }
+    except Exception as e:
+        raise handle_exception(e, "get_ancestry_batch")
 
 
 @router.get("/history")
-async def get_history():
+async def get_history(session: NavigationSession = Depends(get_navigation_session)):
     """Get navigation history."""
+    def history():
+        with session.lock:
+            session.ensure_started()
+            return session.history_data()
+
     try:
-        result = client.api.get_history()
-        return result
+        data = await pools.get("default").run(history)
+        return {"success": True, "data": data, "metadata": {}}
     except Exception as e:
-        error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-        logger.error(f"Error in get_history: {error_detail}")
-        raise HTTPException(status_code=500, detail=error_detail)
+        raise handle_exception(e, "get_history")
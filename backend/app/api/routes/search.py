@@ -1,48 +1,200 @@
 """Search endpoints."""
 
+import json
+import logging
+import re
+import threading
 import traceback
-import sys
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from ...core.kerag_client import client
+from ...core.worker_pool import pools, PoolSaturatedError
+from ...core.corpus import corpus
+from ...core.encoding import EncodedResponse
+from ...core.regex_sandbox import SearchBudget
+from ...core.search_index import build_matcher, cached_search, iter_matches, next_batch, search_result
+from ...core.snapshots import indexes_loaded
+from ...core.suggest import DEFAULT_LIMIT as SUGGEST_LIMIT, MAX_LIMIT as SUGGEST_MAX_LIMIT, suggest
 
 
 router = APIRouter(prefix="/search", tags=["search"])
+logger = logging.getLogger(__name__)
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 50
+STREAM_BATCH_SECONDS = 0.05
 
-def handle_exception(e: Exception, endpoint_name: str) -> HTTPException:
+
+def handle_exception(e: Exception, endpoint_name: str) -> Exception:
     """统一错误处理函数，打印详细错误并返回HTTPException"""
+    if isinstance(e, PoolSaturatedError):
+        # Left to the app-wide handler, which sheds load with 503
+        return e
     error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-    print(f"\n{'='*80}\n[ERROR] {endpoint_name} - Exception:\n{error_detail}\n{'='*80}\n", file=sys.stderr)
+    logger.error("%s - Exception:\n%s", endpoint_name, error_detail)
     return HTTPException(status_code=500, detail=error_detail)
 
 
 @router.get("/")
 async def search(
     q: str = Query(..., min_length=1, description="Search keyword"),
-    scope: str = Query("all", regex="^(all|content|title|label)$"),
+    scope: str = Query("all", pattern="^(all|content|title|label)$"),
     max_results: int = Query(50, ge=1, le=1000),
     whole_word: bool = Query(False),
     case_sensitive: bool = Query(False),
-    use_regex: bool = Query(False)
+    use_regex: bool = Query(False),
+    rank: str = Query("none", pattern="^(none|bm25)$", description="Result order: scan order or BM25 relevance"),
+    cursor: Optional[str] = Query(None, description="Cursor of the page to fetch (from metadata.next_cursor)"),
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Page size; enables cursor pagination")
 ):
     """Search nodes."""
     try:
-        result = client.api.search(
+        paginate = cursor is not None or page_size is not None
+        if corpus.ready:
+            # Serve from the trigram index; it mirrors KERAG's matching rules
+            result = await pools.get("search").run(
+                cached_search,
+                corpus.snapshot(),
+                keyword=q,
+                scope=scope,
+                max_results=page_size or max_results,
+                whole_word=whole_word,
+                case_sensitive=case_sensitive,
+                use_regex=use_regex,
+                rank=rank,
+                paginate=paginate,
+                cursor=cursor
+            )
+        elif paginate:
+            # KERAG's own search has no cursors; a page from it would not line up with the next one
+            raise HTTPException(
+                status_code=503,
+                detail="Search pagination is unavailable until the modules are indexed; retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        else:
+            result = await client.call(
+                "search",
+                keyword=q,
+                scope=scope,
+                max_results=max_results,
+                whole_word=whole_word,
+                case_sensitive=case_sensitive,
+                use_regex=use_regex,
+                pool="search"
+            )
+
+        if not result.get("success"):
+            raise HTTPException(status_code=400, detail=result.get("error"))
+
+        return EncodedResponse(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise handle_exception(e, "search")
+
+
+@router.get("/suggest")
+async def search_suggest(
+    q: str = Query(..., min_length=1, description="Prefix typed so far"),
+    limit: int = Query(SUGGEST_LIMIT, ge=1, le=SUGGEST_MAX_LIMIT),
+    fuzzy: bool = Query(False, description="Also match prefixes one edit away")
+):
+    """Type-ahead completions of node titles, labels and IDs."""
+    if not corpus.ready:
+        return {"success": True, "data": [], "metadata": {"query": q, "count": 0, "indexed": False}}
+    try:
+        snapshot = corpus.snapshot()
+        if indexes_loaded(snapshot.modules.values(), "suggest"):
+            # A bounded prefix lookup: cheaper than a hop to the pool
+            suggestions = suggest(snapshot, q, limit, fuzzy)
+        else:
+            suggestions = await pools.get("search").run(suggest, snapshot, q, limit, fuzzy)
+        return {
+            "success": True,
+            "data": suggestions,
+            "metadata": {"query": q, "count": len(suggestions), "fuzzy": fuzzy, "indexed": True}
+        }
+    except Exception as e:
+        raise handle_exception(e, "search_suggest")
+
+
+@router.get("/stream")
+async def search_stream(
+    request: Request,
+    q: str = Query(..., min_length=1, description="Search keyword"),
+    scope: str = Query("all", pattern="^(all|content|title|label)$"),
+    max_results: int = Query(1000, ge=1, le=1000),
+    whole_word: bool = Query(False),
+    case_sensitive: bool = Query(False),
+    use_regex: bool = Query(False)
+):
+    """Stream search matches as NDJSON while the scan runs.
+
+    Each line is ``{"event": "result", "data": {...}}``; the last line is
+    ``{"event": "end", "metadata": {...}}``. The scan stops when the client
+    disconnects.
+    """
+    if not corpus.ready:
+        result = await client.call(
+            "search",
             keyword=q,
             scope=scope,
             max_results=max_results,
             whole_word=whole_word,
             case_sensitive=case_sensitive,
-            use_regex=use_regex
+            use_regex=use_regex,
+            pool="search"
         )
-
         if not result.get("success"):
             raise HTTPException(status_code=400, detail=result.get("error"))
+        lines = [json.dumps({"event": "result", "data": item}) for item in result.get("data") or []]
+        lines.append(json.dumps({"event": "end", "metadata": {"count": len(lines), "indexed": False}}))
+        return StreamingResponse(iter([line + "\n" for line in lines]), media_type=NDJSON_MEDIA_TYPE)
 
-        return result
-    except HTTPException:
-        raise
-    except Exception as e:
-        error_detail = f"{str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-        raise HTTPException(status_code=500, detail=error_detail)
+    try:
+        matcher = build_matcher(q, whole_word, case_sensitive, use_regex)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid regular expression: {e}")
+    budget = SearchBudget() if use_regex else None
+    hits = iter_matches(corpus.snapshot(), matcher, q, scope, use_regex, budget=budget, limit=max_results)
+    stop = threading.Event()
+    # Held while a batch runs on the pool, so the scan is closed by whichever side finishes last
+    scanning = threading.Lock()
+
+    def produce(limit: int):
+        with scanning:
+            batch, done = next_batch(hits, limit, STREAM_BATCH_SECONDS, stop)
+            if stop.is_set():
+                hits.close()
+        return [json.dumps({"event": "result", "data": search_result(hit, matcher)}) for hit in batch], done
+
+    async def events():
+        sent = 0
+        try:
+            done = False
+            while not done and sent < max_results:
+                if await request.is_disconnected():
+                    return
+                lines, done = await pools.get("search").run(produce, min(STREAM_BATCH_SIZE, max_results - sent))
+                sent += len(lines)
+                if lines:
+                    yield "\n".join(lines) + "\n"
+            metadata = {"keyword": q, "scope": scope, "count": sent, "complete": done, "indexed": True}
+            if budget is not None:
+                metadata["truncated"] = budget.truncated
+            yield json.dumps({"event": "end", "metadata": metadata}) + "\n"
+        except re.error as e:
+            yield json.dumps({"event": "error", "error": f"Invalid regular expression: {e}"}) + "\n"
+        finally:
+            # Ends a batch still running on the pool; the scan is abandoned
+            # and closed, which frees its regex worker
+            stop.set()
+            if scanning.acquire(blocking=False):
+                try:
+                    hits.close()
+                finally:
+                    scanning.release()
+
+    return StreamingResponse(events(), media_type=NDJSON_MEDIA_TYPE)
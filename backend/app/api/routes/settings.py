@@ -1,11 +1,9 @@
 """Settings management endpoints."""
 
-import os
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
 
-# Reinitialize KERAG API
+from ...core.hot_swap import SwitchInProgressError, settings_switcher
 from ...core.kerag_client import client
-from kerag.api import KERAGAPI
 
 router = APIRouter(prefix="/settings", tags=["settings"])
 
@@ -15,44 +13,58 @@ async def get_settings():
     """Get current settings."""
     return {
         "success": True,
-        "data": {
-            "kerag_home": os.getenv("KERAG_HOME", ""),
-            "kerag_local": os.getenv("KERAG_LOCAL", ""),
-            "kerag_lang": os.getenv("KERAG_LANG", "")
-        },
+        "data": dict(client.settings),
         "metadata": {}
     }
 
 
 @router.post("/apply")
-async def apply_settings(settings: dict):
-    """Apply settings and reinitialize."""
-    try:
-        # Update environment variables
-        os.environ["KERAG_HOME"] = settings.get("kerag_home", "")
-        os.environ["KERAG_LOCAL"] = settings.get("kerag_local", "")
-        os.environ["KERAG_LANG"] = settings.get("kerag_lang", "")
-
-        # Create new API instance
-        new_api = KERAGAPI(
-            local_root=settings.get("kerag_local"),
-            global_root=settings.get("kerag_home"),
-            lang=settings.get("kerag_lang")
-        )
+async def apply_settings(
+    settings: dict,
+    background: bool = Query(False, description="Return at once; poll /settings/status for progress")
+):
+    """Apply settings: build the new knowledge base in the background and swap it in.
 
-        # Replace the singleton instance
-        client._api = new_api
+    The current instance keeps serving until the switch. The response comes
+    once the new instance serves requests, or at once with ``background``.
+    """
+    try:
+        switch = settings_switcher.start(settings)
+    except SwitchInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
+    if background:
         return {
             "success": True,
-            "data": settings,
+            "data": switch.to_dict(),
             "metadata": {
-                "message": "Settings applied successfully"
+                "message": "Settings switch started"
             }
         }
-    except Exception as e:
+
+    await switch.swapped.wait()
+    if switch.state == "failed":
         return {
             "success": False,
-            "error": str(e),
-            "metadata": {}
-        }
\ No newline at end of file
+            "error": switch.error,
+            "metadata": {"switch": switch.to_dict()}
+        }
+    return {
+        "success": True,
+        "data": settings,
+        "metadata": {
+            "message": "Settings applied successfully",
+            "switch": switch.to_dict()
+        }
+    }
+
+
+@router.get("/status")
+async def get_settings_status():
+    """Get the progress of the latest settings switch."""
+    switch = settings_switcher.current
+    return {
+        "success": True,
+        "data": switch.to_dict() if switch is not None else None,
+        "metadata": {}
+    }
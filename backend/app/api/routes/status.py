@@ -2,6 +2,16 @@
 
 from fastapi import APIRouter
 from ...core.kerag_client import client
+from ...core.worker_pool import pools
+from ...core.search_index import search_cache
+from ...core.node_views import view_cache
+from ...core.regex_sandbox import regex_sandbox
+from ...core.cluster import cluster
+from ...core.corpus import corpus
+from ...core.encoding import encoding_stats
+from ...core import logs
+from ...core.events import event_bus
+from ...core.watcher import watcher
 
 router = APIRouter(prefix="/status", tags=["status"])
 
@@ -10,7 +20,16 @@ router = APIRouter(prefix="/status", tags=["status"])
 async def get_status():
     """Get system status."""
     try:
-        result = client.api.get_status()
+        result = await client.call("get_status")
+        metadata = result.setdefault("metadata", {})
+        metadata["search_cache"] = search_cache.stats()
+        metadata["view_cache"] = view_cache.stats()
+        metadata["regex_sandbox"] = regex_sandbox.stats()
+        metadata["cluster"] = cluster.stats()
+        metadata["snapshots"] = corpus.store.stats() if corpus.store is not None else {"enabled": False}
+        metadata["logging"] = logs.stats()
+        metadata["watcher"] = watcher.stats()
+        metadata["events"] = event_bus.stats()
         return result
     except Exception as e:
         return {
@@ -19,3 +38,23 @@ async def get_status():
             "error": str(e),
             "metadata": {}
         }
+
+
+@router.get("/pools")
+async def get_pool_status():
+    """Get concurrency and queue-depth metrics of the KERAG worker pools."""
+    return {
+        "success": True,
+        "data": pools.stats(),
+        "metadata": {}
+    }
+
+
+@router.get("/encoding")
+async def get_encoding_status():
+    """Get per-route response size, compression and encode-time savings."""
+    return {
+        "success": True,
+        "data": encoding_stats.to_dict(),
+        "metadata": {}
+    }
@@ -0,0 +1,87 @@
+"""Breadcrumbs, depths and ancestor tests of any node from the skeleton's parent links.
+
+Within a module the chain comes from the ``skeleton`` index built at load
+time, in O(depth) and without reading KERAG or any navigation session.
+Ancestors above a module's root (KERAG's ``::ROOT``) are read from KERAG
+once and kept until the loaded modules change. Nodes outside the mirrored
+modules fall back to walking parent IDs through KERAG.
+"""
+
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from .corpus import CorpusSnapshot, corpus
+from .sessions import build_breadcrumb
+
+
+Breadcrumb = List[Dict[str, str]]
+
+# Breadcrumbs of the parents of module roots, by parent ID
+_outer: Dict[str, Breadcrumb] = {}
+_outer_lock = threading.Lock()
+
+
+def _clear_outer(generation: int):
+    with _outer_lock:
+        _outer.clear()
+
+
+corpus.add_listener(_clear_outer)
+
+
+class _Trace(NamedTuple):
+    """A node's ancestors inside its module, and the parent ID its module root hangs from."""
+    items: Breadcrumb
+    outer: Optional[str]
+
+
+def _trace(snapshot: CorpusSnapshot, node_id: str) -> Optional[_Trace]:
+    tree = snapshot.modules.get(node_id.split("::", 1)[0])
+    position = tree.positions.get(node_id) if tree is not None else None
+    if position is None:
+        return None
+    records = tree.records
+    chain = tree.indexes["skeleton"].ancestors(position)
+    items = [{"id": records[p].node_id, "label": records[p].label} for p in chain]
+    return _Trace(items, records[chain[0]].parent_id or None)
+
+
+def _entry(node_id: str, breadcrumb: Breadcrumb, ancestor: Optional[str]) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"node_id": node_id, "breadcrumb": breadcrumb, "depth": len(breadcrumb) - 1}
+    if ancestor is not None:
+        entry["is_ancestor"] = any(item["id"] == ancestor for item in breadcrumb[:-1])
+    return entry
+
+
+def lookup(snapshot: CorpusSnapshot, node_ids: Sequence[str], ancestor: Optional[str] = None,
+           api=None) -> Optional[List[Optional[Dict[str, Any]]]]:
+    """``{"node_id", "breadcrumb", "depth"[, "is_ancestor"]}`` of each node (None if unknown).
+
+    ``is_ancestor`` tells whether ``ancestor`` is a proper ancestor of the
+    node. Without ``api`` this never calls KERAG and returns None if it
+    would have to; run it again with ``api`` on a pool thread then.
+    """
+    traces = [_trace(snapshot, node_id) for node_id in node_ids]
+    with _outer_lock:
+        missing = {trace.outer for trace in traces if trace is not None and trace.outer is not None} - set(_outer)
+    if api is None and (missing or None in traces):
+        return None
+    if missing:
+        read = {parent_id: build_breadcrumb(api, parent_id) for parent_id in missing}
+        with _outer_lock:
+            _outer.update(read)
+
+    entries: List[Optional[Dict[str, Any]]] = []
+    for node_id, trace in zip(node_ids, traces):
+        if trace is None:
+            breadcrumb = build_breadcrumb(api, node_id)
+            entries.append(_entry(node_id, breadcrumb, ancestor) if breadcrumb else None)
+            continue
+        entries.append(_entry(node_id, _outer.get(trace.outer, []) + trace.items, ancestor))
+    return entries
+
+
+def breadcrumb(api, node_id: str) -> Breadcrumb:
+    """Root-to-node breadcrumb of ``node_id``, from the skeleton index where it can be."""
+    entry = lookup(corpus.snapshot(), [node_id], api=api)[0]
+    return entry["breadcrumb"] if entry is not None else []
@@ -0,0 +1,253 @@
+"""Pre-forked multi-worker serving over a knowledge base loaded once.
+
+The master process loads KERAG and builds the corpus mirror, then forks
+uvicorn workers that share those objects copy-on-write. Changes to the
+loaded modules are applied through a journal shared by all workers: the
+worker handling the request appends the operation, and every other worker
+replays it before serving its next request.
+
+Replaying a ``load_module`` or ``reload_module`` runs KERAG's parse in
+every worker: KERAG's parsed state lives in each process's own KERAGAPI
+and has no form another process can adopt, so a module loaded after
+startup is parsed once per worker. The web-side mirror of the module is
+not rebuilt, though: the worker that loads it writes a snapshot to a
+directory private to the cluster, and the other workers map that file
+instead of walking and indexing the module again. Modules loaded at
+startup are parsed once, in the master, and shared copy-on-write.
+"""
+
+import asyncio
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+from typing import Any, Callable, Dict, List, Optional
+
+from .corpus import corpus
+from .kerag_client import client
+from .worker_pool import pools
+
+
+logger = logging.getLogger(__name__)
+
+
+class ModuleJournal:
+    """Ordered log of module changes shared by forked workers.
+
+    Entries are ``[operation, args]`` JSON lines in a file; a process-shared
+    counter holds the number of entries. Writers must hold ``lock``.
+    """
+
+    def __init__(self, path: str):
+        context = multiprocessing.get_context("fork")
+        self.path = path
+        self.lock = context.Lock()
+        self._version = context.RawValue("Q", 0)
+        open(self.path, "w").close()
+
+    @property
+    def version(self) -> int:
+        return self._version.value
+
+    def append(self, operation: str, args: List[Any]) -> int:
+        """Append an entry and return the new version."""
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps([operation, args], ensure_ascii=False) + "\n")
+        self._version.value += 1
+        return self._version.value
+
+    def entries(self, start: int) -> List[List[Any]]:
+        """Entries from index ``start`` on."""
+        with open(self.path, encoding="utf-8") as f:
+            lines = f.readlines()[start:self.version]
+        return [json.loads(line) for line in lines]
+
+
+class Cluster:
+    """Coordinates module changes across pre-forked workers.
+
+    Inactive in a single process (when not started by ``serve``); then
+    ``call`` is a plain exclusive KERAG call and ``catch_up`` does nothing.
+    """
+
+    def __init__(self):
+        self.workers = 1
+        self.worker_id: Optional[int] = None
+        self._journal: Optional[ModuleJournal] = None
+        self._applied = 0
+        self._operations: Dict[str, Callable[..., Dict[str, Any]]] = {}
+        self._catch_up_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def active(self) -> bool:
+        return self._journal is not None
+
+    def operation(self, name: str):
+        """Register a function as a journaled operation other than a KERAG method."""
+        def decorator(fn):
+            self._operations[name] = fn
+            return fn
+        return decorator
+
+    def _invoke(self, operation: str, args: List[Any], local: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        fn = self._operations.get(operation)
+        if fn is not None:
+            return fn(*args, **(local or {}))
+        return client.call_sync(operation, *args, write=True)
+
+    def _replay(self):
+        """Apply journal entries this worker has not seen yet; caller holds the journal lock."""
+        for operation, args in self._journal.entries(self._applied):
+            try:
+                self._invoke(operation, args)
+            except Exception:
+                logger.exception("Worker %s failed to replay %s%r", self.worker_id, operation, args)
+            self._applied += 1
+
+    async def call(self, operation: str, *args, **local) -> Dict[str, Any]:
+        """Run a module-changing KERAG method (or registered operation) in every worker.
+
+        The operation runs here on the modules pool and, if it succeeds, is
+        journaled for the other workers. Keyword arguments go to this
+        worker's invocation only. Callers re-sync the corpus after.
+        """
+        if not self.active:
+            return await pools.get("modules").run(self._invoke, operation, list(args), local)
+
+        def apply():
+            with self._journal.lock:
+                # Catch up first so operations apply in journal order everywhere
+                self._replay()
+                result = self._invoke(operation, list(args), local)
+                if result.get("success"):
+                    self._applied = self._journal.append(operation, list(args))
+                return result
+
+        return await pools.get("modules").run(apply)
+
+    def behind(self) -> bool:
+        return self.active and self._journal.version != self._applied
+
+    async def catch_up(self):
+        """Replay module changes made by other workers and re-sync the corpus."""
+        if not self.behind():
+            return
+        if self._catch_up_lock is None:
+            self._catch_up_lock = asyncio.Lock()
+        async with self._catch_up_lock:
+            if not self.behind():
+                return
+
+            def replay():
+                with self._journal.lock:
+                    self._replay()
+
+            await pools.get("modules").run(replay)
+            await client.run(corpus.sync, pool="modules")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "worker_id": self.worker_id,
+            "pid": os.getpid(),
+            "journal_version": self._journal.version if self.active else 0,
+            "applied": self._applied,
+        }
+
+
+class ClusterSyncMiddleware:
+    """ASGI middleware replaying other workers' module changes before a request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and cluster.behind():
+            await cluster.catch_up()
+        await self.app(scope, receive, send)
+
+
+# Global cluster coordinator
+cluster = Cluster()
+
+
+def serve(app_module: str, host: str, port: int, workers: int, log_level: str = "info",
+          shutdown_timeout: Optional[float] = None):
+    """Load the knowledge base once, then serve it from ``workers`` forked processes."""
+    import uvicorn
+    from .logs import stop_logging
+    from .startup import PRELOAD_ENV, read_manifest, startup, warm_up_sync
+
+    # The app's queue-based logging handles uvicorn's records and the access log
+    config = uvicorn.Config(app_module, host=host, port=port, log_level=log_level,
+                            log_config=None, access_log=False, timeout_graceful_shutdown=shutdown_timeout)
+    config.load()
+    sock = config.bind_socket()
+
+    logger.info("Loading knowledge base in master process %d", os.getpid())
+    with startup.phase("kerag_init"):
+        client.init_from_env()
+    # Workers inherit the preloaded modules, warm caches and readiness
+    warm_up_sync(client.api, startup, read_manifest(os.getenv(PRELOAD_ENV)))
+
+    journal_dir = tempfile.mkdtemp(prefix="kerag-cluster-")
+    cluster.workers = workers
+    cluster._journal = ModuleJournal(os.path.join(journal_dir, "modules.jsonl"))
+    if corpus.store is None:
+        # Modules loaded later are mirrored once and mapped by the other workers
+        from .snapshots import SnapshotStore
+        corpus.store = SnapshotStore(os.path.join(journal_dir, "snapshots"))
+
+    # Keep the garbage collector from touching (and so copying) the shared objects
+    gc.collect()
+    gc.freeze()
+
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(worker_id: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            cluster.worker_id = worker_id
+            try:
+                uvicorn.Server(config).run(sockets=[sock])
+            finally:
+                stop_logging()
+                os._exit(0)
+        children[pid] = worker_id
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for worker_id in range(workers):
+        spawn(worker_id)
+    logger.info("Started %d workers on %s:%d", workers, host, port)
+
+    try:
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            worker_id = children.pop(pid, None)
+            if worker_id is not None and not stopping:
+                # A replacement starts from the master's state and replays the journal
+                logger.warning("Worker %d (pid %d) exited with status %d; restarting", worker_id, pid, status)
+                spawn(worker_id)
+    finally:
+        sock.close()
+        shutil.rmtree(journal_dir, ignore_errors=True)
@@ -0,0 +1,338 @@
+"""In-memory mirror of the loaded KERAG node tree, with per-module indexes."""
+
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Mapping, MutableMapping, NamedTuple, Optional, Sequence, Tuple
+
+from .kerag_client import client
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SCOPES = ("title", "label", "content")
+PROGRESS_EVERY = 256
+
+# Index name -> builder called with a ModuleTree when the module is loaded
+INDEX_BUILDERS: Dict[str, Callable[["ModuleTree"], Any]] = {}
+
+
+def register_index(name: str):
+    """Register a per-module index builder under ``name``."""
+    def decorator(builder):
+        INDEX_BUILDERS[name] = builder
+        return builder
+    return decorator
+
+
+def node_id_of(node: Dict[str, Any]) -> Optional[str]:
+    """Get the ID of a node dict returned by KERAG."""
+    return node.get("node_id") or node.get("id")
+
+
+def read_node(api, node_id: str, include_see_also: bool = True) -> Optional[Dict[str, Any]]:
+    """Read a single node's details without touching navigation state."""
+    result = api.get_node_view(
+        node_id=node_id,
+        depth=0,
+        include_content=True,
+        include_see_also=include_see_also,
+        format="text"
+    )
+    if not result.get("success"):
+        return None
+    return (result.get("data") or {}).get("node")
+
+
+@dataclass(slots=True)
+class NodeRecord:
+    """The searchable, structural part of one KERAG node."""
+    node_id: str
+    module: str
+    label: str
+    title: str
+    type: str
+    content: str
+    parent_id: Optional[str]
+    children: Tuple[str, ...]
+    path: Optional[str] = None
+
+    def field(self, scope: str) -> str:
+        """Get the text of a search scope (title, label or content)."""
+        return getattr(self, scope) or ""
+
+    def summary(self) -> Dict[str, Any]:
+        """Basic node information as returned to clients."""
+        return {
+            "node_id": self.node_id,
+            "label": self.label,
+            "title": self.title,
+            "type": self.type,
+            "module": self.module,
+        }
+
+
+class ModuleTree:
+    """Nodes of one loaded module in depth-first order, plus their indexes."""
+
+    def __init__(self, name: str, records: Sequence[NodeRecord],
+                 positions: Optional[Mapping[str, int]] = None, snapshot: Optional[str] = None):
+        self.name = name
+        self.records = records
+        if positions is None:
+            positions = {record.node_id: i for i, record in enumerate(records)}
+        self.positions = positions
+        self.indexes: MutableMapping[str, Any] = {}
+        # Snapshot file the tree is memory-mapped from, if any
+        self.snapshot = snapshot
+        # Corpus generation at which this tree was published (keys per-module caches)
+        self.generation = 0
+
+    def build_indexes(self):
+        """Build every registered index for this module."""
+        for name, builder in INDEX_BUILDERS.items():
+            self.indexes[name] = builder(self)
+
+    def get(self, node_id: str) -> Optional[NodeRecord]:
+        """Get a node record by ID."""
+        position = self.positions.get(node_id)
+        return self.records[position] if position is not None else None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+
+def build_indexes(tree_name: str, records: List[NodeRecord], builders: List[Tuple[str, Any]]) -> Dict[str, Any]:
+    """Build ``builders`` over a module's records (picklable, for index worker processes)."""
+    tree = ModuleTree(tree_name, records)
+    return {name: builder(tree) for name, builder in builders}
+
+
+def build_module_tree(api, module: str, root_ids: List[str], indexed: bool = True,
+                      progress: Optional[Callable[[int], None]] = None) -> ModuleTree:
+    """Walk a loaded module through the KERAG API and mirror its nodes.
+
+    ``progress(nodes)`` is called as the walk goes; with ``indexed=False``
+    the indexes are left for the caller to build.
+    """
+    records = []
+    seen = set()
+    stack = list(reversed(root_ids))
+    while stack:
+        node_id = stack.pop()
+        if node_id in seen:
+            continue
+        seen.add(node_id)
+        node = read_node(api, node_id, include_see_also=False)
+        if node is None:
+            continue
+
+        if "children_ids" in node:
+            children = [c if isinstance(c, str) else node_id_of(c) for c in node.get("children_ids") or []]
+        else:
+            result = api.get_children(node_id)
+            children = [c if isinstance(c, str) else node_id_of(c) for c in result.get("data") or []]
+        children = tuple(c for c in children if c)
+
+        records.append(NodeRecord(
+            node_id=node_id_of(node) or node_id,
+            module=node.get("module") or module,
+            label=node.get("label") or "",
+            title=node.get("title") or "",
+            type=node.get("type") or "",
+            content=node.get("content") or "",
+            parent_id=node.get("parent_id"),
+            children=children,
+            path=node.get("path") or node.get("file_path"),
+        ))
+        stack.extend(reversed(children))
+        if progress is not None and len(records) % PROGRESS_EVERY == 0:
+            progress(len(records))
+
+    if progress is not None:
+        progress(len(records))
+    tree = ModuleTree(module, records)
+    if indexed:
+        tree.build_indexes()
+    return tree
+
+
+def source_path(path: str) -> Optional[str]:
+    """Resolve a node's source file path (absolute, or relative to the local or global root)."""
+    if os.path.isabs(path):
+        return path if os.path.isfile(path) else None
+    settings = client.settings
+    for root in (settings["kerag_local"], settings["kerag_home"]):
+        if root and os.path.isfile(os.path.join(root, path)):
+            return os.path.join(root, path)
+    return None
+
+
+def loaded_module_roots(api) -> Dict[str, List[str]]:
+    """Group the API's loaded root nodes by module name."""
+    result = api.get_loaded_roots()
+    data = result.get("data") if result.get("success") else None
+    roots: Dict[str, List[str]] = {}
+    for root in data or []:
+        root_id = node_id_of(root)
+        if not root_id:
+            continue
+        module = root.get("module") or root_id.split("::", 1)[0]
+        roots.setdefault(module, []).append(root_id)
+    return roots
+
+
+class CorpusSnapshot(NamedTuple):
+    """The loaded modules at one corpus generation."""
+    generation: int
+    modules: Dict[str, ModuleTree]
+
+
+class Corpus:
+    """Mirror of all loaded modules, kept in sync with the KERAG API.
+
+    The snapshot is replaced rather than mutated, so readers can iterate a
+    consistent set of modules without locking.
+    """
+
+    def __init__(self):
+        self._snapshot = CorpusSnapshot(0, {})
+        self._sync_lock = threading.Lock()
+        self._listeners: List[Callable[[int], None]] = []
+        self.ready = False
+        # Optional on-disk cache of module trees, with load(name, root_ids) and save(tree, root_ids)
+        self.store = None
+
+    def add_listener(self, callback: Callable[[int], None]):
+        """Call ``callback(generation)`` whenever the loaded modules change."""
+        self._listeners.append(callback)
+
+    def _publish(self, modules: Dict[str, ModuleTree]):
+        generation = self._snapshot.generation + 1
+        previous = self._snapshot.modules
+        for name, tree in modules.items():
+            if previous.get(name) is not tree:
+                tree.generation = generation
+        self._snapshot = CorpusSnapshot(generation, modules)
+        for callback in self._listeners:
+            callback(self._snapshot.generation)
+
+    def snapshot(self) -> CorpusSnapshot:
+        """The current generation and its modules."""
+        return self._snapshot
+
+    @property
+    def modules(self) -> Dict[str, ModuleTree]:
+        """Snapshot of the loaded modules by name, in load order."""
+        return self._snapshot.modules
+
+    @property
+    def generation(self) -> int:
+        """Counter bumped whenever the set of loaded modules changes."""
+        return self._snapshot.generation
+
+    def generation_of(self, node_id: str) -> int:
+        """Generation of the module holding ``node_id``: bumped only when that module is (re)loaded.
+
+        IDs outside any loaded module (such as the root) get the corpus generation.
+        """
+        snapshot = self._snapshot
+        tree = snapshot.modules.get(node_id.split("::", 1)[0])
+        return tree.generation if tree is not None else snapshot.generation
+
+    def sync(self, api, prebuilt: Optional[Dict[str, ModuleTree]] = None) -> Dict[str, List[str]]:
+        """Index newly loaded modules and drop unloaded ones.
+
+        Newly loaded modules found in ``prebuilt`` are taken from there
+        instead of being walked again.
+        """
+        with self._sync_lock:
+            roots = loaded_module_roots(api)
+            modules = dict(self._snapshot.modules)
+            removed = [name for name in modules if name not in roots]
+            for name in removed:
+                del modules[name]
+            added = [name for name in roots if name not in modules]
+            for name in added:
+                if prebuilt and name in prebuilt:
+                    modules[name] = prebuilt[name]
+                    if self.store is not None:
+                        self.store.save(modules[name], roots[name])
+                    continue
+                modules[name] = self.module_tree(api, name, roots[name])
+            if added or removed or not self.ready:
+                self._publish(modules)
+            self.ready = True
+            return {"added": added, "removed": removed}
+
+    def refresh(self, api, names: Sequence[str]) -> List[str]:
+        """Mirror modules KERAG has re-parsed again, and return those still loaded.
+
+        Other modules keep their trees, indexes and generations.
+        """
+        with self._sync_lock:
+            roots = loaded_module_roots(api)
+            modules = dict(self._snapshot.modules)
+            refreshed = []
+            for name in names:
+                if name in roots:
+                    modules[name] = self.module_tree(api, name, roots[name])
+                    refreshed.append(name)
+                else:
+                    modules.pop(name, None)
+            self._publish(modules)
+            return refreshed
+
+    def cached_tree(self, name: str, root_ids: List[str]) -> Optional[ModuleTree]:
+        """A module tree from the snapshot store, if it has an up-to-date one."""
+        return self.store.load(name, root_ids) if self.store is not None else None
+
+    def module_tree(self, api, name: str, root_ids: List[str]) -> ModuleTree:
+        """Mirror a loaded module, through the snapshot store when there is one."""
+        tree = self.cached_tree(name, root_ids)
+        if tree is None:
+            tree = build_module_tree(api, name, root_ids)
+            logger.info("Indexed module %s (%d nodes)", name, len(tree))
+            if self.store is not None:
+                self.store.save(tree, root_ids)
+        return tree
+
+    def build(self, api) -> Dict[str, ModuleTree]:
+        """Index every module loaded in ``api`` without publishing the result."""
+        roots = loaded_module_roots(api)
+        return {name: self.module_tree(api, name, root_ids) for name, root_ids in roots.items()}
+
+    def replace(self, modules: Dict[str, ModuleTree], swap: Optional[Callable[[], Any]] = None):
+        """Publish modules built by ``build`` in place of the current ones.
+
+        ``swap`` runs under the sync lock right before the modules are
+        published, so the KERAG instance it installs and the mirror built
+        from it replace the old pair together; its result is returned.
+        """
+        with self._sync_lock:
+            result = swap() if swap is not None else None
+            self._publish(modules)
+            self.ready = True
+            return result
+
+    def clear(self):
+        """Forget every module."""
+        with self._sync_lock:
+            self._publish({})
+
+    def get(self, node_id: str) -> Optional[NodeRecord]:
+        """Find a node record in any loaded module."""
+        for tree in self.modules.values():
+            record = tree.get(node_id)
+            if record is not None:
+                return record
+        return None
+
+    def records(self) -> Iterator[NodeRecord]:
+        """Iterate every node in scan order."""
+        for tree in self.modules.values():
+            yield from tree.records
+
+
+# Global corpus mirror of the client's KERAG API
+corpus = Corpus()
@@ -0,0 +1,291 @@
+"""Fast response encoding, MessagePack negotiation and compression.
+
+KERAG results are plain dicts, so routes returning large ones wrap them in
+``EncodedResponse``: they are encoded straight to bytes with orjson
+(stdlib ``json`` without it), skipping FastAPI's ``jsonable_encoder``
+pass, or to MessagePack when the client's ``Accept`` asks for it and
+``msgpack`` is installed. ``CompressionMiddleware`` then compresses bodies
+above ``KERAG_COMPRESS_MIN_BYTES`` with zstd (if ``zstandard`` is
+installed and accepted) or gzip. Per route, ``encoding_stats`` records
+bytes before and after compression and encode times, and every
+``KERAG_ENCODING_BASELINE_EVERY``-th response is also encoded the default
+way to measure the time saved.
+"""
+
+import gzip
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse, Response
+
+from .request_state import add_phase
+from .static_assets import accepted_encodings
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON only
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip only
+    zstandard = None
+
+
+COMPRESS_MIN_BYTES = int(os.getenv("KERAG_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("KERAG_GZIP_LEVEL", "5"))
+ZSTD_LEVEL = int(os.getenv("KERAG_ZSTD_LEVEL", "3"))
+# Encode every n-th response the default way too, to measure the saving (0: never)
+BASELINE_EVERY = int(os.getenv("KERAG_ENCODING_BASELINE_EVERY", "20"))
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+COMPRESSIBLE_TYPES = ("application/json", "application/msgpack", "application/x-ndjson", "text/")
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return jsonable_encoder(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON, as ``JSONResponse`` would render it."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                      default=_default).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def route_name(scope) -> str:
+    """The matched route's full path template (``/api/nodes/detail``), or the raw path."""
+    path = scope.get("path", "")
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    regex = getattr(route, "path_regex", None)
+    if template is None or regex is None:
+        return path
+    # Routes of included routers may not carry the prefix; find where the route matched
+    for start, char in enumerate(path):
+        if char == "/" and regex.match(path[start:]):
+            return path[:start] + template
+    return template
+
+
+class EncodingStats:
+    """Per-route byte and encode-time accounting."""
+
+    def __init__(self):
+        self._routes: Dict[str, Dict[str, Any]] = {}
+
+    def _route(self, route: str) -> Dict[str, Any]:
+        entry = self._routes.get(route)
+        if entry is None:
+            entry = self._routes[route] = {
+                "responses": 0, "bytes_raw": 0, "bytes_sent": 0, "compressed": 0, "compress_seconds": 0.0,
+                "encoded": 0, "msgpack": 0, "encode_seconds": 0.0,
+                "baseline_samples": 0, "baseline_seconds": 0.0, "sampled_seconds": 0.0,
+            }
+        return entry
+
+    def should_sample(self, route: str) -> bool:
+        return BASELINE_EVERY > 0 and self._route(route)["encoded"] % BASELINE_EVERY == 0
+
+    def record_encode(self, route: str, seconds: float, packed: bool, baseline: Optional[float] = None):
+        entry = self._route(route)
+        entry["encoded"] += 1
+        entry["msgpack"] += packed
+        entry["encode_seconds"] += seconds
+        if baseline is not None:
+            entry["baseline_samples"] += 1
+            entry["baseline_seconds"] += baseline
+            entry["sampled_seconds"] += seconds
+
+    def record_transfer(self, route: str, raw: int, sent: int, compress_seconds: Optional[float] = None):
+        entry = self._route(route)
+        entry["responses"] += 1
+        entry["bytes_raw"] += raw
+        entry["bytes_sent"] += sent
+        if compress_seconds is not None:
+            entry["compressed"] += 1
+            entry["compress_seconds"] += compress_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        routes = {}
+        for route, e in sorted(self._routes.items()):
+            summary = {
+                "responses": e["responses"],
+                "compressed": e["compressed"],
+                "bytes_raw": e["bytes_raw"],
+                "bytes_sent": e["bytes_sent"],
+                "bytes_saved": e["bytes_raw"] - e["bytes_sent"],
+                "compression_ratio": round(e["bytes_sent"] / e["bytes_raw"], 4) if e["bytes_raw"] else None,
+                "compress_ms": round(e["compress_seconds"] * 1000, 3),
+            }
+            if e["encoded"]:
+                summary["encoded"] = e["encoded"]
+                summary["msgpack"] = e["msgpack"]
+                summary["avg_encode_ms"] = round(e["encode_seconds"] / e["encoded"] * 1000, 3)
+                if e["baseline_samples"]:
+                    # Default-path time minus fast-path time on the same payloads, scaled to all responses
+                    saved = (e["baseline_seconds"] - e["sampled_seconds"]) / e["baseline_samples"]
+                    summary["avg_baseline_encode_ms"] = round(e["baseline_seconds"] / e["baseline_samples"] * 1000, 3)
+                    summary["encode_ms_saved"] = round(saved * e["encoded"] * 1000, 3)
+            routes[route] = summary
+        return {
+            "orjson": orjson is not None,
+            "msgpack": msgpack is not None,
+            "zstd": zstandard is not None,
+            "compress_min_bytes": COMPRESS_MIN_BYTES,
+            "routes": routes,
+        }
+
+
+# Global encoding statistics
+encoding_stats = EncodingStats()
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` rendered with orjson when available."""
+
+    def render(self, content: Any) -> bytes:
+        started = time.perf_counter()
+        body = dumps(content)
+        add_phase("encode", time.perf_counter() - started)
+        return body
+
+
+class EncodedResponse(Response):
+    """A result dict encoded when sent, as MessagePack or JSON per the ``Accept`` header."""
+
+    media_type = "application/json"
+
+    def __init__(self, content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None):
+        self.content = content
+        self._extra_headers = dict(headers or {})
+        super().__init__(status_code=status_code, headers=headers)
+
+    async def __call__(self, scope, receive, send):
+        accept = Headers(scope=scope).get("accept", "")
+        packed = msgpack is not None and any(media in accept for media in MSGPACK_MEDIA_TYPES)
+        route = route_name(scope)
+
+        started = time.perf_counter()
+        if packed:
+            self.body = msgpack.packb(self.content, use_bin_type=True, default=_default)
+            self.media_type = MSGPACK_MEDIA_TYPES[0]
+        else:
+            self.body = dumps(self.content)
+        elapsed = time.perf_counter() - started
+        add_phase("encode", elapsed)
+
+        baseline = None
+        if encoding_stats.should_sample(route):
+            started = time.perf_counter()
+            json.dumps(jsonable_encoder(self.content), ensure_ascii=False, allow_nan=False,
+                       separators=(",", ":")).encode("utf-8")
+            baseline = time.perf_counter() - started
+        encoding_stats.record_encode(route, elapsed, packed, baseline)
+
+        self.init_headers({**self._extra_headers, "Vary": "Accept"})
+        await super().__call__(scope, receive, send)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete response bodies above a size threshold.
+
+    Bodies of known length are collected and compressed in one piece;
+    streamed responses (no Content-Length) pass through untouched. ETags
+    are left as the handler set them, so a 304 repeats the validator of the
+    200 it confirms; caches tell the encodings apart by
+    ``Vary: Accept-Encoding``, which 304s carry too.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if zstandard is not None and "zstd" in accepted:
+            encoding = "zstd"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            encoding = None
+        start_message = None
+        streaming = False
+        chunks = []
+
+        async def send_compressed(message):
+            nonlocal start_message, streaming
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+
+            if streaming:
+                await send(message)
+                return
+            if message.get("more_body"):
+                if "content-length" not in Headers(raw=start_message["headers"]):
+                    # Streaming (unknown length): send as is
+                    streaming = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                chunks.append(message.get("body", b""))
+                return
+
+            start, start_message = start_message, None
+            chunks.append(message.get("body", b""))
+            body = b"".join(chunks)
+
+            headers = MutableHeaders(raw=start["headers"])
+            route = route_name(scope)
+            compressible = (len(body) >= self.minimum_size and "content-encoding" not in headers
+                            and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES))
+            if start["status"] == 304 or (compressible and encoding is None):
+                # Another Accept-Encoding would get (or confirm) a compressed body
+                headers.add_vary_header("Accept-Encoding")
+            if encoding is None or not compressible:
+                encoding_stats.record_transfer(route, len(body), len(body))
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            started = time.perf_counter()
+            if encoding == "zstd":
+                compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+            else:
+                compressed = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+            elapsed = time.perf_counter() - started
+            encoding_stats.record_transfer(route, len(body), len(compressed), elapsed)
+            add_phase("compress", elapsed)
+
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,112 @@
+"""Change events pushed to connected browsers over Server-Sent Events.
+
+Every corpus change publishes a ``corpus`` event with the generation of
+each loaded module and the modules that changed or went away; the file
+watcher adds ``reloading`` and ``reload_failed`` events. Each subscriber
+(one ``/api/events`` stream) has its own bounded queue; a subscriber too
+slow to keep up loses events and is sent a full ``corpus`` state instead.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from typing import Any, Dict, Optional, Set
+
+from .corpus import corpus
+
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE = 256
+
+
+def corpus_state() -> Dict[str, Any]:
+    """The ``corpus`` event describing the current modules, with nothing marked changed."""
+    snapshot = corpus.snapshot()
+    return {
+        "type": "corpus",
+        "generation": snapshot.generation,
+        "modules": {name: tree.generation for name, tree in snapshot.modules.items()},
+        "changed": [],
+        "removed": [],
+    }
+
+
+def format_event(event: Dict[str, Any]) -> str:
+    """An event as an SSE message (``event:`` is the event type)."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+class EventBus:
+    """Fan-out of events to subscriber queues; ``publish`` may be called from any thread."""
+
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_QUEUE)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.discard(queue)
+
+    def publish(self, event: Dict[str, Any]):
+        with self._lock:
+            loop = self._loop
+            if loop is None or not self._subscribers:
+                return
+        self.published += 1
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(event)
+        elif not loop.is_closed():
+            loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event: Dict[str, Any]):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for queue in subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Replace the backlog with the current state, which supersedes it
+                self.dropped += queue.qsize()
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(corpus_state())
+
+    def stats(self) -> Dict[str, Any]:
+        return {"subscribers": len(self._subscribers), "published": self.published, "dropped": self.dropped}
+
+
+# Global event bus
+event_bus = EventBus()
+
+# Module generations of the last corpus event
+_last_modules: Dict[str, int] = {}
+
+
+def _on_corpus_change(generation: int):
+    global _last_modules
+    event = corpus_state()
+    modules = event["modules"]
+    event["changed"] = [name for name, module_generation in modules.items()
+                        if _last_modules.get(name) != module_generation]
+    event["removed"] = [name for name in _last_modules if name not in modules]
+    _last_modules = modules
+    event_bus.publish(event)
+
+
+corpus.add_listener(_on_corpus_change)
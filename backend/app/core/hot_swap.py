@@ -0,0 +1,152 @@
+"""Background hot-swap of the KERAG instance when settings change.
+
+The new instance is built and its corpus mirror indexed while the old one
+keeps serving. The instance, its settings and its mirror are then published
+together under the corpus sync lock, and the old instance is dropped once
+the calls still running on it finish. Settings are handed to the new
+instance and the client directly; the process environment is not touched.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from kerag.api import KERAGAPI
+
+from .cluster import cluster
+from .corpus import corpus
+from .kerag_client import SETTINGS_ENV, client
+
+
+logger = logging.getLogger(__name__)
+
+DRAIN_TIMEOUT = float(os.getenv("KERAG_DRAIN_TIMEOUT", "60"))
+DRAIN_POLL_SECONDS = 0.05
+FINISHED_STATES = ("done", "failed")
+
+
+class SwitchInProgressError(RuntimeError):
+    """Raised when settings are applied while a previous switch is running."""
+
+
+class SettingsSwitch:
+    """Progress of one settings change: pending, building, warming, swapping, draining, done or failed."""
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.settings = settings
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+        self.modules: list = []
+        self.draining = 0
+        self.old_api = None
+        # Set once the new instance serves requests, or the switch failed
+        self.swapped = asyncio.Event()
+        self._phase_started = time.perf_counter()
+
+    def enter(self, state: str):
+        """Move to the next phase, recording how long the current one took."""
+        now = time.perf_counter()
+        if self.state != "pending":
+            self.phases[self.state] = round(now - self._phase_started, 4)
+        self.state = state
+        self._phase_started = now
+        if state in FINISHED_STATES:
+            self.finished_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "state": self.state,
+            "settings": self.settings,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "phase_seconds": dict(self.phases),
+            "modules": self.modules,
+            "draining_calls": self.draining,
+        }
+
+
+@cluster.operation("apply_settings")
+def switch_settings(settings: Dict[str, Any], switch: Optional[SettingsSwitch] = None) -> Dict[str, Any]:
+    """Build and warm a KERAG instance for ``settings``, then swap it in.
+
+    Runs on a worker thread in every worker; ``switch`` (only in the worker
+    handling the request) receives progress and the retired instance.
+    """
+    enter = switch.enter if switch is not None else (lambda state: None)
+
+    enter("building")
+    settings = {key: settings.get(key) or "" for key in SETTINGS_ENV}
+    new_api = KERAGAPI(
+        local_root=settings["kerag_local"],
+        global_root=settings["kerag_home"],
+        lang=settings["kerag_lang"]
+    )
+
+    enter("warming")
+    # Source files and snapshots resolve against the new roots on this thread only
+    with client.building(settings):
+        modules = corpus.build(new_api)
+
+    enter("swapping")
+    old_api = corpus.replace(modules, swap=lambda: client.swap(new_api, settings))
+
+    if switch is not None:
+        switch.modules = list(modules)
+        switch.old_api = old_api
+    return {"success": True, "data": {"modules": list(modules)}}
+
+
+class SettingsSwitcher:
+    """Runs settings switches one at a time in the background."""
+
+    def __init__(self):
+        self.current: Optional[SettingsSwitch] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, settings: Dict[str, Any]) -> SettingsSwitch:
+        """Start switching to ``settings`` and return its progress record."""
+        if self.current is not None and self.current.state not in FINISHED_STATES:
+            raise SwitchInProgressError(f"Settings switch {self.current.id} is still {self.current.state}")
+        switch = SettingsSwitch(settings)
+        self.current = switch
+        self._task = asyncio.get_running_loop().create_task(self._run(switch))
+        return switch
+
+    async def _run(self, switch: SettingsSwitch):
+        try:
+            await cluster.call("apply_settings", switch.settings, switch=switch)
+            switch.swapped.set()
+
+            # Retire the old instance once the calls still using it finish
+            switch.enter("draining")
+            old_api, switch.old_api = switch.old_api, None
+            deadline = time.monotonic() + DRAIN_TIMEOUT
+            while old_api is not None:
+                switch.draining = client.inflight(old_api)
+                if not switch.draining:
+                    break
+                if time.monotonic() > deadline:
+                    logger.warning("Settings switch %s: %d calls still running on the old instance after %.0fs",
+                                   switch.id, switch.draining, DRAIN_TIMEOUT)
+                    break
+                await asyncio.sleep(DRAIN_POLL_SECONDS)
+            del old_api
+            switch.enter("done")
+        except Exception as e:
+            logger.exception("Settings switch %s failed", switch.id)
+            switch.error = str(e)
+            switch.enter("failed")
+            switch.swapped.set()
+
+
+# Global settings switcher
+settings_switcher = SettingsSwitcher()
@@ -0,0 +1,197 @@
+"""Background module load/unload jobs with progress tracking.
+
+KERAG parses one module at a time (``load_module`` changes the shared
+API), but the mirror indexes of a parsed module are built in a process
+pool, so a bulk load indexes one module while KERAG parses the next.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from .cluster import cluster
+from .corpus import INDEX_BUILDERS, ModuleTree, build_indexes, build_module_tree, corpus, loaded_module_roots
+from .kerag_client import client
+from .worker_pool import pools
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_PROCESSES = int(os.getenv("KERAG_INDEX_PROCESSES", str(min(4, os.cpu_count() or 1))))
+# Smaller modules are indexed in-process; shipping them to a worker costs more
+PROCESS_INDEX_MIN_NODES = int(os.getenv("KERAG_PROCESS_INDEX_MIN_NODES", "2000"))
+MAX_JOBS = 200
+
+
+class ModuleJob:
+    """State and progress of one load or unload job."""
+
+    def __init__(self, action: str, modules: List[str]):
+        self.id = uuid.uuid4().hex[:12]
+        self.action = action
+        self.modules = modules
+        self.state = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.files_total = 0
+        self.files_parsed = 0
+        self.nodes_built = 0
+        self.modules_done: List[str] = []
+        self.errors: Dict[str, str] = {}
+        self.results: Dict[str, Any] = {}
+        # Finishes with the job, for callers that wait on it in-process
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "action": self.action,
+            "modules": self.modules,
+            "state": self.state,
+            "progress": {
+                "modules_total": len(self.modules),
+                "modules_done": len(self.modules_done),
+                "files_total": self.files_total,
+                "files_parsed": self.files_parsed,
+                "nodes_built": self.nodes_built,
+            },
+            "elapsed": round(self.elapsed, 3),
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "errors": self.errors,
+            "results": self.results,
+        }
+
+
+class JobRegistry:
+    """Runs module jobs in the background and keeps the most recent ones."""
+
+    def __init__(self, max_jobs: int = MAX_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, ModuleJob]" = OrderedDict()
+        self._processes: Optional[ProcessPoolExecutor] = None
+
+    def get(self, job_id: str) -> Optional[ModuleJob]:
+        return self._jobs.get(job_id)
+
+    def recent(self) -> List[ModuleJob]:
+        return list(reversed(self._jobs.values()))
+
+    def submit(self, action: str, modules: List[str]) -> ModuleJob:
+        """Create a ``load`` or ``unload`` job and start it."""
+        job = ModuleJob(action, modules)
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+        run = self._load if action == "load" else self._unload
+        job.task = asyncio.get_running_loop().create_task(self._run(job, run))
+        return job
+
+    async def _run(self, job: ModuleJob, run):
+        job.state = "running"
+        job.started_at = time.time()
+        try:
+            await run(job)
+            job.state = "failed" if len(job.errors) == len(job.modules) else "done"
+        except Exception as e:
+            logger.exception("Module job %s failed", job.id)
+            job.errors.setdefault("*", str(e))
+            job.state = "failed"
+        job.finished_at = time.time()
+
+    async def _load(self, job: ModuleJob):
+        modules = await client.call("get_all_modules")
+        file_counts = {
+            m.get("name"): m.get("file_count") or 0
+            for m in ((modules.get("data") or {}).get("modules") or [])
+        }
+        job.files_total = sum(file_counts.get(name, 0) for name in job.modules)
+
+        indexing = {}
+        for name in job.modules:
+            result = await cluster.call("load_module", name)
+            if not result.get("success"):
+                job.errors[name] = result.get("error", "Unknown error")
+                continue
+            job.results[name] = result.get("data")
+            job.files_parsed += file_counts.get(name, 0)
+
+            base = job.nodes_built
+
+            def walk(api, name=name, base=base):
+                roots = loaded_module_roots(api).get(name, [])
+                cached = corpus.cached_tree(name, roots)
+                if cached is not None:
+                    return cached
+                return build_module_tree(api, name, roots, indexed=False,
+                                         progress=lambda nodes: setattr(job, "nodes_built", base + nodes))
+
+            tree = await client.run(walk, pool="modules")
+            job.nodes_built = base + len(tree)
+            # Index this module while KERAG parses the next one
+            indexing[name] = asyncio.ensure_future(self._index(tree))
+
+        trees: Dict[str, ModuleTree] = {}
+        for name, future in indexing.items():
+            try:
+                trees[name] = await future
+            except Exception as e:
+                # Loaded but not indexed: the corpus sync below walks it again
+                logger.exception("Indexing module %s failed", name)
+                job.errors[name] = f"Indexing failed: {e}"
+                continue
+            job.modules_done.append(name)
+            logger.info("Indexed module %s (%d nodes)", name, len(trees[name]))
+        await client.run(lambda api: corpus.sync(api, prebuilt=trees), pool="modules")
+
+    async def _index(self, tree: ModuleTree) -> ModuleTree:
+        if tree.snapshot is not None:
+            # Mapped from a snapshot, indexes included
+            return tree
+        builders = list(INDEX_BUILDERS.items())
+        if len(tree) < PROCESS_INDEX_MIN_NODES or INDEX_PROCESSES < 1:
+            tree.indexes = await pools.get("default").run(build_indexes, tree.name, tree.records, builders)
+        else:
+            tree.indexes = await asyncio.get_running_loop().run_in_executor(
+                self._process_pool(), build_indexes, tree.name, tree.records, builders)
+        return tree
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(
+                max_workers=INDEX_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._processes
+
+    async def _unload(self, job: ModuleJob):
+        for name in job.modules:
+            result = await cluster.call("unload_module", name)
+            if result.get("success"):
+                job.results[name] = result.get("data")
+                job.modules_done.append(name)
+            else:
+                job.errors[name] = result.get("error", "Unknown error")
+        await client.run(corpus.sync, pool="modules")
+
+    def shutdown(self):
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+            self._processes = None
+
+
+# Global module job registry
+jobs = JobRegistry()
@@ -1,12 +1,72 @@
 """KERAG API client for the web backend."""
 
+import contextvars
+import os
 import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
 from pathlib import Path
 
 # Add KERAG root to path to import kerag
 sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent.parent))
 
 from kerag.api import KERAGAPI
+from .metrics import metrics
+from .request_state import current_request
+from .worker_pool import pools
+
+
+# Settings key -> environment variable the server starts from
+SETTINGS_ENV = {"kerag_home": "KERAG_HOME", "kerag_local": "KERAG_LOCAL", "kerag_lang": "KERAG_LANG"}
+# Settings of an instance being built on this thread, before it is swapped in
+_building_settings: contextvars.ContextVar[Optional[Dict[str, str]]] = contextvars.ContextVar(
+    "kerag_building_settings", default=None)
+
+
+def settings_from_env() -> Dict[str, str]:
+    """Knowledge base roots and language from KERAG_HOME, KERAG_LOCAL and KERAG_LANG."""
+    return {key: os.getenv(name, "") for key, name in SETTINGS_ENV.items()}
+
+
+class ReadWriteLock:
+    """Lock allowing many concurrent readers or a single writer (writer-preferring)."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
 
 
 class KERAGClient:
@@ -14,6 +74,13 @@ class KERAGClient:
 
     _instance = None
     _api = None
+    _settings: Optional[Dict[str, str]] = None
+    _lock = ReadWriteLock()
+    # id(api) -> calls running on that instance, for draining swapped-out instances
+    _inflight: Dict[int, int] = {}
+    # Guards the served instance together with the counts: a call takes the
+    # instance and counts itself in one step, and swap() replaces it in between
+    _inflight_lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
@@ -24,8 +91,33 @@ class KERAGClient:
         """Initialize KERAG API with root path."""
         if self._api is None:
             self._api = KERAGAPI(local_root, global_root, lang)
+            self._settings = {"kerag_home": global_root or "", "kerag_local": local_root or "",
+                              "kerag_lang": lang or ""}
         return self._api
 
+    def init_from_env(self):
+        """Initialize KERAG API from KERAG_LOCAL, KERAG_HOME and KERAG_LANG."""
+        settings = settings_from_env()
+        return self.init_api(
+            local_root=settings["kerag_local"],
+            global_root=settings["kerag_home"],
+            lang=settings["kerag_lang"]
+        )
+
+    @property
+    def settings(self) -> Dict[str, str]:
+        """Roots and language of the served instance (of the one being built, on the thread building it)."""
+        return _building_settings.get() or self._settings or settings_from_env()
+
+    @contextmanager
+    def building(self, settings: Dict[str, str]):
+        """Make ``settings`` what ``self.settings`` returns on this thread while a new instance is built."""
+        token = _building_settings.set(settings)
+        try:
+            yield
+        finally:
+            _building_settings.reset(token)
+
     @property
     def api(self) -> KERAGAPI:
         """Get the API instance."""
@@ -33,6 +125,83 @@ class KERAGClient:
             raise RuntimeError("KERAG API not initialized. Call init_api() first.")
         return self._api
 
+    def swap(self, new_api: KERAGAPI, settings: Optional[Dict[str, str]] = None) -> Optional[KERAGAPI]:
+        """Atomically replace the API instance (built with ``settings``) and return the old one.
+
+        Calls already running keep the old instance; calls starting after
+        the swap get the new one. Once ``inflight(old)`` drops to zero it
+        stays there, and the old instance can be retired.
+        """
+        with self._inflight_lock:
+            old_api, self._api = self._api, new_api
+            if settings is not None:
+                self._settings = dict(settings)
+        return old_api
+
+    def inflight(self, api: KERAGAPI) -> int:
+        """Number of calls currently running on ``api``."""
+        with self._inflight_lock:
+            return self._inflight.get(id(api), 0)
+
+    @contextmanager
+    def _using(self, write: bool):
+        lock = self._lock.write() if write else self._lock.read()
+        with lock:
+            with self._inflight_lock:
+                api = self.api
+                key = id(api)
+                self._inflight[key] = self._inflight.get(key, 0) + 1
+            try:
+                yield api
+            finally:
+                with self._inflight_lock:
+                    self._inflight[key] -= 1
+                    if not self._inflight[key]:
+                        del self._inflight[key]
+
+    async def run(self, fn, pool: str = "default", write: bool = False):
+        """Run ``fn(api)`` on a worker pool.
+
+        Work that changes the loaded corpus or the API's own state passes
+        ``write=True`` and runs exclusively; everything else may run concurrently.
+        """
+        state = current_request.get()
+
+        def invoke():
+            if state is None:
+                with self._using(write) as api:
+                    return fn(api)
+            # Lets the profiler find this request's frames on the worker thread
+            thread = threading.get_ident()
+            state.add_phase("kerag_wait", time.perf_counter() - started)
+            state.threads.add(thread)
+            running = time.perf_counter()
+            try:
+                with self._using(write) as api:
+                    return fn(api)
+            finally:
+                state.threads.discard(thread)
+                state.add_phase("kerag_run", time.perf_counter() - running)
+
+        started = time.perf_counter()
+        try:
+            return await pools.get(pool).run(invoke)
+        finally:
+            metrics.observe_kerag_call(pool, time.perf_counter() - started)
+
+    def run_sync(self, fn, write: bool = False):
+        """Run ``fn(api)`` on the current thread, under the same lock as ``run``."""
+        with self._using(write) as api:
+            return fn(api)
+
+    def call_sync(self, method: str, *args, write: bool = False, **kwargs):
+        """Call a KERAG API method on the current thread, under the same lock as ``run``."""
+        return self.run_sync(lambda api: getattr(api, method)(*args, **kwargs), write=write)
+
+    async def call(self, method: str, *args, pool: str = "default", write: bool = False, **kwargs):
+        """Call a KERAG API method by name on a worker pool."""
+        return await self.run(lambda api: getattr(api, method)(*args, **kwargs), pool=pool, write=write)
+
 
 # Global client instance
 client = KERAGClient()
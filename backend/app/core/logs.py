@@ -0,0 +1,129 @@
+"""Queue-based logging with request IDs and sampled access logs.
+
+Handlers never write on the thread that logs: records go on a bounded
+queue (dropped and counted when it is full) and a background thread
+formats and writes them. Messages are %-formatted on that thread too, so
+debug calls below the level cost little. Every record carries the
+``request_id`` of the request it was logged for; the ID travels through
+the worker pools with the context, so KERAG-call logs carry it as well.
+
+Environment: ``KERAG_LOG_LEVEL`` (default INFO), ``KERAG_ACCESS_LOG_SAMPLE``
+(fraction of successful requests written to the access log, default 1.0;
+errors are always logged) and ``KERAG_LOG_QUEUE_SIZE`` (default 10000).
+"""
+
+import atexit
+import contextvars
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Optional
+
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+LOG_LEVEL = os.getenv("KERAG_LOG_LEVEL", "INFO").upper()
+ACCESS_LOG_SAMPLE = float(os.getenv("KERAG_ACCESS_LOG_SAMPLE", "1.0"))
+QUEUE_SIZE = int(os.getenv("KERAG_LOG_QUEUE_SIZE", "10000"))
+NO_REQUEST = "-"
+
+# Correlation ID of the request being handled
+request_id: contextvars.ContextVar[str] = contextvars.ContextVar("kerag_request_id", default=NO_REQUEST)
+
+access_logger = logging.getLogger("kerag_web.access")
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request ID (on the logging thread, where the context is)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id.get()
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks: records arriving at a full queue are counted and dropped."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Message formatting is left to the listener thread; tracebacks are
+        # rendered now, while the frames they refer to still exist
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: Optional[DroppingQueueHandler] = None
+_output: Optional[logging.Handler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(level: Optional[str] = None):
+    """Route the root logger through the queue; later calls only change the level."""
+    global _handler, _output
+    root = logging.getLogger()
+    root.setLevel((level or LOG_LEVEL).upper())
+    if _handler is not None:
+        return
+
+    _output = logging.StreamHandler(sys.stderr)
+    _output.setFormatter(logging.Formatter(LOG_FORMAT))
+    _handler = DroppingQueueHandler(queue.Queue(QUEUE_SIZE))
+    _handler.addFilter(RequestIdFilter())
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+
+    _start_listener()
+    atexit.register(stop_logging)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _start_listener():
+    global _listener
+    _listener = logging.handlers.QueueListener(_handler.queue, _output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flush the queue and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _reset_after_fork():
+    # The writer thread does not survive fork, and the queue's lock may have been held
+    if _listener is None:
+        return
+    _handler.queue = queue.Queue(QUEUE_SIZE)
+    _start_listener()
+
+
+def sample_access() -> bool:
+    """Whether a successful request goes to the access log."""
+    return ACCESS_LOG_SAMPLE >= 1.0 or (ACCESS_LOG_SAMPLE > 0 and random.random() < ACCESS_LOG_SAMPLE)
+
+
+def stats():
+    return {
+        "level": logging.getLevelName(logging.getLogger().level),
+        "access_log_sample": ACCESS_LOG_SAMPLE,
+        "queued": _handler.queue.qsize() if _handler is not None else 0,
+        "dropped": _handler.dropped if _handler is not None else 0,
+    }
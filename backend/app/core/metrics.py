@@ -0,0 +1,256 @@
+"""Request metrics in Prometheus text format.
+
+``MetricsMiddleware`` (pure ASGI) times every request and counts request
+and response bytes as they pass, without buffering bodies. KERAG calls
+made by ``client.run`` add their time to the request they belong to and
+to a per-pool histogram. ``metrics.render()`` produces the exposition
+served at ``/api/metrics``; with ``--workers`` each worker reports its
+own requests.
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+import traceback
+import uuid
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from starlette.responses import JSONResponse
+
+from .encoding import route_name
+from .logs import access_logger, request_id, sample_access
+from .request_state import RequestState, current_request
+from .worker_pool import pools
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+PREFIX = "kerag_web"
+# Route label of requests no route matched (keeps scanners from adding label values)
+UNMATCHED_ROUTE = "unmatched"
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+REQUEST_ID_HEADER = b"x-request-id"
+# Client-supplied request IDs are kept only if they look like one
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a sum and a count."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: str) -> Iterable[str]:
+        cumulative = 0
+        sep = "," if labels else ""
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels}{sep}le="{bound:g}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class RouteMetrics:
+    """Histograms and status counts of one method and route."""
+
+    __slots__ = ("latency", "kerag", "request_size", "response_size", "statuses")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.kerag = Histogram(LATENCY_BUCKETS)
+        self.request_size = Histogram(SIZE_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.statuses: Dict[int, int] = {}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Process-wide request and KERAG-call metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self._kerag_calls: Dict[str, Histogram] = {}
+        self.in_flight = 0
+        self.unhandled_exceptions = 0
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float,
+                        request_bytes: int, response_bytes: int, kerag_seconds: float):
+        with self._lock:
+            entry = self._routes.get((method, route))
+            if entry is None:
+                entry = self._routes[(method, route)] = RouteMetrics()
+            entry.latency.observe(seconds)
+            entry.kerag.observe(kerag_seconds)
+            entry.request_size.observe(request_bytes)
+            entry.response_size.observe(response_bytes)
+            entry.statuses[status] = entry.statuses.get(status, 0) + 1
+
+    def observe_kerag_call(self, pool: str, seconds: float):
+        """Record a KERAG call, also against the current request if there is one."""
+        with self._lock:
+            histogram = self._kerag_calls.get(pool)
+            if histogram is None:
+                histogram = self._kerag_calls[pool] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+        state = current_request.get()
+        if state is not None:
+            state.kerag_seconds += seconds
+            state.kerag_calls += 1
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def header(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+        with self._lock:
+            routes = sorted(self._routes.items())
+            kerag_calls = sorted(self._kerag_calls.items())
+
+            header("requests_total", "counter", "Requests by method, route and status.")
+            for (method, route), entry in routes:
+                for status, count in sorted(entry.statuses.items()):
+                    lines.append(f'{PREFIX}_requests_total{{method="{method}",route="{_escape(route)}",'
+                                 f'status="{status}"}} {count}')
+
+            for name, attr, help_text in (
+                ("request_duration_seconds", "latency", "Time from request start to the last response byte."),
+                ("request_kerag_seconds", "kerag", "Time spent in KERAG calls per request."),
+                ("request_size_bytes", "request_size", "Request body size."),
+                ("response_size_bytes", "response_size", "Response body size as sent."),
+            ):
+                header(name, "histogram", help_text)
+                for (method, route), entry in routes:
+                    labels = f'method="{method}",route="{_escape(route)}"'
+                    lines.extend(getattr(entry, attr).samples(f"{PREFIX}_{name}", labels))
+
+            header("kerag_call_seconds", "histogram", "KERAG call time by worker pool, queue wait included.")
+            for pool, histogram in kerag_calls:
+                lines.extend(histogram.samples(f"{PREFIX}_kerag_call_seconds", f'pool="{_escape(pool)}"'))
+
+            header("requests_in_flight", "gauge", "Requests being handled.")
+            lines.append(f"{PREFIX}_requests_in_flight {self.in_flight}")
+            header("unhandled_exceptions_total", "counter", "Requests that raised an unhandled exception.")
+            lines.append(f"{PREFIX}_unhandled_exceptions_total {self.unhandled_exceptions}")
+
+        pool_stats = pools.stats()
+        for name, key, help_text in (
+            ("pool_running", "running", "Tasks running on a KERAG worker pool."),
+            ("pool_queued", "queued", "Tasks waiting for a KERAG worker pool."),
+            ("pool_rejected_total", "rejected", "Tasks rejected by a saturated KERAG worker pool."),
+        ):
+            header(name, "counter" if name.endswith("_total") else "gauge", help_text)
+            for pool, stats in sorted(pool_stats.items()):
+                lines.append(f'{PREFIX}_{name}{{pool="{_escape(pool)}"}} {stats[key]}')
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics registry
+metrics = Metrics()
+
+
+def _request_id(scope) -> str:
+    for name, value in scope.get("headers") or ():
+        if name == REQUEST_ID_HEADER:
+            value = value.decode("latin-1")
+            if VALID_REQUEST_ID.match(value):
+                return value
+            break
+    return uuid.uuid4().hex[:16]
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status, sizes and KERAG time of each request.
+
+    It also gives each request an ID (the client's ``X-Request-ID`` or a new
+    one, echoed in the response) for the logs, writes the access log line,
+    and is the last line of defence: an unhandled exception is logged with
+    its traceback and answered with a 500 if the response has not started.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        state = RequestState()
+        token = current_request.set(state)
+        rid = _request_id(scope)
+        rid_token = request_id.set(rid)
+        status = 500
+        request_bytes = 0
+        response_bytes = 0
+        response_started = False
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status, response_bytes, response_started
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_started = True
+                message["headers"] = list(message.get("headers") or []) + [(REQUEST_ID_HEADER, rid.encode())]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        except Exception as exc:
+            metrics.unhandled_exceptions += 1
+            error_detail = traceback.format_exc()
+            logger.error("Uncaught exception in %s %s: %s: %s\n%s",
+                         scope["method"], scope["path"], exc.__class__.__name__, exc, error_detail)
+            if response_started:
+                raise
+            response = JSONResponse(
+                status_code=500,
+                content={"error": "Internal server error", "detail": str(exc), "traceback": error_detail}
+            )
+            await response(scope, counting_receive, counting_send)
+        finally:
+            metrics.in_flight -= 1
+            seconds = time.perf_counter() - started
+            route = route_name(scope) if scope.get("route") is not None else UNMATCHED_ROUTE
+            metrics.observe_request(scope["method"], route, status, seconds,
+                                    request_bytes, response_bytes, state.kerag_seconds)
+            if status >= 400 or sample_access():
+                level = state.access_level
+                if level is None:
+                    level = logging.ERROR if status >= 500 else logging.WARNING if status >= 400 else logging.INFO
+                access_logger.log(level, "%s %s %d %.1fms %dB kerag=%.1fms/%d",
+                                  scope["method"], scope["path"], status, seconds * 1000, response_bytes,
+                                  state.kerag_seconds * 1000, state.kerag_calls)
+            request_id.reset(rid_token)
+            current_request.reset(token)
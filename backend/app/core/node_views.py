@@ -0,0 +1,66 @@
+"""Cache of rendered node views, validated with strong ETags."""
+
+import hashlib
+import os
+from typing import Any, Dict, NamedTuple, Optional
+
+from .cache import LRUCache
+from .encoding import dumps
+
+
+class NodeViewError(Exception):
+    """Raised when KERAG cannot render a node view."""
+
+
+class RenderedView(NamedTuple):
+    """A serialized ``get_node_view`` response and its ETag."""
+    body: bytes
+    etag: str
+
+
+# Rendered views, keyed by the generation of their module: reloading one
+# module leaves the others' views cached, and stale entries age out
+view_cache = LRUCache(
+    max_bytes=int(float(os.getenv("KERAG_VIEW_CACHE_MB", "128")) * 1024 * 1024),
+    ttl=float(os.getenv("KERAG_VIEW_CACHE_TTL", "3600"))
+)
+
+
+def view_key(node_id: str, depth: int, include_content: bool, include_see_also: bool,
+             format: str, show_metadata: bool, display_mode: str, generation: int) -> tuple:
+    """Cache key covering every rendering option and the generation of the node's module."""
+    return (node_id, depth, include_content, include_see_also, format, show_metadata, display_mode, generation)
+
+
+def serialize_view(result: Dict[str, Any]) -> RenderedView:
+    """Serialize a view the way JSONResponse would and compute its ETag."""
+    body = dumps(result)
+    return RenderedView(body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against a strong ETag (weak comparison, as RFC 9110 asks)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def render_view(api, key: tuple) -> RenderedView:
+    """Render a node view and cache it under ``key``."""
+    node_id, depth, include_content, include_see_also, format, show_metadata, display_mode, _ = key
+    result = api.get_node_view(
+        node_id=node_id,
+        depth=depth,
+        include_content=include_content,
+        include_see_also=include_see_also,
+        format=format,
+        show_metadata=show_metadata,
+        display_mode=display_mode
+    )
+    if not result.get("success"):
+        raise NodeViewError(result.get("error") or f"Node not found: {node_id}")
+    view = serialize_view(result)
+    view_cache.put(key, view, len(view.body))
+    return view
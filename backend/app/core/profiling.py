@@ -0,0 +1,365 @@
+"""On-demand request profiling and the slow-request buffer.
+
+A request to ``/api/*`` carrying the admin token (``X-KERAG-Profile``
+header or ``_profile`` query parameter, checked against
+``KERAG_PROFILE_TOKEN``) is profiled: a background thread samples the call
+stacks of the event loop, while it runs the request's task, and of the
+worker threads running its KERAG calls. The response gets a
+``Server-Timing`` header with the phase timings and an
+``X-KERAG-Profile-URL`` header pointing at the profile. Requests still
+running after ``KERAG_PROFILE_SLOW_MS`` are sampled the same way without
+asking, so slow requests come with a profile of their slow part.
+
+``slow_requests`` keeps the ``KERAG_SLOW_REQUESTS`` slowest requests of
+the last ``KERAG_SLOW_WINDOW`` seconds with their parameters, phase
+timings and profile. With ``--workers`` each worker keeps its own.
+"""
+
+import asyncio
+import hmac
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .encoding import route_name
+from .logs import request_id
+from .request_state import RequestState, current_request
+
+
+PROFILE_TOKEN = os.getenv("KERAG_PROFILE_TOKEN", "")
+PROFILE_HEADER = "x-kerag-profile"
+PROFILE_PARAM = "_profile"
+PROFILE_URL = "/api/debug/profiles/"
+SAMPLE_INTERVAL = float(os.getenv("KERAG_PROFILE_INTERVAL_MS", "5")) / 1000
+# Requests running longer than this are profiled without asking (0: never)
+AUTO_PROFILE_AFTER = float(os.getenv("KERAG_PROFILE_SLOW_MS", "500")) / 1000
+SLOW_REQUESTS = int(os.getenv("KERAG_SLOW_REQUESTS", "20"))
+SLOW_WINDOW = float(os.getenv("KERAG_SLOW_WINDOW", "3600"))
+KEEP_PROFILES = 32
+MAX_STACK_DEPTH = 48
+TOP_STACKS = 40
+TOP_FUNCTIONS = 30
+# Query parameters recorded with slow requests
+CAPTURED_PARAMS = ("node_id", "depth", "format", "q", "scope", "rank", "target")
+EVENT_STREAM = "text/event-stream"
+# Sample of a request whose task was waiting (on a pool, the network or the loop)
+WAITING = ("waiting",)
+
+
+def admin_token(scope) -> Optional[str]:
+    """The profiling token sent with a request, from the header or the query string."""
+    token = Headers(scope=scope).get(PROFILE_HEADER)
+    if token is None and PROFILE_PARAM.encode() in scope.get("query_string", b""):
+        for name, value in parse_qsl(scope["query_string"].decode("latin-1")):
+            if name == PROFILE_PARAM:
+                return value
+    return token
+
+
+def is_admin(scope) -> bool:
+    token = admin_token(scope)
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+def _frame_label(code, lineno: int) -> str:
+    return f"{_function_label(code)}:{lineno}"
+
+
+def _function_label(code) -> str:
+    path = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{'/'.join(path[-2:])}:{code.co_name}"
+
+
+class Profile:
+    """Stack samples of one request, taken once it has run for ``after`` seconds."""
+
+    def __init__(self, state: RequestState, after: float, requested: bool):
+        self.state = state
+        self.after = after
+        self.requested = requested
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.loop_thread = threading.get_ident()
+        self.samples = 0
+        self.stacks: Dict[Tuple, int] = {}
+
+    def due(self, now: float) -> bool:
+        return now - self.state.started >= self.after
+
+    def sample(self, frames: Dict[int, Any]):
+        threads = [("worker", ident) for ident in tuple(self.state.threads)]
+        if asyncio.current_task(self.loop) is self.task:
+            threads.append(("event_loop", self.loop_thread))
+        self.samples += 1
+        if not threads:
+            self.stacks[WAITING] = self.stacks.get(WAITING, 0) + 1
+            return
+        for root, ident in threads:
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append((frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            key = (root,) + tuple(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        stacks = sorted(self.stacks.items(), key=lambda item: -item[1])
+        # Function -> [samples where it is innermost, samples where it is on the stack]
+        functions: Dict[str, List[int]] = {}
+        for key, count in stacks:
+            seen = set()
+            for code, _ in key[1:]:
+                name = _function_label(code)
+                entry = functions.setdefault(name, [0, 0])
+                if name not in seen:
+                    seen.add(name)
+                    entry[1] += count
+            if len(key) > 1:
+                functions[_function_label(key[-1][0])][0] += count
+        return {
+            "samples": self.samples,
+            "interval_ms": SAMPLE_INTERVAL * 1000,
+            "started_after_ms": round(self.after * 1000, 3),
+            "requested": self.requested,
+            # Folded stacks (root;caller;...;callee), as flame graph tools read them
+            "stacks": [
+                {"stack": ";".join([key[0]] + [_frame_label(code, line) for code, line in key[1:]]), "count": count}
+                for key, count in stacks[:TOP_STACKS]
+            ],
+            "functions": [
+                {"function": name, "self": own, "total": total}
+                for name, (own, total) in sorted(functions.items(), key=lambda item: (-item[1][1], -item[1][0]))
+                [:TOP_FUNCTIONS]
+            ],
+        }
+
+
+class StackSampler:
+    """One background thread sampling the stacks of every active profile."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._profiles: Set[Profile] = set()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="kerag-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def remove(self, profile: Profile):
+        """Stop sampling ``profile``; no sample of it is being taken once this returns."""
+        with self._lock:
+            self._profiles.discard(profile)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._profiles:
+                    self._wake.clear()
+                    continue
+                now = time.perf_counter()
+                due = [profile for profile in self._profiles if profile.due(now)]
+                if not due:
+                    continue
+                frames = sys._current_frames()
+                for profile in due:
+                    profile.sample(frames)
+                del frames
+
+    def reset_after_fork(self):
+        # The sampling thread does not survive fork
+        self._lock = threading.Lock()
+        self._profiles = set()
+        self._wake = threading.Event()
+        self._thread = None
+
+
+class SlowRequestLog:
+    """The ``size`` slowest requests of the last ``window`` seconds (0: no expiry)."""
+
+    def __init__(self, size: int = SLOW_REQUESTS, window: float = SLOW_WINDOW):
+        self.size = max(0, size)
+        self.window = window
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._sequence = itertools.count()
+
+    def _expire(self):
+        if self.window > 0 and self._heap:
+            cutoff = time.time() - self.window
+            if any(entry["at"] < cutoff for _, _, entry in self._heap):
+                self._heap = [item for item in self._heap if item[2]["at"] >= cutoff]
+                heapq.heapify(self._heap)
+
+    def qualifies(self, seconds: float) -> bool:
+        """Whether a request this slow would be kept (checked before building its entry)."""
+        if not self.size:
+            return False
+        with self._lock:
+            self._expire()
+            return len(self._heap) < self.size or seconds > self._heap[0][0]
+
+    def add(self, seconds: float, entry: Dict[str, Any]):
+        if not self.size:
+            return
+        item = (seconds, next(self._sequence), entry)
+        with self._lock:
+            self._expire()
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif seconds > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Kept requests, slowest first."""
+        with self._lock:
+            self._expire()
+            return [entry for _, _, entry in sorted(self._heap, reverse=True)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": self.size, "window_seconds": self.window, "kept": len(self._heap)}
+
+
+class ProfileStore:
+    """The most recent on-demand profiles, by request ID."""
+
+    def __init__(self, size: int = KEEP_PROFILES):
+        self.size = size
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, rid: str, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries[rid] = entry
+            self._entries.move_to_end(rid)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get(self, rid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(rid)
+
+
+# Global sampler, slow-request buffer and on-demand profiles
+sampler = StackSampler()
+slow_requests = SlowRequestLog()
+recent_profiles = ProfileStore()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=sampler.reset_after_fork)
+
+
+def phase_timings(state: RequestState, seconds: float) -> Dict[str, float]:
+    """Phase timings in milliseconds; ``other`` is the total not covered by a phase."""
+    phases = {name: round(value * 1000, 3) for name, value in state.phases.items()}
+    # KERAG calls of one request may overlap (batch), so the phases can add up to more than the total
+    phases["other"] = round(max(0.0, seconds - sum(state.phases.values())) * 1000, 3)
+    phases["total"] = round(seconds * 1000, 3)
+    return phases
+
+
+def server_timing(phases: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={value}" for name, value in phases.items())
+
+
+def _params(scope) -> Dict[str, str]:
+    query = scope.get("query_string", b"")
+    if not query:
+        return {}
+    return {name: value for name, value in parse_qsl(query.decode("latin-1")) if name in CAPTURED_PARAMS}
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests on demand and feeding the slow-request buffer.
+
+    It runs inside ``MetricsMiddleware``, which sets up the request state
+    and request ID it reads.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        state = current_request.get()
+        if scope["type"] != "http" or state is None:
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        requested = (bool(PROFILE_TOKEN) and path.startswith("/api/") and not path.startswith("/api/debug/")
+                     and is_admin(scope))
+        profile = None
+        if requested or AUTO_PROFILE_AFTER > 0:
+            profile = Profile(state, 0.0 if requested else AUTO_PROFILE_AFTER, requested)
+            sampler.add(profile)
+        rid = request_id.get()
+        status = 500
+        held = None
+        event_stream = False
+
+        async def send_profiled(message):
+            nonlocal status, held, event_stream
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if Headers(raw=message.get("headers") or []).get("content-type", "").startswith(EVENT_STREAM):
+                    # Open for as long as the client listens: neither profiled nor slow
+                    event_stream = True
+                    if profile is not None:
+                        sampler.remove(profile)
+                    await send(message)
+                    return
+                if requested:
+                    # Held back until the body is complete, to carry the phase timings
+                    held = message
+                    return
+            elif message["type"] == "http.response.body" and held is not None:
+                start, held = held, None
+                start["headers"] = list(start.get("headers") or [])
+                headers = MutableHeaders(raw=start["headers"])
+                headers["X-KERAG-Profile-URL"] = PROFILE_URL + rid
+                if not message.get("more_body"):
+                    headers["Server-Timing"] = server_timing(
+                        phase_timings(state, time.perf_counter() - state.started))
+                await send(start)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            if profile is not None:
+                sampler.remove(profile)
+            seconds = time.perf_counter() - state.started
+            if not event_stream and (requested or slow_requests.qualifies(seconds)):
+                entry = {
+                    "request_id": rid,
+                    "at": time.time(),
+                    "method": scope["method"],
+                    "route": route_name(scope) if scope.get("route") is not None else path,
+                    "path": path,
+                    "params": _params(scope),
+                    "status": status,
+                    "duration_ms": round(seconds * 1000, 3),
+                    "kerag_calls": state.kerag_calls,
+                    "phases": phase_timings(state, seconds),
+                    "profile": profile.to_dict() if profile is not None and (requested or profile.samples) else None,
+                }
+                slow_requests.add(seconds, entry)
+                if requested:
+                    recent_profiles.put(rid, entry)
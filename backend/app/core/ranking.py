@@ -0,0 +1,161 @@
+"""BM25 relevance ranking over the corpus mirror, scored with NumPy."""
+
+import re
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .corpus import SEARCH_SCOPES, ModuleTree, register_index
+
+
+K1 = 1.2
+B = 0.75
+MAX_PREFIX_EXPANSION = 64
+
+# Single CJK characters, or runs of other letters and digits
+_TOKEN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]|[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lower-cased terms."""
+    return _TOKEN.findall(text.lower())
+
+
+@register_index("bm25")
+class BM25Index:
+    """Term statistics of one module in compressed sparse (CSR) form.
+
+    Postings of term ``t`` are ``doc_ids[ptr[t]:ptr[t + 1]]`` with term
+    frequencies ``tfs[ptr[t]:ptr[t + 1]]``; documents are node positions in
+    the module's scan order and cover all search scopes.
+    """
+
+    def __init__(self, tree: ModuleTree):
+        counts: Dict[str, Dict[int, int]] = {}
+        doc_len = np.zeros(len(tree), dtype=np.float32)
+        for position, record in enumerate(tree.records):
+            terms = tokenize(" ".join(record.field(scope) for scope in SEARCH_SCOPES))
+            doc_len[position] = len(terms)
+            for term in terms:
+                postings = counts.setdefault(term, {})
+                postings[position] = postings.get(position, 0) + 1
+
+        self.terms = sorted(counts)
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        ptr = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        for i, term in enumerate(self.terms):
+            ptr[i + 1] = ptr[i] + len(counts[term])
+        doc_ids = np.empty(ptr[-1], dtype=np.int32)
+        tfs = np.empty(ptr[-1], dtype=np.float32)
+        for i, term in enumerate(self.terms):
+            postings = counts[term]
+            doc_ids[ptr[i]:ptr[i + 1]] = list(postings)
+            tfs[ptr[i]:ptr[i + 1]] = list(postings.values())
+
+        self.ptr = ptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.size = len(tree)
+
+    def dump(self):
+        """Term list and CSR arrays, for snapshots."""
+        return {"size": self.size}, {
+            "terms": self.terms,
+            "ptr": self.ptr,
+            "doc_ids": self.doc_ids,
+            "tfs": self.tfs,
+            "doc_len": self.doc_len,
+        }
+
+    @classmethod
+    def restore(cls, meta, arrays) -> "BM25Index":
+        index = cls.__new__(cls)
+        index.size = meta["size"]
+        index.terms = arrays["terms"]
+        index.term_ids = {term: i for i, term in enumerate(index.terms)}
+        index.ptr = arrays["ptr"]
+        index.doc_ids = arrays["doc_ids"]
+        index.tfs = arrays["tfs"]
+        index.doc_len = arrays["doc_len"]
+        return index
+
+    def expand(self, token: str) -> List[str]:
+        """The term itself if indexed, otherwise indexed terms it prefixes."""
+        if token in self.term_ids:
+            return [token]
+        start = bisect_left(self.terms, token)
+        expanded = []
+        for term in self.terms[start:start + MAX_PREFIX_EXPANSION]:
+            if not term.startswith(token):
+                break
+            expanded.append(term)
+        return expanded
+
+    def df(self, term: str) -> int:
+        """Number of nodes containing ``term``."""
+        term_id = self.term_ids.get(term)
+        return 0 if term_id is None else int(self.ptr[term_id + 1] - self.ptr[term_id])
+
+    def score(self, idf: Dict[str, float], avgdl: float) -> np.ndarray:
+        """BM25 score of every node in the module for the weighted terms."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        norm = K1 * (1 - B + B * self.doc_len / max(avgdl, 1e-9))
+        for term, weight in idf.items():
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            lo, hi = self.ptr[term_id], self.ptr[term_id + 1]
+            docs = self.doc_ids[lo:hi]
+            tf = self.tfs[lo:hi]
+            scores[docs] += weight * tf * (K1 + 1) / (tf + norm[docs])
+        return scores
+
+
+def rank_hits(trees: Sequence[ModuleTree], hits: Sequence[Tuple[int, int]], keyword: str,
+              top_k: int) -> List[Tuple[int, float]]:
+    """Rank hits with BM25 and return the ``top_k`` best.
+
+    ``hits`` are ``(tree index, node position)`` pairs in scan order. Term
+    statistics are pooled across modules so scores are comparable, and the
+    top-k is taken with a partial sort. Returns ``(hit index, score)``.
+    """
+    if not hits:
+        return []
+    indexes: List[BM25Index] = [tree.indexes["bm25"] for tree in trees]
+
+    # Query terms, expanding partial words to the indexed terms they prefix
+    terms = set()
+    for token in set(tokenize(keyword)):
+        for index in indexes:
+            terms.update(index.expand(token))
+
+    total_docs = sum(index.size for index in indexes)
+    total_len = float(sum(index.doc_len.sum() for index in indexes))
+    avgdl = total_len / total_docs if total_docs else 0.0
+    idf = {}
+    for term in terms:
+        df = sum(index.df(term) for index in indexes)
+        idf[term] = float(np.log(1 + (total_docs - df + 0.5) / (df + 0.5)))
+
+    hit_array = np.asarray(hits, dtype=np.int64)
+    scores = np.zeros(len(hits), dtype=np.float32)
+    for tree_index, index in enumerate(indexes):
+        mask = hit_array[:, 0] == tree_index
+        if mask.any():
+            scores[mask] = index.score(idf, avgdl)[hit_array[mask, 1]]
+
+    k = min(top_k, len(hits))
+    if k < len(hits):
+        # Partial sort for the k-th best score, then fill ties in scan order
+        # so that the selection is stable across page sizes
+        threshold = np.partition(-scores, k - 1)[k - 1]
+        above = np.flatnonzero(-scores < threshold)
+        ties = np.flatnonzero(-scores == threshold)[:k - len(above)]
+        top = np.concatenate([above, ties])
+    else:
+        top = np.arange(len(hits))
+    # Best score first; ties keep scan order
+    top = top[np.lexsort((top, -scores[top]))]
+    return [(int(i), float(scores[i])) for i in top]
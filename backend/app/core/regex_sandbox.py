@@ -0,0 +1,318 @@
+"""Time-bounded regex matching in interruptible worker processes.
+
+A catastrophic-backtracking pattern holds the GIL, so it cannot be stopped
+from another thread. User-supplied regexes are therefore matched in worker
+processes that hold a copy of the searchable text; when a query runs out
+of time its worker is killed and the matches found so far are returned.
+
+Loading the text into a worker costs a process spawn and a copy of the
+whole corpus, so a background thread does it ahead of queries: when the
+loaded modules change it reloads the idle workers, and it keeps
+``KERAG_REGEX_SPARE_WORKERS`` loaded workers idle, replacing killed ones.
+Queries only wait for a loaded worker, within their budget.
+"""
+
+import logging
+import multiprocessing
+import os
+import pickle
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+DEFAULT_TIMEOUT = float(os.getenv("KERAG_REGEX_TIMEOUT", "2.0"))
+SANDBOX_ENABLED = os.getenv("KERAG_REGEX_SANDBOX", "1") not in ("0", "false", "no")
+# Loaded workers kept idle once regex search has been used
+SPARE_WORKERS = int(os.getenv("KERAG_REGEX_SPARE_WORKERS", "1"))
+RETRY_SECONDS = 1.0
+MAX_SPANS = 10
+SEND_EVERY = 0.05
+
+# Worker rows are (title, label, content); scopes index into them
+SCOPE_COLUMNS = {"title": 0, "label": 1, "content": 2}
+
+logger = logging.getLogger(__name__)
+
+Span = Tuple[int, int]
+
+
+class SearchBudget:
+    """Wall-clock budget of one search; records whether it ran out."""
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT):
+        self.deadline = time.monotonic() + timeout
+        self.truncated = False
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+
+def _worker_main(conn):
+    """Worker process loop: keep texts, match patterns against candidates."""
+    key = None
+    texts: List[List[Tuple[str, str, str]]] = []
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message[0] == "load":
+            _, key, texts = message
+            conn.send(("loaded", key))
+            continue
+
+        _, pattern, flags, columns, work, limit = message
+        matcher = re.compile(pattern, flags)
+        batch = []
+        found = 0
+        last_send = time.monotonic()
+        for tree_index, positions in work:
+            rows = texts[tree_index]
+            for position in positions:
+                row = rows[position]
+                spans = {}
+                for column in columns:
+                    found_spans = []
+                    for match in matcher.finditer(row[column] or ""):
+                        found_spans.append(match.span())
+                        if len(found_spans) >= MAX_SPANS:
+                            break
+                    if found_spans:
+                        spans[column] = found_spans
+                if spans:
+                    batch.append((tree_index, position, spans))
+                    found += 1
+                now = time.monotonic()
+                if batch and (now - last_send >= SEND_EVERY or (limit and found >= limit)):
+                    conn.send(("hits", batch))
+                    batch = []
+                    last_send = now
+                if limit and found >= limit:
+                    break
+            if limit and found >= limit:
+                break
+        if batch:
+            conn.send(("hits", batch))
+        conn.send(("done", None))
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.key = None
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(timeout=1)
+        finally:
+            self.conn.close()
+
+
+class RegexSandbox:
+    """Pool of worker processes for budgeted regex matching."""
+
+    def __init__(self, spare_workers: int = SPARE_WORKERS):
+        self._context = multiprocessing.get_context("spawn")
+        self.spare_workers = max(0, spare_workers)
+        # Idle workers loaded with ``_key`` (or being reloaded by the warmer)
+        self._idle: List[_Worker] = []
+        self._changed = threading.Condition()
+        self._key = None
+        # Returns the current (key, trees) when the warmer needs text
+        self._source: Optional[Callable[[], Tuple[Any, Sequence[Any]]]] = None
+        self._warmer: Optional[threading.Thread] = None
+        self._stopped = False
+        self.timeouts = 0
+        self.queries = 0
+        self.loads = 0
+
+    def prepare(self, key: Any, source: Callable[[], Tuple[Any, Sequence[Any]]]):
+        """Have idle workers reloaded for ``key``; ``source()`` returns the
+        current ``(key, trees)`` when the text is read.
+
+        Called when the loaded modules change. Nothing is spawned before the
+        first regex query, so a server that never sees one never starts a worker.
+        """
+        with self._changed:
+            if self._key is not None and key < self._key:
+                return
+            self._key, self._source = key, source
+            self._changed.notify_all()
+
+    def _load_message(self, key, trees) -> bytes:
+        rows = [[(r.title, r.label, r.content) for r in tree.records] for tree in trees]
+        return pickle.dumps(("load", key, rows), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _warm(self):
+        """Warmer thread: reload stale idle workers and keep the spares up."""
+        while True:
+            with self._changed:
+                while not self._stopped and not self._needs_work():
+                    self._changed.wait()
+                if self._stopped:
+                    return
+                source = self._source
+                stale = [w for w in self._idle if w.key != self._key]
+                self._idle = [w for w in self._idle if w.key == self._key]
+                missing = max(0, self.spare_workers - len(self._idle) - len(stale))
+            loaded: List[_Worker] = []
+            try:
+                key, trees = source()
+                # Pickled once for every worker loaded in this round
+                message = self._load_message(key, trees)
+                for worker in stale + [None] * missing:
+                    worker = worker or _Worker(self._context)
+                    loaded.append(worker)
+                    self._load(worker, key, message)
+                # Not kept while idle: it is a copy of the whole corpus text
+                message = None
+            except Exception:
+                logger.exception("Preparing regex workers failed")
+                for worker in loaded:
+                    worker.kill()
+                with self._changed:
+                    # Queries load their own worker meanwhile
+                    self._changed.wait(RETRY_SECONDS)
+                continue
+            with self._changed:
+                if self._key is None or key > self._key:
+                    self._key = key
+                for worker in loaded:
+                    if worker.key == self._key:
+                        self._idle.append(worker)
+                    else:
+                        worker.kill()
+                self._changed.notify_all()
+
+    def _needs_work(self) -> bool:
+        if self._source is None:
+            return False
+        ready = sum(1 for w in self._idle if w.key == self._key)
+        return ready < self.spare_workers or ready < len(self._idle)
+
+    def _load(self, worker: _Worker, key, message: bytes, timeout: Optional[float] = None) -> bool:
+        worker.conn.send_bytes(message)
+        if timeout is not None and not worker.conn.poll(max(0.0, timeout)):
+            return False
+        worker.conn.recv()
+        worker.key = key
+        self.loads += 1
+        return True
+
+    def _start_warmer(self):
+        if self._warmer is None and self.spare_workers:
+            self._warmer = threading.Thread(target=self._warm, name="kerag-regex-warmer", daemon=True)
+            self._warmer.start()
+
+    def _acquire(self, key: Any, trees: Sequence[Any], budget: SearchBudget) -> Optional[_Worker]:
+        """A worker loaded with ``key``, or None when the budget ran out first."""
+        with self._changed:
+            if self._key is None or key > self._key:
+                self._key, self._source = key, (lambda: (key, trees))
+                self._changed.notify_all()
+            self._start_warmer()
+            while key == self._key and self.spare_workers:
+                for i, worker in enumerate(self._idle):
+                    if worker.key == key:
+                        if not worker.process.is_alive():
+                            self._idle.pop(i).kill()
+                            break
+                        return self._idle.pop(i)
+                else:
+                    # Tell the warmer one was taken; wait for it to load another
+                    self._changed.notify_all()
+                    remaining = budget.remaining()
+                    if remaining <= 0:
+                        return None
+                    self._changed.wait(remaining)
+        # Text of an older generation than the workers hold, or no spares
+        # configured: load a fresh worker here, within the budget
+        worker = _Worker(self._context)
+        if self._load(worker, key, self._load_message(key, trees), timeout=budget.remaining()):
+            return worker
+        worker.kill()
+        return None
+
+    def _release(self, worker: _Worker):
+        with self._changed:
+            if worker.key == self._key:
+                self._idle.append(worker)
+                self._changed.notify_all()
+                return
+        worker.kill()
+
+    def matches(self, key: Any, trees: Sequence[Any], matcher: re.Pattern, scopes: Sequence[str],
+                work: List[Tuple[int, List[int]]], limit: Optional[int],
+                budget: SearchBudget) -> Iterator[Tuple[int, int, Dict[str, List[Span]]]]:
+        """Yield ``(tree index, position, {scope: spans})`` for matching candidates.
+
+        ``key`` identifies the corpus contents (a generation, increasing
+        with each change) and ``trees`` are its modules. Stops with
+        ``budget.truncated`` set when the budget runs out, including while
+        waiting for a worker loaded with that text.
+        """
+        self.queries += 1
+        worker = self._acquire(key, trees, budget)
+        if worker is None:
+            budget.truncated = True
+            self.timeouts += 1
+            return
+        finished = False
+        try:
+            columns = [SCOPE_COLUMNS[scope] for scope in scopes]
+            worker.conn.send(("search", matcher.pattern, matcher.flags, columns, work, limit))
+            found = 0
+            while not finished:
+                remaining = budget.remaining()
+                if remaining <= 0 or not worker.conn.poll(remaining):
+                    budget.truncated = True
+                    self.timeouts += 1
+                    return
+                kind, payload = worker.conn.recv()
+                if kind == "done":
+                    finished = True
+                    return
+                found += len(payload)
+                if limit and found >= limit:
+                    # Last batch: collect "done" first so the worker can be
+                    # reused even if the caller stops consuming here. A worker
+                    # that does not send it in time is replaced, but the
+                    # hits are complete.
+                    remaining = budget.remaining()
+                    finished = remaining > 0 and worker.conn.poll(remaining) and worker.conn.recv()[0] == "done"
+                for tree_index, position, spans in payload:
+                    yield tree_index, position, {scopes[columns.index(c)]: s for c, s in spans.items()}
+        finally:
+            if finished:
+                self._release(worker)
+            else:
+                # Timed out or abandoned mid-scan: the worker may still be busy.
+                # The warmer loads a replacement in the background.
+                worker.kill()
+                with self._changed:
+                    self._changed.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._changed:
+            idle = len(self._idle)
+            ready = sum(1 for w in self._idle if w.key == self._key)
+        return {"enabled": SANDBOX_ENABLED, "queries": self.queries, "timeouts": self.timeouts,
+                "idle_workers": idle, "ready_workers": ready, "loads": self.loads}
+
+    def shutdown(self):
+        with self._changed:
+            self._stopped = True
+            workers, self._idle = self._idle, []
+            self._changed.notify_all()
+        for worker in workers:
+            worker.kill()
+
+
+# Global sandbox for user-supplied regex searches
+regex_sandbox = RegexSandbox()
@@ -0,0 +1,45 @@
+"""State of the request being handled, reachable from code running for it."""
+
+import contextvars
+import logging
+import time
+from typing import Dict, Optional, Set
+
+
+class RequestState:
+    """Per-request accumulators: KERAG time, phase timings and the pool threads working for it."""
+
+    __slots__ = ("started", "kerag_seconds", "kerag_calls", "phases", "threads", "access_level")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.kerag_seconds = 0.0
+        self.kerag_calls = 0
+        # Phase name -> seconds (kerag_wait, kerag_run, encode, compress)
+        self.phases: Dict[str, float] = {}
+        # Idents of worker threads currently running a call of this request
+        self.threads: Set[int] = set()
+        # Access log level chosen by the handler, overriding the one derived from the status
+        self.access_level: Optional[int] = None
+
+    def add_phase(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+# State of the request being handled by the current task
+current_request: contextvars.ContextVar[Optional[RequestState]] = contextvars.ContextVar(
+    "kerag_request", default=None)
+
+
+def add_phase(name: str, seconds: float):
+    """Add ``seconds`` to a phase of the current request, if there is one."""
+    state = current_request.get()
+    if state is not None:
+        state.add_phase(name, seconds)
+
+
+def set_access_level(level: int = logging.INFO):
+    """Log the current request's access line at ``level`` whatever its status, if there is one."""
+    state = current_request.get()
+    if state is not None:
+        state.access_level = level
@@ -0,0 +1,155 @@
+"""Resolution of full and shorthand node IDs from per-module indexes.
+
+A target resolves, in order, as a full node ID, as ``module::suffix``
+within that module, as a bare shorthand suffix (``c``, ``b/c`` or
+``a/b/c`` for ``module::a/b/c``) in any loaded module, or as a node label.
+The first form that matches wins; several matching nodes make the target
+ambiguous and are returned as candidates. Targets that match nothing, and
+numeric targets (indexes relative to KERAG's current node), are left to
+KERAG's ``resolve_target_id``.
+
+Each module keeps its own suffix and label index, built with its other
+indexes when it is loaded and dropped with its tree, so loading or
+unloading a module never touches the entries of the others.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .corpus import CorpusSnapshot, ModuleTree, register_index
+
+
+# Candidates returned for an ambiguous target
+MAX_CANDIDATES = 100
+
+
+def _suffixes(node_id: str) -> Iterable[str]:
+    """``c``, ``b/c`` and ``a/b/c`` for ``module::a/b/c``."""
+    local = node_id.split("::", 1)[-1]
+    if not local:
+        return []
+    segments = local.split("/")
+    return ["/".join(segments[i:]) for i in range(len(segments))]
+
+
+class PositionLists:
+    """Node positions by key in compressed sparse form.
+
+    The positions of ``keys[i]`` are ``positions[ptr[i]:ptr[i + 1]]`` in
+    scan order.
+    """
+
+    def __init__(self, keys: List[str], ptr: np.ndarray, positions: np.ndarray):
+        self.keys = keys
+        self.key_ids = {key: i for i, key in enumerate(keys)}
+        self.ptr = ptr
+        self.positions = positions
+
+    @classmethod
+    def build(cls, lists: Dict[str, List[int]]) -> "PositionLists":
+        keys = sorted(lists)
+        ptr = np.zeros(len(keys) + 1, dtype=np.int64)
+        for i, key in enumerate(keys):
+            ptr[i + 1] = ptr[i] + len(lists[key])
+        positions = np.empty(ptr[-1], dtype=np.int32)
+        for i, key in enumerate(keys):
+            positions[ptr[i]:ptr[i + 1]] = lists[key]
+        return cls(keys, ptr, positions)
+
+    def get(self, key: str) -> List[int]:
+        i = self.key_ids.get(key)
+        if i is None:
+            return []
+        return self.positions[self.ptr[i]:self.ptr[i + 1]].tolist()
+
+    def count(self, key: str) -> int:
+        i = self.key_ids.get(key)
+        return 0 if i is None else int(self.ptr[i + 1] - self.ptr[i])
+
+
+@register_index("resolve")
+class ResolutionIndex:
+    """Shorthand suffixes and labels of one module's nodes."""
+
+    def __init__(self, tree: ModuleTree):
+        suffixes: Dict[str, List[int]] = {}
+        labels: Dict[str, List[int]] = {}
+        for position, record in enumerate(tree.records):
+            for suffix in _suffixes(record.node_id):
+                suffixes.setdefault(suffix, []).append(position)
+            if record.label:
+                labels.setdefault(record.label, []).append(position)
+        self.suffixes = PositionLists.build(suffixes)
+        self.labels = PositionLists.build(labels)
+
+    def dump(self):
+        """Keys and CSR arrays of both maps, for snapshots."""
+        arrays = {}
+        for name in ("suffixes", "labels"):
+            lists = getattr(self, name)
+            arrays.update({f"{name}_keys": lists.keys, f"{name}_ptr": lists.ptr, f"{name}_positions": lists.positions})
+        return {}, arrays
+
+    @classmethod
+    def restore(cls, meta, arrays) -> "ResolutionIndex":
+        index = cls.__new__(cls)
+        for name in ("suffixes", "labels"):
+            setattr(index, name, PositionLists(arrays[f"{name}_keys"], arrays[f"{name}_ptr"],
+                                               arrays[f"{name}_positions"]))
+        return index
+
+
+def _matches(trees: Iterable[ModuleTree], key: str, field: str) -> Tuple[List[str], int]:
+    """Node IDs (up to ``MAX_CANDIDATES``) under ``key`` in each tree's ``field`` map, and their total."""
+    node_ids: List[str] = []
+    total = 0
+    for tree in trees:
+        lists = getattr(tree.indexes["resolve"], field)
+        count = lists.count(key)
+        if count and len(node_ids) < MAX_CANDIDATES:
+            records = tree.records
+            node_ids.extend(records[p].node_id for p in lists.get(key)[:MAX_CANDIDATES - len(node_ids)])
+        total += count
+    return node_ids, total
+
+
+def resolve_target(snapshot: CorpusSnapshot, target: str) -> Optional[Dict[str, Any]]:
+    """Resolve ``target`` against the loaded modules, shaped like KERAG's result.
+
+    Returns None when the index has no answer and KERAG should be asked.
+    """
+    target = target.strip()
+    if not target or target.isdigit():
+        return None
+    modules = snapshot.modules
+    module, separator, local = target.partition("::")
+    tree = modules.get(module) if separator else None
+
+    if tree is not None and target in tree.positions:
+        node_ids, total, match = [target], 1, "id"
+    else:
+        if tree is not None:
+            node_ids, total = _matches([tree], local, "suffixes")
+            match = "module_suffix"
+        else:
+            node_ids, total = _matches(modules.values(), target, "suffixes")
+            match = "suffix"
+        if not total:
+            node_ids, total = _matches(modules.values(), target, "labels")
+            match = "label"
+        if not total:
+            return None
+
+    if total == 1:
+        return {"success": True, "data": {"node_id": node_ids[0]}, "metadata": {"match": match, "indexed": True}}
+    return {
+        "success": True,
+        "data": {"candidates": node_ids},
+        "metadata": {"match": match, "candidate_count": total, "indexed": True},
+    }
+
+
+def resolve_with(api, snapshot: CorpusSnapshot, targets: List[str]) -> List[Dict[str, Any]]:
+    """Resolve several targets, asking KERAG only about those the index cannot answer."""
+    return [resolve_target(snapshot, target) or api.resolve_target_id(target) for target in targets]
@@ -0,0 +1,487 @@
+"""Trigram posting-list index and indexed search over the corpus mirror."""
+
+import base64
+import json
+import os
+import re
+import threading
+import time
+from array import array
+from contextlib import closing
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+from .cache import LRUCache
+from .corpus import SEARCH_SCOPES, CorpusSnapshot, ModuleTree, NodeRecord, corpus, register_index
+from .ranking import rank_hits
+from .regex_sandbox import SANDBOX_ENABLED, SearchBudget, regex_sandbox
+
+
+GRAM = 3
+PREVIEW_RADIUS = 60
+MAX_HIGHLIGHTS = 10
+# Limits on regexes matched in-process (with KERAG_REGEX_SANDBOX=0); the
+# sandbox's time budget bounds every pattern KERAG accepts instead
+MAX_REGEX_LENGTH = int(os.getenv("KERAG_REGEX_MAX_LENGTH", "1000"))
+# Reject quantified groups holding another unbounded quantifier, e.g. (a+)+
+REJECT_NESTED_QUANTIFIERS = os.getenv("KERAG_REGEX_REJECT_NESTED", "1") not in ("0", "false", "no")
+
+# Cache of search responses, emptied whenever the loaded modules change
+search_cache = LRUCache(
+    max_bytes=int(float(os.getenv("KERAG_SEARCH_CACHE_MB", "64")) * 1024 * 1024),
+    ttl=float(os.getenv("KERAG_SEARCH_CACHE_TTL", "300"))
+)
+corpus.add_listener(lambda generation: search_cache.clear())
+
+
+def _current_text():
+    snapshot = corpus.snapshot()
+    return snapshot.generation, list(snapshot.modules.values())
+
+
+# Reload the regex workers' text ahead of the next regex query
+corpus.add_listener(lambda generation: regex_sandbox.prepare(generation, _current_text))
+
+
+# Characters re.IGNORECASE treats as equal although their lower-case forms
+# differ (the re compiler's equivalence classes); each folds to the first
+_CASE_EQUIVALENCES = (
+    "i\u0131", "s\u017f", "\u03bc\u00b5", "\u03b9\u0345\u1fbe", "\u0390\u1fd3", "\u03b0\u1fe3",
+    "\u03b2\u03d0", "\u03b5\u03f5", "\u03b8\u03d1", "\u03ba\u03f0", "\u03c0\u03d6", "\u03c1\u03f1",
+    "\u03c3\u03c2", "\u03c6\u03d5", "\u0432\u1c80", "\u0434\u1c81", "\u043e\u1c82", "\u0441\u1c83",
+    "\u0442\u1c84\u1c85", "\u044a\u1c86", "\u0463\u1c87", "\ua64b\u1c88", "\u1e61\u1e9b", "\ufb06\ufb05",
+)
+_FOLD = {ord(c): chars[0] for chars in _CASE_EQUIVALENCES for c in chars[1:]}
+# The one character whose lower-case form is longer; re lower-cases it to "i"
+_DOTTED_I = {0x130: "i"}
+
+
+def fold_case(text: str) -> str:
+    """Map ``text`` one character to one so that characters re.IGNORECASE
+    treats as equal become the same character.
+
+    ``str.lower`` and ``str.casefold`` disagree with re on a few characters
+    (dotless and dotted I, long s, final sigma, Greek symbol forms), and
+    casefold also lengthens some (``ß``), which would shift trigrams.
+    """
+    return text.translate(_DOTTED_I).lower().translate(_FOLD)
+
+
+def trigrams(text: str) -> Set[str]:
+    """Trigrams of ``text`` after ``fold_case``."""
+    text = fold_case(text)
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class PackedPostings:
+    """Read-only gram -> positions postings over CSR arrays (restored from a snapshot)."""
+
+    def __init__(self, grams: List[str], ptr: np.ndarray, positions: np.ndarray):
+        self._ids = {gram: i for i, gram in enumerate(grams)}
+        self._ptr = ptr
+        self._positions = positions
+
+    def get(self, gram: str, default=()):
+        i = self._ids.get(gram)
+        if i is None:
+            return default
+        return self._positions[self._ptr[i]:self._ptr[i + 1]].tolist()
+
+
+@register_index("trigram")
+class TrigramIndex:
+    """Per-scope trigram postings of one module.
+
+    Each posting list is a sorted array of node positions in the module's
+    scan order. Text is case-folded as re.IGNORECASE compares it, so the
+    candidates for a case-sensitive query are a superset that the matcher
+    then verifies.
+    """
+
+    def __init__(self, tree: ModuleTree):
+        self.size = len(tree)
+        self.postings: Dict[str, Dict[str, array]] = {}
+        for scope in SEARCH_SCOPES:
+            postings: Dict[str, array] = {}
+            for position, record in enumerate(tree.records):
+                for gram in trigrams(record.field(scope)):
+                    posting = postings.get(gram)
+                    if posting is None:
+                        posting = postings[gram] = array("I")
+                    posting.append(position)
+            self.postings[scope] = postings
+
+    def dump(self):
+        """Postings as per-scope CSR arrays, for snapshots."""
+        arrays: Dict[str, Any] = {}
+        for scope, postings in self.postings.items():
+            grams = sorted(postings)
+            ptr = np.zeros(len(grams) + 1, dtype=np.int64)
+            np.cumsum([len(postings[gram]) for gram in grams], out=ptr[1:])
+            positions = np.empty(int(ptr[-1]), dtype=np.uint32)
+            for i, gram in enumerate(grams):
+                positions[ptr[i]:ptr[i + 1]] = postings[gram]
+            arrays[f"{scope}.grams"] = grams
+            arrays[f"{scope}.ptr"] = ptr
+            arrays[f"{scope}.positions"] = positions
+        return {"size": self.size}, arrays
+
+    @classmethod
+    def restore(cls, meta, arrays) -> "TrigramIndex":
+        index = cls.__new__(cls)
+        index.size = meta["size"]
+        index.postings = {
+            scope: PackedPostings(arrays[f"{scope}.grams"], arrays[f"{scope}.ptr"], arrays[f"{scope}.positions"])
+            for scope in SEARCH_SCOPES
+        }
+        return index
+
+    def candidates(self, plan, scope: str) -> Optional[Set[int]]:
+        """Positions that may match ``plan`` in one scope, or None for all."""
+        if plan is None:
+            return None
+        kind, items = plan
+        postings = self.postings[scope]
+        if kind == "gram":
+            return set(postings.get(items, ()))
+        sets = [self.candidates(item, scope) for item in items]
+        if kind == "and":
+            sets = [s for s in sets if s is not None]
+            if not sets:
+                return None
+            sets.sort(key=len)
+            result = set(sets[0])
+            for s in sets[1:]:
+                result &= s
+                if not result:
+                    break
+            return result
+        # "or": any unconstrained branch makes the whole union unconstrained
+        if any(s is None for s in sets):
+            return None
+        return set().union(*sets)
+
+
+def _literal_plan(text: str):
+    """Plan requiring every trigram of a literal string."""
+    grams = trigrams(text)
+    if not grams:
+        return None
+    return ("and", [("gram", gram) for gram in sorted(grams)])
+
+
+def _combine(kind: str, plans: List[Any]):
+    plans = [plan for plan in plans if plan is not None] if kind == "and" else plans
+    if kind == "or" and any(plan is None for plan in plans):
+        return None
+    if not plans:
+        return None
+    return plans[0] if len(plans) == 1 else (kind, plans)
+
+
+def _regex_plan(parsed) -> Any:
+    """Derive required trigrams from a parsed regular expression."""
+    plans = []
+    run: List[str] = []
+
+    def flush():
+        if run:
+            plans.append(_literal_plan("".join(run)))
+            run.clear()
+
+    for op, value in parsed:
+        if op is sre_constants.LITERAL:
+            run.append(chr(value))
+            continue
+        flush()
+        if op is sre_constants.SUBPATTERN:
+            plans.append(_regex_plan(value[-1]))
+        elif op is sre_constants.BRANCH:
+            plans.append(_combine("or", [_regex_plan(branch) for branch in value[1]]))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and value[0] >= 1:
+            plans.append(_regex_plan(value[2]))
+    flush()
+    return _combine("and", plans)
+
+
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+if hasattr(sre_constants, "POSSESSIVE_REPEAT"):
+    _REPEATS += (sre_constants.POSSESSIVE_REPEAT,)
+
+
+def _has_nested_quantifier(parsed, repeated: bool = False) -> bool:
+    """Whether an unbounded quantifier sits inside another repeated group.
+
+    Catches the classic catastrophic shapes like ``(a+)+`` and ``(\\w*\\s?)*``
+    cheaply; overlapping alternations like ``(a|aa)+`` still rely on the
+    sandbox's time budget.
+    """
+    for op, value in parsed:
+        if op in _REPEATS:
+            low, high, item = value
+            if repeated and high is sre_constants.MAXREPEAT:
+                return True
+            if _has_nested_quantifier(item, repeated or high > 1):
+                return True
+        elif op is sre_constants.SUBPATTERN:
+            if _has_nested_quantifier(value[-1], repeated):
+                return True
+        elif op is sre_constants.BRANCH:
+            if any(_has_nested_quantifier(branch, repeated) for branch in value[1]):
+                return True
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if _has_nested_quantifier(value[1], repeated):
+                return True
+    return False
+
+
+@lru_cache(maxsize=256)
+def build_matcher(keyword: str, whole_word: bool, case_sensitive: bool, use_regex: bool) -> re.Pattern:
+    """Compile a keyword with the same options as ``KERAGAPI.search``.
+
+    Compiled patterns are kept in an LRU. Like KERAG, ``whole_word`` wraps
+    the pattern in ``\\b`` as is: in ``a|b`` only the start of ``a`` and
+    the end of ``b`` are anchored. Without the regex sandbox, regexes longer than
+    ``MAX_REGEX_LENGTH`` or with nested unbounded quantifiers are rejected
+    with ``re.error``.
+    """
+    if use_regex and not SANDBOX_ENABLED:
+        if len(keyword) > MAX_REGEX_LENGTH:
+            raise re.error(f"pattern longer than {MAX_REGEX_LENGTH} characters")
+        if REJECT_NESTED_QUANTIFIERS and _has_nested_quantifier(sre_parse.parse(keyword)):
+            raise re.error("nested quantifiers such as (a+)+ can take exponential time")
+    pattern = keyword if use_regex else re.escape(keyword)
+    if whole_word:
+        pattern = rf"\b{pattern}\b"
+    return re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+
+
+@lru_cache(maxsize=256)
+def query_plan(keyword: str, use_regex: bool):
+    """Trigram plan for a keyword; None means every node is a candidate."""
+    if not use_regex:
+        return _literal_plan(keyword)
+    return _regex_plan(sre_parse.parse(keyword))
+
+
+def _preview(record: NodeRecord, span: Optional[Tuple[int, int]]) -> str:
+    content = record.content
+    if span is None:
+        return content[:PREVIEW_RADIUS * 2]
+    start = max(0, span[0] - PREVIEW_RADIUS)
+    end = min(len(content), span[1] + PREVIEW_RADIUS)
+    return ("..." if start else "") + content[start:end] + ("..." if end < len(content) else "")
+
+
+class Hit(NamedTuple):
+    """A matching node and the span of its first match in each matched scope."""
+    tree_index: int
+    position: int
+    record: NodeRecord
+    matches: Dict[str, Tuple[int, int]]
+    # Highlight spans per scope, when already computed by the regex sandbox
+    spans: Optional[Dict[str, List[Tuple[int, int]]]] = None
+
+
+def iter_matches(snapshot: CorpusSnapshot, matcher: re.Pattern, keyword: str,
+                 scope: str = "all", use_regex: bool = False,
+                 start: Tuple[int, int] = (0, 0), budget: Optional[SearchBudget] = None,
+                 limit: Optional[int] = None) -> Iterator[Hit]:
+    """Yield every node matching ``matcher`` in scan order.
+
+    ``start`` is the ``(tree index, node position)`` to resume scanning from.
+    Regexes run in the regex sandbox under ``budget`` when one is given, so
+    ``limit`` (the most hits the caller will consume) lets the sandbox stop
+    early; when the budget runs out the scan ends with ``budget.truncated``.
+    """
+    trees = list(snapshot.modules.values())
+    plan = query_plan(keyword, use_regex)
+    scopes = SEARCH_SCOPES if scope == "all" else (scope,)
+
+    def positions_of(tree_index: int):
+        tree = trees[tree_index]
+        first = start[1] if tree_index == start[0] else 0
+        index: Optional[TrigramIndex] = tree.indexes.get("trigram")
+        candidates: Optional[Set[int]] = set()
+        for s in scopes:
+            found = index.candidates(plan, s) if index is not None else None
+            if found is None:
+                candidates = None
+                break
+            candidates |= found
+        if candidates is None:
+            return range(first, len(tree.records))
+        return sorted(p for p in candidates if p >= first)
+
+    if use_regex and budget is not None and SANDBOX_ENABLED:
+        work = [(i, list(positions_of(i))) for i in range(start[0], len(trees))]
+        # Closed with this generator, so an abandoned scan frees its worker right away
+        with closing(regex_sandbox.matches(snapshot.generation, trees, matcher, scopes, work, limit,
+                                           budget)) as sandboxed:
+            for tree_index, position, spans in sandboxed:
+                matches = {s: found[0] for s, found in spans.items()}
+                yield Hit(tree_index, position, trees[tree_index].records[position], matches, spans)
+        return
+
+    for tree_index in range(start[0], len(trees)):
+        records = trees[tree_index].records
+        for position in positions_of(tree_index):
+            record = records[position]
+            matches = {}
+            for s in scopes:
+                match = matcher.search(record.field(s))
+                if match:
+                    matches[s] = match.span()
+            if matches:
+                yield Hit(tree_index, position, record, matches)
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """Encode pagination state as an opaque URL-safe cursor."""
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Decode a cursor made by ``encode_cursor``."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid search cursor: {cursor}") from e
+    if not isinstance(state, dict):
+        raise ValueError(f"Invalid search cursor: {cursor}")
+    return state
+
+
+def next_batch(hits: Iterator[Hit], max_items: int, max_seconds: float,
+               stop: Optional[threading.Event] = None) -> Tuple[List[Hit], bool]:
+    """Pull up to ``max_items`` hits, stopping early after ``max_seconds``.
+
+    Returns the hits and whether the scan is exhausted. Bounding each batch
+    lets a streaming caller check for cancellation between batches, and
+    setting ``stop`` ends the current batch at the next hit.
+    """
+    batch = []
+    deadline = time.perf_counter() + max_seconds
+    for hit in hits:
+        batch.append(hit)
+        if len(batch) >= max_items or time.perf_counter() >= deadline or (stop and stop.is_set()):
+            return batch, False
+    return batch, True
+
+
+def search_result(hit: Hit, matcher: re.Pattern, score: float = 0.0) -> Dict[str, Any]:
+    """Serialize one search hit with its score and highlight spans."""
+    record = hit.record
+    highlights = []
+    for scope in hit.matches:
+        if hit.spans is not None:
+            spans = hit.spans[scope]
+        else:
+            spans = [match.span() for match in islice(matcher.finditer(record.field(scope)), MAX_HIGHLIGHTS)]
+        for start, end in spans:
+            if end > start:
+                highlights.append({"field": scope, "start": start, "end": end})
+    result = record.summary()
+    result["content_preview"] = _preview(record, hit.matches.get("content"))
+    result["matched_in"] = list(hit.matches)
+    result["score"] = score
+    result["highlights"] = highlights
+    return result
+
+
+def search_corpus(snapshot: CorpusSnapshot, keyword: str, scope: str = "all",
+                  max_results: int = 50, whole_word: bool = False, case_sensitive: bool = False,
+                  use_regex: bool = False, rank: str = "none", paginate: bool = False,
+                  cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Search the mirrored corpus, returning a KERAG-style result dict.
+
+    With ``rank="bm25"`` every match is scored and the best ``max_results``
+    are returned by descending score; otherwise the first ``max_results``
+    matches are returned in scan order. With ``paginate`` a page of
+    ``max_results`` is returned starting at ``cursor``, and
+    ``metadata.next_cursor`` points at the next page (None on the last one).
+    """
+    trees = list(snapshot.modules.values())
+    budget = SearchBudget() if use_regex else None
+    try:
+        state = decode_cursor(cursor) if cursor else {}
+        if state and state.get("g") != snapshot.generation:
+            return {
+                "success": False,
+                "data": None,
+                "error": "Search cursor expired because the loaded modules changed",
+                "metadata": {}
+            }
+        matcher = build_matcher(keyword, whole_word, case_sensitive, use_regex)
+        next_state = None
+        if rank == "bm25":
+            offset = int(state.get("o", 0))
+            all_hits = list(iter_matches(snapshot, matcher, keyword, scope, use_regex, budget=budget))
+            ranked = rank_hits(trees, [(hit.tree_index, hit.position) for hit in all_hits], keyword,
+                               offset + max_results)
+            data = [search_result(all_hits[i], matcher, score) for i, score in ranked[offset:]]
+            total = len(all_hits)
+            if paginate and offset + max_results < total:
+                next_state = {"g": snapshot.generation, "o": offset + max_results}
+        else:
+            start = (int(state.get("t", 0)), int(state.get("p", 0)))
+            limit = max_results + 1 if paginate else max_results
+            with closing(iter_matches(snapshot, matcher, keyword, scope, use_regex, start, budget, limit)) as hits:
+                page = list(islice(hits, limit))
+            if paginate and len(page) > max_results:
+                last = page[max_results - 1]
+                next_state = {"g": snapshot.generation, "t": last.tree_index, "p": last.position + 1}
+                page = page[:max_results]
+            data = [search_result(hit, matcher) for hit in page]
+            total = None
+    except re.error as e:
+        return {"success": False, "data": None, "error": f"Invalid regular expression: {e}", "metadata": {}}
+    except ValueError as e:
+        return {"success": False, "data": None, "error": str(e), "metadata": {}}
+    metadata = {
+        "keyword": keyword,
+        "scope": scope,
+        "count": len(data),
+        "rank": rank,
+        "indexed": True
+    }
+    if total is not None:
+        metadata["total"] = total
+    if budget is not None:
+        # Out of time: the results so far are returned, but may be incomplete
+        metadata["truncated"] = budget.truncated
+    if paginate:
+        metadata["next_cursor"] = encode_cursor(next_state) if next_state else None
+    return {"success": True, "data": data, "metadata": metadata}
+
+
+def cached_search(snapshot: CorpusSnapshot, keyword: str, scope: str = "all",
+                  max_results: int = 50, whole_word: bool = False, case_sensitive: bool = False,
+                  use_regex: bool = False, rank: str = "none", paginate: bool = False,
+                  cursor: Optional[str] = None) -> Dict[str, Any]:
+    """``search_corpus`` through the search cache.
+
+    Keys include every search option and the corpus generation, which
+    changes with the set of loaded modules. Only successful results are kept.
+    """
+    key = (keyword, scope, whole_word, case_sensitive, use_regex, rank,
+           max_results, paginate, cursor, snapshot.generation)
+    result = search_cache.get(key)
+    if result is not None:
+        return result
+    result = search_corpus(snapshot, keyword, scope, max_results, whole_word, case_sensitive,
+                           use_regex, rank, paginate, cursor)
+    if result.get("success") and not result["metadata"].get("truncated"):
+        search_cache.put(key, result, len(json.dumps(result)))
+    return result
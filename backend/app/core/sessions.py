@@ -0,0 +1,122 @@
+"""Per-session navigation state over the shared KERAG knowledge tree."""
+
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .corpus import node_id_of, read_node
+
+
+SESSION_COOKIE = "kerag_session"
+SESSION_HEADER = "X-KERAG-Session"
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+# Where new sessions start: the root all module roots hang from
+ROOT_ID = "::ROOT"
+
+
+def build_breadcrumb(api, node_id: str, max_depth: int = 256) -> List[Dict[str, str]]:
+    """Build the root-to-node breadcrumb of any node by following parent IDs."""
+    items = []
+    seen = set()
+    current = node_id
+    while current and current not in seen and len(items) < max_depth:
+        seen.add(current)
+        node = read_node(api, current)
+        if node is None:
+            break
+        items.append({"id": node_id_of(node) or current, "label": node.get("label", "")})
+        current = node.get("parent_id")
+    items.reverse()
+    return items
+
+
+class NavigationSession:
+    """Cursor and history of one browser session."""
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.current_id: Optional[str] = None
+        self.history: List[str] = []
+        self.cursor = -1
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()
+
+    def ensure_started(self, start_id: Optional[str] = None):
+        """Start a fresh session at ``start_id``, or at the knowledge base root.
+
+        KERAG's own current node is never consulted: it is one cursor shared
+        by every client.
+        """
+        if self.current_id is not None:
+            return
+        self.current_id = start_id or ROOT_ID
+        self.history = [self.current_id]
+        self.cursor = 0
+
+    def visit(self, node_id: str):
+        """Move to ``node_id``, dropping any forward history."""
+        if node_id == self.current_id:
+            return
+        del self.history[self.cursor + 1:]
+        self.history.append(node_id)
+        self.cursor = len(self.history) - 1
+        self.current_id = node_id
+
+    def move(self, steps: int) -> bool:
+        """Move ``steps`` entries through history (negative is back)."""
+        target = self.cursor + steps
+        if not self.history or target < 0 or target >= len(self.history):
+            return False
+        self.cursor = target
+        self.current_id = self.history[target]
+        return True
+
+    def history_data(self) -> Dict[str, Any]:
+        """History in the shape returned by ``KERAGAPI.get_history``."""
+        return {"items": list(self.history), "cursor": self.cursor, "size": len(self.history)}
+
+
+class SessionStore:
+    """Bounded LRU of navigation sessions with idle expiry."""
+
+    def __init__(self, max_sessions: int = 1000, idle_timeout: float = 24 * 3600):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions: "OrderedDict[str, NavigationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id: Optional[str]) -> Tuple[NavigationSession, bool]:
+        """Get the session for ``session_id``, creating one if needed."""
+        now = time.monotonic()
+        if not session_id or not _SESSION_ID_PATTERN.match(session_id):
+            session_id = secrets.token_urlsafe(24)
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            created = session is None
+            if created:
+                session = NavigationSession(session_id)
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_seen = now
+            return session, created
+
+    def _expire(self, now: float):
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_seen < self.idle_timeout:
+                break
+            self._sessions.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+# Global session store
+sessions = SessionStore()
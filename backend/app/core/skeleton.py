@@ -0,0 +1,111 @@
+"""Compact columnar skeletons of module trees for the navigation sidebar."""
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .corpus import ModuleTree, register_index
+from .node_views import RenderedView, serialize_view
+
+
+DEFAULT_DEPTH = 64
+
+
+@register_index("skeleton")
+class ModuleSkeleton:
+    """Parent links and depths of a module's nodes in scan order."""
+
+    def __init__(self, tree: ModuleTree):
+        self.parent: List[int] = []
+        self.depth: List[int] = []
+        for record in tree.records:
+            # Scan order is depth-first, so a parent always precedes its children
+            parent = tree.positions.get(record.parent_id, -1) if record.parent_id else -1
+            self.parent.append(parent)
+            self.depth.append(self.depth[parent] + 1 if parent >= 0 else 0)
+
+    def dump(self):
+        """Parent links and depths as arrays, for snapshots."""
+        return {}, {"parent": np.array(self.parent, dtype=np.int32), "depth": np.array(self.depth, dtype=np.int32)}
+
+    @classmethod
+    def restore(cls, meta, arrays) -> "ModuleSkeleton":
+        skeleton = cls.__new__(cls)
+        skeleton.parent = arrays["parent"].tolist()
+        skeleton.depth = arrays["depth"].tolist()
+        return skeleton
+
+    def ancestors(self, position: int) -> List[int]:
+        """Positions from the module root down to ``position``."""
+        chain = []
+        while position >= 0:
+            chain.append(position)
+            position = self.parent[position]
+        chain.reverse()
+        return chain
+
+    def encode(self, tree: ModuleTree, max_depth: int) -> Dict[str, Any]:
+        """Encode the nodes down to ``max_depth`` as parallel arrays.
+
+        Node ``i`` has ID ``id_prefix + ids[i]``, parent index ``parent[i]``
+        (-1 for roots) and children ``child_index[child_offsets[i]:child_offsets[i + 1]]``;
+        ``types`` index into ``type_names``. ``has_children`` marks nodes with
+        children, including those cut off by ``max_depth``.
+        """
+        included = [i for i, d in enumerate(self.depth) if d <= max_depth]
+        remap = {position: i for i, position in enumerate(included)}
+        records = tree.records
+
+        prefix = f"{tree.name}::"
+        if not all(records[p].node_id.startswith(prefix) for p in included):
+            prefix = ""
+
+        type_names: List[str] = []
+        type_codes: Dict[str, int] = {}
+        ids, labels, titles, types, parents, has_children = [], [], [], [], [], []
+        child_offsets, child_index = [0], []
+        for position in included:
+            record = records[position]
+            ids.append(record.node_id[len(prefix):])
+            labels.append(record.label)
+            # Titles equal to the label are sent as null
+            titles.append(record.title if record.title != record.label else None)
+            if record.type not in type_codes:
+                type_codes[record.type] = len(type_names)
+                type_names.append(record.type)
+            types.append(type_codes[record.type])
+            parents.append(remap.get(self.parent[position], -1))
+            has_children.append(1 if record.children else 0)
+            for child_id in record.children:
+                child = remap.get(tree.positions.get(child_id, -1))
+                if child is not None:
+                    child_index.append(child)
+            child_offsets.append(len(child_index))
+
+        return {
+            "module": tree.name,
+            "depth": max_depth,
+            "count": len(included),
+            "total": len(records),
+            "id_prefix": prefix,
+            "ids": ids,
+            "labels": labels,
+            "titles": titles,
+            "type_names": type_names,
+            "types": types,
+            "parent": parents,
+            "has_children": has_children,
+            "child_offsets": child_offsets,
+            "child_index": child_index,
+        }
+
+
+def skeleton_key(module: str, depth: int, generation: int) -> tuple:
+    """View cache key of a module skeleton."""
+    return ("skeleton", module, depth, generation)
+
+
+def render_skeleton(tree: ModuleTree, depth: int) -> RenderedView:
+    """Serialize a module skeleton response."""
+    data = tree.indexes["skeleton"].encode(tree, depth)
+    return serialize_view({"success": True, "data": data, "metadata": {}})
@@ -0,0 +1,401 @@
+"""Memory-mapped on-disk snapshots of module trees and their indexes.
+
+A snapshot file holds one module's node records as packed string columns
+and every index that can ``dump`` itself as flat arrays::
+
+    MAGIC | header length (u64) | JSON header | padding | 8-byte aligned blobs
+
+The file is memory-mapped when loaded: index arrays are zero-copy views,
+records are decoded on first access and indexes are restored on first use,
+so the web-side mirror of an unchanged module is not walked or indexed
+again. Snapshots cover only that mirror: KERAG still parses the module
+when it is loaded, on restart and on every settings switch, so that parse
+remains the bulk of a module's load time. Snapshots are validated against
+the paths, mtimes, sizes and SHA-256 hashes of the module's source files.
+
+The cache is off unless ``KERAG_SNAPSHOT_CACHE=1`` (``--snapshot-cache``);
+files go to ``KERAG_SNAPSHOT_DIR``, by default ``~/.cache/kerag-web/snapshots``.
+``configure_snapshots()``, called when the app is created, sets it up.
+
+Indexes opt in with ``dump() -> (meta, arrays)`` and a ``restore(meta,
+arrays)`` classmethod; array values are numpy arrays or lists of strings.
+Indexes without them are rebuilt from the records when first used.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from collections.abc import Mapping, MutableMapping, Sequence
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .corpus import INDEX_BUILDERS, ModuleTree, NodeRecord, corpus, source_path
+from .kerag_client import client
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"KERAGSN1"
+FORMAT_VERSION = 2
+ALIGN = 8
+CHILD_SEPARATOR = "\x1f"
+RECORD_COLUMNS = ("node_id", "module", "label", "title", "type", "content", "parent_id", "path")
+
+SNAPSHOT_ENABLED = os.getenv("KERAG_SNAPSHOT_CACHE", "0") in ("1", "true", "yes")
+SNAPSHOT_DIR = os.getenv("KERAG_SNAPSHOT_DIR") or str(Path.home() / ".cache" / "kerag-web" / "snapshots")
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _listing_hash(directory: str) -> str:
+    return hashlib.sha256("\n".join(sorted(os.listdir(directory))).encode("utf-8")).hexdigest()
+
+
+class StringColumn(Sequence):
+    """Strings packed in a mapped blob, decoded on access."""
+
+    def __init__(self, buffer, base: int, offsets: np.ndarray, nulls: Optional[np.ndarray]):
+        self._buffer = buffer
+        self._base = base
+        self._offsets = offsets
+        self._nulls = nulls
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if self._nulls is not None and self._nulls[i]:
+            return None
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._buffer[self._base + start:self._base + end].decode("utf-8")
+
+    def tolist(self) -> List[Optional[str]]:
+        """Decode every string at once."""
+        offsets = self._offsets.tolist()
+        blob = self._buffer[self._base:self._base + offsets[-1]]
+        strings = [blob[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+        if self._nulls is not None:
+            for i in np.flatnonzero(self._nulls).tolist():
+                strings[i] = None
+        return strings
+
+
+class MappedRecords(Sequence):
+    """Node records of a mapped module, built on first access."""
+
+    def __init__(self, columns: Dict[str, StringColumn], children: StringColumn):
+        self._columns = columns
+        self._children = children
+        self._records: List[Optional[NodeRecord]] = [None] * len(children)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        record = self._records[i]
+        if record is None:
+            fields = {name: column[i] for name, column in self._columns.items()}
+            children = self._children[i]
+            record = NodeRecord(children=tuple(children.split(CHILD_SEPARATOR)) if children else (), **fields)
+            self._records[i] = record
+        return record
+
+
+class LazyPositions(Mapping):
+    """Node ID -> position map, built from the ID column on first lookup."""
+
+    def __init__(self, ids: StringColumn):
+        self._ids = ids
+        self._positions: Optional[Dict[str, int]] = None
+
+    def _map(self) -> Dict[str, int]:
+        if self._positions is None:
+            self._positions = {node_id: i for i, node_id in enumerate(self._ids.tolist())}
+        return self._positions
+
+    def __getitem__(self, node_id: str) -> int:
+        return self._map()[node_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._map())
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class LazyIndexes(MutableMapping):
+    """A tree's indexes, each restored (or rebuilt) on first use."""
+
+    def __init__(self, loaders: Dict[str, Callable[[], Any]]):
+        self._loaders = loaders
+        self._indexes: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> Any:
+        index = self._indexes.get(name)
+        if index is not None:
+            return index
+        with self._lock:
+            if name not in self._indexes:
+                loader = self._loaders.get(name)
+                if loader is None:
+                    raise KeyError(name)
+                self._indexes[name] = loader()
+            return self._indexes[name]
+
+    def __setitem__(self, name: str, index: Any):
+        self._indexes[name] = index
+
+    def __delitem__(self, name: str):
+        self._loaders.pop(name, None)
+        del self._indexes[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(dict.fromkeys([*self._loaders, *self._indexes]))
+
+    def __len__(self) -> int:
+        return len(set(self._loaders) | set(self._indexes))
+
+    def loaded(self, name: str) -> bool:
+        """Whether the index is already in memory."""
+        return name in self._indexes
+
+
+def indexes_loaded(modules: Iterable[ModuleTree], name: str) -> bool:
+    """Whether every module has index ``name`` in memory (mapped trees restore or build it on first use)."""
+    return all(not isinstance(tree.indexes, LazyIndexes) or tree.indexes.loaded(name) for tree in modules)
+
+
+class _Writer:
+    """Lays out aligned blobs and describes them for the header."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.size = 0
+
+    def _add(self, data: bytes) -> int:
+        offset = self.size
+        self.parts.append(data)
+        self.size += len(data)
+        padding = -self.size % ALIGN
+        if padding:
+            self.parts.append(b"\0" * padding)
+            self.size += padding
+        return offset
+
+    def add(self, value) -> Dict[str, Any]:
+        if isinstance(value, np.ndarray):
+            value = np.ascontiguousarray(value)
+            dtype = value.dtype.newbyteorder("<") if value.dtype.byteorder == ">" else value.dtype
+            return {"type": "array", "dtype": dtype.str, "count": len(value),
+                    "offset": self._add(value.astype(dtype, copy=False).tobytes())}
+        encoded = [(s or "").encode("utf-8") for s in value]
+        offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        entry = {"type": "strings", "count": len(encoded),
+                 "blob": self._add(b"".join(encoded)), "offsets": self._add(offsets.tobytes()), "nulls": None}
+        if any(s is None for s in value):
+            entry["nulls"] = self._add(np.array([s is None for s in value], dtype="u1").tobytes())
+        return entry
+
+
+class SnapshotStore:
+    """Directory of module snapshots keyed by module, roots and knowledge base settings."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.saves = 0
+        self.load_time = 0.0
+
+    def path_for(self, name: str, root_ids: List[str]) -> str:
+        settings = client.settings
+        key = json.dumps([name, sorted(root_ids), settings["kerag_home"],
+                          settings["kerag_local"], settings["kerag_lang"]])
+        safe_name = re.sub(r"[^\w.-]+", "_", name)[:64]
+        return os.path.join(self.directory, f"{safe_name}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.snap")
+
+    def _sources(self, tree: ModuleTree) -> Optional[Tuple[List[list], List[list]]]:
+        """Fingerprints of the module's source files and their directories."""
+        paths = {record.path for record in tree.records if record.path}
+        if not paths:
+            return None
+        files, directories = [], set()
+        for path in sorted(paths):
+            resolved = source_path(path)
+            if resolved is None:
+                return None
+            stat = os.stat(resolved)
+            files.append([resolved, stat.st_mtime_ns, stat.st_size, _file_hash(resolved)])
+            directories.add(os.path.dirname(resolved))
+        # A file added next to the sources changes its directory's listing
+        return files, [[d, _listing_hash(d)] for d in sorted(directories)]
+
+    @staticmethod
+    def _fresh(header: Dict[str, Any]) -> bool:
+        try:
+            for path, mtime_ns, size, digest in header["files"]:
+                stat = os.stat(path)
+                if stat.st_size != size:
+                    return False
+                if stat.st_mtime_ns != mtime_ns and _file_hash(path) != digest:
+                    return False
+            return all(_listing_hash(d) == digest for d, digest in header["directories"])
+        except OSError:
+            return False
+
+    def save(self, tree: ModuleTree, root_ids: List[str]):
+        """Write a snapshot of a built tree, if its source files can be fingerprinted."""
+        if tree.snapshot is not None:
+            return
+        try:
+            sources = self._sources(tree)
+            if sources is None:
+                logger.debug("Module %s has no resolvable source files; not snapshotted", tree.name)
+                return
+            files, directories = sources
+
+            writer = _Writer()
+            records = tree.records
+            columns = {name: writer.add([getattr(r, name) for r in records]) for name in RECORD_COLUMNS}
+            columns["children"] = writer.add([CHILD_SEPARATOR.join(r.children) for r in records])
+            indexes = {}
+            for name, index in tree.indexes.items():
+                if hasattr(index, "dump"):
+                    meta, arrays = index.dump()
+                    indexes[name] = {
+                        "class": f"{type(index).__module__}.{type(index).__qualname__}",
+                        "meta": meta,
+                        "arrays": {key: writer.add(value) for key, value in arrays.items()},
+                    }
+
+            header = json.dumps({
+                "version": FORMAT_VERSION,
+                "module": tree.name,
+                "root_ids": sorted(root_ids),
+                "count": len(records),
+                "files": files,
+                "directories": directories,
+                "columns": columns,
+                "indexes": indexes,
+            }, ensure_ascii=False).encode("utf-8")
+
+            path = self.path_for(tree.name, root_ids)
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                preamble = MAGIC + struct.pack("<Q", len(header)) + header
+                f.write(preamble + b"\0" * (-len(preamble) % ALIGN))
+                for part in writer.parts:
+                    f.write(part)
+            # Readers keep mapping the old file until they drop it
+            os.replace(temp_path, path)
+            self.saves += 1
+        except Exception:
+            logger.exception("Failed to snapshot module %s", tree.name)
+
+    def load(self, name: str, root_ids: List[str]) -> Optional[ModuleTree]:
+        """Map an up-to-date snapshot of a module, or None."""
+        started = time.perf_counter()
+        path = self.path_for(name, root_ids)
+        try:
+            with open(path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        try:
+            if buffer[:len(MAGIC)] != MAGIC:
+                raise ValueError("bad magic")
+            (header_length,) = struct.unpack_from("<Q", buffer, len(MAGIC))
+            header_end = len(MAGIC) + 8 + header_length
+            header = json.loads(buffer[len(MAGIC) + 8:header_end].decode("utf-8"))
+            base = header_end + (-header_end % ALIGN)
+            if header["version"] != FORMAT_VERSION or header["module"] != name \
+                    or header["root_ids"] != sorted(root_ids):
+                raise ValueError("different module")
+        except (ValueError, KeyError, struct.error) as e:
+            logger.warning("Ignoring unreadable snapshot %s: %s", path, e)
+            self.misses += 1
+            return None
+
+        if not self._fresh(header):
+            self.stale += 1
+            self.misses += 1
+            return None
+
+        def read(entry: Dict[str, Any]):
+            if entry["type"] == "array":
+                return np.frombuffer(buffer, dtype=entry["dtype"], count=entry["count"], offset=base + entry["offset"])
+            offsets = np.frombuffer(buffer, dtype="<i8", count=entry["count"] + 1, offset=base + entry["offsets"])
+            nulls = None
+            if entry["nulls"] is not None:
+                nulls = np.frombuffer(buffer, dtype="u1", count=entry["count"], offset=base + entry["nulls"])
+            return StringColumn(buffer, base + entry["blob"], offsets, nulls)
+
+        columns = {column: read(header["columns"][column]) for column in RECORD_COLUMNS}
+        records = MappedRecords(columns, read(header["columns"]["children"]))
+        tree = ModuleTree(name, records, positions=LazyPositions(columns["node_id"]), snapshot=path)
+
+        loaders: Dict[str, Callable[[], Any]] = {}
+        for index_name, builder in INDEX_BUILDERS.items():
+            stored = header["indexes"].get(index_name)
+            builder_class = f"{getattr(builder, '__module__', '')}.{getattr(builder, '__qualname__', '')}"
+            if stored is not None and stored["class"] == builder_class and hasattr(builder, "restore"):
+                def restore(builder=builder, stored=stored):
+                    arrays = {}
+                    for key, entry in stored["arrays"].items():
+                        value = read(entry)
+                        arrays[key] = value.tolist() if isinstance(value, StringColumn) else value
+                    return builder.restore(stored["meta"], arrays)
+                loaders[index_name] = restore
+            else:
+                # Registered after the snapshot was written: build it from the records
+                loaders[index_name] = lambda builder=builder: builder(tree)
+        tree.indexes = LazyIndexes(loaders)
+
+        self.hits += 1
+        elapsed = time.perf_counter() - started
+        self.load_time += elapsed
+        logger.info("Mapped module %s from snapshot (%d nodes) in %.1f ms", name, len(records), elapsed * 1000)
+        return tree
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "directory": self.directory,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "saves": self.saves,
+            "load_ms": round(self.load_time * 1000, 3),
+        }
+
+
+def configure_snapshots(enabled: bool = SNAPSHOT_ENABLED, directory: str = SNAPSHOT_DIR) -> Optional[SnapshotStore]:
+    """Give the corpus mirror a snapshot store in ``directory``, or none if disabled."""
+    corpus.store = SnapshotStore(directory) if enabled else None
+    return corpus.store
@@ -0,0 +1,175 @@
+"""Startup warm-up: preload manifest, cache warming and readiness tracking.
+
+``KERAG_PRELOAD`` (``start.py --preload``) names the modules to load at
+startup, either as a comma-separated list or as the path of a manifest
+file: a JSON list, a JSON object with a ``"modules"`` list, or one module
+name per line (``#`` starts a comment). Once they are loaded, their indexes
+are materialized and the default node views of their top levels and their
+skeletons are rendered into the view cache. ``/api/ready`` answers 200 only
+after all of that is done.
+"""
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from .cluster import cluster
+from .corpus import corpus
+from .kerag_client import client
+from .node_views import NodeViewError, render_view, view_cache, view_key
+from .skeleton import DEFAULT_DEPTH as SKELETON_DEPTH, render_skeleton, skeleton_key
+
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_ENV = "KERAG_PRELOAD"
+# Levels below the module roots whose node views are pre-rendered
+WARM_DEPTH = int(os.getenv("KERAG_PRELOAD_WARM_DEPTH", "1"))
+# The frontend's default view options, so warmed entries are the ones it asks for
+WARM_VIEW = {
+    "depth": 1,
+    "include_content": True,
+    "include_see_also": True,
+    "format": "markdown",
+    "show_metadata": False,
+    "display_mode": "none",
+}
+
+
+def read_manifest(value: Optional[str]) -> List[str]:
+    """Module names from a ``KERAG_PRELOAD`` value (names or a manifest path)."""
+    if not value:
+        return []
+    if os.path.isfile(value):
+        with open(value, encoding="utf-8") as f:
+            text = f.read()
+        if value.endswith(".json"):
+            data = json.loads(text)
+            names = data.get("modules", []) if isinstance(data, dict) else data
+        else:
+            names = [line.split("#", 1)[0] for line in text.splitlines()]
+    else:
+        names = value.split(",")
+    return list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+
+
+class StartupTracker:
+    """Per-phase startup timings and the readiness flag."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.ready = False
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.modules: List[str] = []
+        self.errors: Dict[str, str] = {}
+        self.warmed_views = 0
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a startup phase; a failing phase is recorded and re-raised."""
+        entry = self.phases[name] = {"state": "running", "seconds": None}
+        started = time.perf_counter()
+        try:
+            yield
+            entry["state"] = "done"
+        except Exception as e:
+            entry["state"] = "failed"
+            self.errors[name] = str(e)
+            raise
+        finally:
+            entry["seconds"] = round(time.perf_counter() - started, 4)
+
+    def mark_ready(self):
+        self.ready = True
+        logger.info("Ready after %.2fs (%s)", time.time() - self.started_at,
+                    ", ".join(f"{name} {p['seconds']}s" for name, p in self.phases.items()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "uptime": round(time.time() - self.started_at, 3),
+            "phases": self.phases,
+            "preloaded_modules": self.modules,
+            "warmed_views": self.warmed_views,
+            "errors": self.errors,
+        }
+
+
+def missing_modules(api, names: List[str]) -> List[str]:
+    """Manifest modules that are not loaded yet."""
+    result = api.get_all_modules()
+    loaded = set(((result.get("data") or {}).get("loaded_modules")) or [])
+    return [name for name in names if name not in loaded]
+
+
+def warm_caches(api, modules: List[str]) -> int:
+    """Materialize indexes and render the default views of ``modules``; returns views rendered."""
+    snapshot = corpus.snapshot()
+    rendered = 0
+    for name in modules:
+        tree = snapshot.modules.get(name)
+        if tree is None:
+            continue
+        for index_name in list(tree.indexes):
+            tree.indexes[index_name]
+
+        key = skeleton_key(name, SKELETON_DEPTH, tree.generation)
+        view = render_skeleton(tree, SKELETON_DEPTH)
+        view_cache.put(key, view, len(view.body))
+
+        depths = tree.indexes["skeleton"].depth
+        for position, depth in enumerate(depths):
+            if depth > WARM_DEPTH:
+                continue
+            node_id = tree.records[position].node_id
+            key = view_key(node_id, generation=tree.generation, **WARM_VIEW)
+            if view_cache.get(key) is not None:
+                continue
+            try:
+                render_view(api, key)
+                rendered += 1
+            except NodeViewError as e:
+                logger.warning("Could not warm view of %s: %s", node_id, e)
+    return rendered
+
+
+def warm_up_sync(api, tracker: "StartupTracker", names: List[str]):
+    """Preload and warm on the current thread (before workers are forked)."""
+    with tracker.phase("corpus"):
+        corpus.sync(api)
+    with tracker.phase("preload"):
+        for name in missing_modules(api, names):
+            result = api.load_module(name)
+            if not result.get("success"):
+                tracker.errors[name] = result.get("error", "Unknown error")
+        corpus.sync(api)
+    tracker.modules = [name for name in names if name in corpus.modules]
+    with tracker.phase("warm"):
+        tracker.warmed_views = warm_caches(api, tracker.modules)
+    tracker.mark_ready()
+
+
+async def warm_up(tracker: "StartupTracker", names: List[str]):
+    """Preload and warm in the background of a running server; readiness follows."""
+    try:
+        with tracker.phase("corpus"):
+            await client.run(corpus.sync, pool="modules")
+        with tracker.phase("preload"):
+            for name in await client.run(lambda api: missing_modules(api, names)):
+                result = await cluster.call("load_module", name)
+                if not result.get("success"):
+                    tracker.errors[name] = result.get("error", "Unknown error")
+            await client.run(corpus.sync, pool="modules")
+        tracker.modules = [name for name in names if name in corpus.modules]
+        with tracker.phase("warm"):
+            tracker.warmed_views = await client.run(lambda api: warm_caches(api, tracker.modules))
+        tracker.mark_ready()
+    except Exception:
+        logger.exception("Startup warm-up failed; not ready")
+
+
+# Global startup state
+startup = StartupTracker()
@@ -0,0 +1,152 @@
+"""In-memory, precompressed serving of the bundled frontend (``dist/``).
+
+At startup every file under ``dist/`` is read into a manifest together with
+its compressed variants: ``.br``/``.gz`` files shipped next to it, or gzip
+(and brotli, if the ``brotli`` package is installed) computed once here.
+Content-hashed bundles (``assets/index-<hash>.js``) are cacheable for a
+year; everything else, ``index.html`` included, is revalidated by ETag.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+# Smaller files are not worth compressing
+COMPRESS_MIN_BYTES = int(os.getenv("KERAG_STATIC_COMPRESS_MIN_BYTES", "1024"))
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
+# Vite output names: <name>-<8+ char hash>.<ext>
+HASHED_NAME = re.compile(r"-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+# Preferred first
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+class StaticAsset:
+    """One file of the bundle, with its compressed variants."""
+
+    def __init__(self, path: str, body: bytes, media_type: str, immutable: bool):
+        self.path = path
+        self.body = body
+        self.media_type = media_type
+        self.immutable = immutable
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.encoded: Dict[str, bytes] = {}
+
+
+def _compressible(media_type: str) -> bool:
+    return media_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _compress(body: bytes, encoding: str) -> Optional[bytes]:
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(body, quality=11)
+    return None
+
+
+def accepted_encodings(header: str) -> List[str]:
+    """Encodings named in an ``Accept-Encoding`` header, without ``q=0`` ones."""
+    accepted = []
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.append(name.strip().lower())
+    return accepted
+
+
+class StaticManifest:
+    """All files of a ``dist/`` directory, keyed by URL path."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.assets: Dict[str, StaticAsset] = {}
+        self.original_bytes = 0
+        self.compressed_bytes = 0
+        self._scan()
+
+    def _scan(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in sorted(filenames):
+                if filename.endswith(tuple(ENCODINGS.values())):
+                    continue
+                full = Path(dirpath) / filename
+                path = full.relative_to(self.root).as_posix()
+                media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                asset = StaticAsset(path, full.read_bytes(), media_type,
+                                    immutable=path.startswith("assets/") and bool(HASHED_NAME.search(filename)))
+                for encoding, suffix in ENCODINGS.items():
+                    # Prefer variants built with the bundle
+                    shipped = full.with_name(filename + suffix)
+                    if shipped.is_file():
+                        encoded = shipped.read_bytes()
+                    elif _compressible(media_type) and len(asset.body) >= COMPRESS_MIN_BYTES:
+                        encoded = _compress(asset.body, encoding)
+                    else:
+                        encoded = None
+                    if encoded is not None and len(encoded) < len(asset.body):
+                        asset.encoded[encoding] = encoded
+                self.assets[path] = asset
+                self.original_bytes += len(asset.body)
+                self.compressed_bytes += min([len(asset.body)] + [len(b) for b in asset.encoded.values()])
+        logger.info("Static manifest: %d files, %d bytes (%d compressed) from %s",
+                    len(self.assets), self.original_bytes, self.compressed_bytes, self.root)
+
+    def get(self, path: str) -> Optional[StaticAsset]:
+        return self.assets.get(path)
+
+    def response(self, request: Request, asset: StaticAsset) -> Response:
+        """Serve ``asset`` in the best encoding the client accepts, or 304 on a matching ETag."""
+        headers = {
+            "ETag": asset.etag,
+            "Cache-Control": IMMUTABLE_CACHE if asset.immutable else REVALIDATE_CACHE,
+        }
+        if asset.encoded:
+            headers["Vary"] = "Accept-Encoding"
+
+        body = asset.body
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        for encoding in ENCODINGS:
+            if encoding in asset.encoded and encoding in accepted:
+                body = asset.encoded[encoding]
+                headers["Content-Encoding"] = encoding
+                # Each representation gets its own tag
+                headers["ETag"] = f'{asset.etag[:-1]}-{encoding}"'
+                break
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or headers["ETag"] in if_none_match):
+            headers.pop("Content-Encoding", None)
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type=asset.media_type, headers=headers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": len(self.assets),
+            "bytes": self.original_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "brotli": brotli is not None,
+        }
@@ -0,0 +1,210 @@
+"""Type-ahead suggestions from a sorted prefix index over titles, labels and IDs."""
+
+import heapq
+import re
+from bisect import bisect_left
+from typing import Any, Dict, Iterator, List, Set, Tuple
+
+import numpy as np
+
+from .corpus import CorpusSnapshot, ModuleTree, register_index
+
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Entries looked at per module and prefix, per suggestion asked for; bounds
+# a lookup however short the prefix
+SCAN_FACTOR = 8
+# Word starts inside a title that get their own entry
+MAX_TITLE_WORDS = 8
+MAX_KEY_LENGTH = 80
+# Shortest query that is also matched with one edit
+MIN_FUZZY_LENGTH = 3
+# Distinct next characters tried per position for substitutions and insertions
+MAX_BRANCH = 64
+
+# Match kinds, best first
+LABEL, TITLE, NODE_ID, TITLE_WORD = range(4)
+KIND_NAMES = ("label", "title", "id", "title")
+_WORST = (2, 2, len(KIND_NAMES), 0)
+
+# Letters or digits after a non-word character, and every CJK character
+_WORD_START = re.compile(r"(?<!^)(?<![^\W_])[^\W_]|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+_SPACES = re.compile(r"\s+")
+_LAST_CHAR = "\U0010ffff"
+
+
+def normalize(text: str) -> str:
+    """Case-fold and collapse whitespace, as keys are stored."""
+    return _SPACES.sub(" ", text.casefold()).strip()
+
+
+def _keys(record) -> Iterator[Tuple[str, int]]:
+    label = normalize(record.label or "")
+    title = normalize(record.title or "")
+    if label:
+        yield label[:MAX_KEY_LENGTH], LABEL
+    if title:
+        yield title[:MAX_KEY_LENGTH], TITLE
+        # Later words of the title, so "intro" finds "A Short Introduction"
+        for count, word in enumerate(_WORD_START.finditer(title)):
+            if count >= MAX_TITLE_WORDS:
+                break
+            yield title[word.start():word.start() + MAX_KEY_LENGTH], TITLE_WORD
+    node_id = record.node_id.casefold()
+    yield node_id[:MAX_KEY_LENGTH], NODE_ID
+    # Shorthand IDs: the path inside the module and its last segment
+    local = node_id.split("::", 1)[-1]
+    for key in {local, local.rsplit("/", 1)[-1]}:
+        if key and key != node_id:
+            yield key[:MAX_KEY_LENGTH], NODE_ID
+
+
+@register_index("suggest")
+class SuggestIndex:
+    """Sorted keys of one module with the node position and match kind of each.
+
+    Keys are case-folded titles, labels, title word suffixes and shorthand
+    IDs; the completions of a prefix are the contiguous run of keys starting
+    at ``bisect_left(keys, prefix)``.
+    """
+
+    def __init__(self, tree: ModuleTree):
+        best: Dict[Tuple[str, int], int] = {}
+        for position, record in enumerate(tree.records):
+            for key, kind in _keys(record):
+                entry = (key, position)
+                if kind < best.get(entry, len(KIND_NAMES)):
+                    best[entry] = kind
+        entries = sorted(best)
+        self.keys: List[str] = [key for key, _ in entries]
+        self.positions: List[int] = [position for _, position in entries]
+        self.kinds: List[int] = [best[entry] for entry in entries]
+
+    def dump(self):
+        """Keys with their position and kind arrays, for snapshots."""
+        return {}, {
+            "keys": self.keys,
+            "positions": np.array(self.positions, dtype=np.int32),
+            "kinds": np.array(self.kinds, dtype=np.int8),
+        }
+
+    @classmethod
+    def restore(cls, meta, arrays) -> "SuggestIndex":
+        index = cls.__new__(cls)
+        index.keys = arrays["keys"]
+        index.positions = arrays["positions"].tolist()
+        index.kinds = arrays["kinds"].tolist()
+        return index
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def complete(self, prefix: str, scan: int) -> range:
+        """Entry indexes of up to ``scan`` keys starting with ``prefix``.
+
+        Keys extending another key sort right after it, so the first entries
+        of the run are the shortest completions of each branch.
+        """
+        keys = self.keys
+        start = bisect_left(keys, prefix)
+        end = min(len(keys), start + scan)
+        if end > start and not keys[end - 1].startswith(prefix):
+            end = bisect_left(keys, prefix + _LAST_CHAR, start, end)
+        return range(start, end)
+
+    def next_chars(self, head: str) -> List[str]:
+        """Distinct characters following ``head`` in the keys, skipping from run to run."""
+        keys = self.keys
+        i, end = bisect_left(keys, head), len(keys)
+        chars: List[str] = []
+        while i < end and len(chars) < MAX_BRANCH:
+            key = keys[i]
+            if not key.startswith(head):
+                break
+            if len(key) == len(head):
+                i += 1
+                continue
+            char = key[len(head)]
+            chars.append(char)
+            if char == _LAST_CHAR:
+                break
+            i = bisect_left(keys, head + chr(ord(char) + 1), i + 1)
+        return chars
+
+    def has_prefix(self, prefix: str) -> bool:
+        i = bisect_left(self.keys, prefix)
+        return i < len(self.keys) and self.keys[i].startswith(prefix)
+
+    def variants(self, query: str) -> Set[str]:
+        """Prefixes one edit away from ``query``.
+
+        An edit at position ``i`` keeps ``query[:i]``, so positions past the
+        longest indexed prefix of the query are skipped; substitutions and
+        insertions only use characters that follow the head in some key.
+        """
+        low, high = 0, len(query)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.has_prefix(query[:middle]):
+                low = middle
+            else:
+                high = middle - 1
+        last = min(low, len(query) - 1)
+
+        found = {query[:i] + query[i + 1:] for i in range(last + 1)}
+        found.update(query[:i] + query[i + 1] + query[i] + query[i + 2:] for i in range(min(last + 1, len(query) - 1)))
+        for i in range(last + 1):
+            head = query[:i]
+            for char in self.next_chars(head):
+                if char != query[i]:
+                    found.add(head + char + query[i + 1:])
+                found.add(head + char + query[i:])
+        found.discard(query)
+        found.discard("")
+        return found
+
+
+def suggest(snapshot: CorpusSnapshot, query: str, limit: int = DEFAULT_LIMIT,
+            fuzzy: bool = False) -> List[Dict[str, Any]]:
+    """Top ``limit`` nodes whose title, label or ID starts with ``query``.
+
+    Candidates rank by exact over one-edit matches, whole-key matches, match
+    kind (label, title, ID, later title word), key length and scan order.
+    With ``fuzzy``, prefixes one insertion, deletion, substitution or
+    transposition away are matched too once the query has
+    ``MIN_FUZZY_LENGTH`` characters.
+    """
+    query = normalize(query)
+    if not query:
+        return []
+
+    # (module order, position) -> rank
+    best: Dict[Tuple[int, int], Tuple[int, int, int, int]] = {}
+
+    def collect(order: int, index: SuggestIndex, prefix: str, edits: int, scan: int):
+        keys, positions, kinds = index.keys, index.positions, index.kinds
+        for i in index.complete(prefix, scan):
+            rank = (edits, 0 if len(keys[i]) == len(prefix) else 1, kinds[i], len(keys[i]))
+            node = (order, positions[i])
+            if rank < best.get(node, _WORST):
+                best[node] = rank
+
+    trees = list(snapshot.modules.values())
+    for order, tree in enumerate(trees):
+        collect(order, tree.indexes["suggest"], query, 0, limit * SCAN_FACTOR)
+    # One-edit matches rank below every exact one, so only fill up with them
+    if fuzzy and len(query) >= MIN_FUZZY_LENGTH and len(best) < limit:
+        for order, tree in enumerate(trees):
+            index = tree.indexes["suggest"]
+            for variant in index.variants(query):
+                collect(order, index, variant, 1, limit)
+
+    suggestions = []
+    ranked = heapq.nsmallest(limit, best.items(), key=lambda item: (item[1], item[0]))
+    for (order, position), rank in ranked:
+        item = trees[order].records[position].summary()
+        item["match"] = KIND_NAMES[rank[2]]
+        item["fuzzy"] = rank[0] > 0
+        suggestions.append(item)
+    return suggestions
@@ -0,0 +1,246 @@
+"""Reload modules whose source files change on disk.
+
+The watcher follows the local and global roots being served with ``watchfiles``
+(inotify and friends) when it is installed, or by polling file mtimes and
+sizes every ``KERAG_WATCH_INTERVAL`` seconds. A changed file is mapped to
+the loaded module it belongs to (by the source paths of the module's nodes,
+their directories, or the module's top-level directory), and only that
+module is re-parsed and mirrored again through the ``reload_module``
+cluster operation; every other module keeps its trees, indexes and cached
+views. Changes to files of modules that are not loaded are ignored.
+
+Set ``KERAG_WATCH=0`` (``--no-watch``) to turn it off. With ``--workers``
+only worker 0 watches; the others replay the reloads from the journal.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .cluster import cluster
+from .corpus import corpus, loaded_module_roots, source_path
+from .events import event_bus
+from .kerag_client import client
+from .worker_pool import pools
+
+try:
+    import watchfiles
+except ImportError:  # optional: polling
+    watchfiles = None
+
+
+logger = logging.getLogger(__name__)
+
+WATCH_ENABLED = os.getenv("KERAG_WATCH", "1") not in ("0", "false", "no")
+WATCH_INTERVAL = float(os.getenv("KERAG_WATCH_INTERVAL", "2.0"))
+# Changes arriving within this window are reloaded together
+WATCH_DEBOUNCE = float(os.getenv("KERAG_WATCH_DEBOUNCE", "0.5"))
+IGNORED_SUFFIXES = ("~", ".swp", ".swx", ".tmp", ".snap", ".pyc")
+
+# (mtime_ns, size) by file path
+Listing = Dict[str, Tuple[int, int]]
+
+
+@cluster.operation("reload_module")
+def reload_module(name: str) -> Dict[str, Any]:
+    """Re-parse a loaded module from its files and mirror it again."""
+    def reload(api):
+        if name not in loaded_module_roots(api):
+            return {"success": False, "data": None, "error": f"Module not loaded: {name}", "metadata": {}}
+        api.unload_module(name)
+        result = api.load_module(name)
+        refreshed = corpus.refresh(api, [name])
+        if result.get("success") and name not in refreshed:
+            return {"success": False, "data": None, "error": f"Module {name} has no roots after reloading",
+                    "metadata": {}}
+        return result
+
+    return client.run_sync(reload, write=True)
+
+
+def _ignored(name: str) -> bool:
+    return name.startswith(".") or name.endswith(IGNORED_SUFFIXES)
+
+
+def scan(roots: Iterable[str]) -> Listing:
+    """Stat every (non-hidden) file under ``roots``."""
+    listing: Listing = {}
+    for root in roots:
+        for directory, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                if _ignored(filename):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                listing[path] = (stat.st_mtime_ns, stat.st_size)
+    return listing
+
+
+def diff(old: Listing, new: Listing) -> Set[str]:
+    """Paths added, removed or modified between two listings."""
+    changed = {path for path, stat in new.items() if old.get(path) != stat}
+    changed.update(path for path in old if path not in new)
+    return changed
+
+
+class ModuleWatcher:
+    """Watches the knowledge base roots and reloads the modules whose files change."""
+
+    def __init__(self, interval: float = WATCH_INTERVAL, debounce: float = WATCH_DEBOUNCE):
+        self.interval = interval
+        self.debounce = debounce
+        self.backend = "watchfiles" if watchfiles is not None else "polling"
+        self.watching: List[str] = []
+        self.reloads = 0
+        self.failures = 0
+        self.last_reload: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        # Source file and directory -> module, for one corpus generation
+        self._sources: Optional[Tuple[int, Dict[str, str], Dict[str, str]]] = None
+
+    @staticmethod
+    def roots() -> List[str]:
+        roots = [client.settings["kerag_local"], client.settings["kerag_home"]]
+        return [os.path.abspath(root) for root in dict.fromkeys(roots) if root and os.path.isdir(root)]
+
+    def start(self):
+        """Start watching in the background (in the process that should)."""
+        if not WATCH_ENABLED or self._task is not None or cluster.worker_id not in (None, 0):
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        try:
+            if watchfiles is not None:
+                await self._watch_events()
+            else:
+                await self._poll()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("File watcher stopped")
+
+    async def _poll(self):
+        listing: Listing = {}
+        while True:
+            roots = self.roots()
+            if roots != self.watching:
+                # New roots (settings switch): take a fresh baseline
+                self.watching = roots
+                listing = await pools.get("watch").run(scan, roots)
+                if roots:
+                    logger.info("Watching %s for changes (polling every %.1fs)", ", ".join(roots), self.interval)
+            elif roots:
+                current = await pools.get("watch").run(scan, roots)
+                changed, listing = diff(listing, current), current
+                if changed:
+                    await self.apply(changed)
+            await asyncio.sleep(self.interval)
+
+    async def _watch_events(self):
+        while True:
+            roots = self.roots()
+            self.watching = roots
+            if not roots:
+                await asyncio.sleep(self.interval)
+                continue
+            logger.info("Watching %s for changes", ", ".join(roots))
+            async for changes in watchfiles.awatch(*roots, debounce=int(self.debounce * 1000),
+                                                   rust_timeout=int(self.interval * 1000),
+                                                   yield_on_timeout=True):
+                changed = {path for _, path in changes if not _ignored(os.path.basename(path))}
+                if changed:
+                    await self.apply(changed)
+                if self.roots() != roots:
+                    break
+
+    def _source_maps(self) -> Tuple[Dict[str, str], Dict[str, str]]:
+        snapshot = corpus.snapshot()
+        if self._sources is None or self._sources[0] != snapshot.generation:
+            files: Dict[str, str] = {}
+            directories: Dict[str, str] = {}
+            for name, tree in snapshot.modules.items():
+                for path in {record.path for record in tree.records if record.path}:
+                    resolved = source_path(path)
+                    if resolved is None:
+                        continue
+                    resolved = os.path.abspath(resolved)
+                    files[resolved] = name
+                    directories.setdefault(os.path.dirname(resolved), name)
+            self._sources = (snapshot.generation, files, directories)
+        return self._sources[1], self._sources[2]
+
+    def modules_for(self, paths: Iterable[str]) -> Dict[str, List[str]]:
+        """Group changed paths by the loaded module they belong to."""
+        files, directories = self._source_maps()
+        loaded = corpus.modules
+        affected: Dict[str, List[str]] = {}
+        for path in sorted(paths):
+            path = os.path.abspath(path)
+            module = files.get(path) or directories.get(os.path.dirname(path))
+            if module is None:
+                # A file in the module's top-level directory under a root
+                for root in self.watching:
+                    relative = os.path.relpath(path, root)
+                    top = relative.split(os.sep, 1)[0]
+                    if not relative.startswith("..") and top in loaded:
+                        module = top
+                        break
+            if module is not None:
+                affected.setdefault(module, []).append(path)
+        return affected
+
+    async def apply(self, paths: Iterable[str]) -> Dict[str, bool]:
+        """Reload the modules ``paths`` belong to; returns success by module."""
+        outcome: Dict[str, bool] = {}
+        for name, files in (await pools.get("watch").run(self.modules_for, paths)).items():
+            started = time.perf_counter()
+            logger.info("Reloading module %s (%d changed files)", name, len(files))
+            event_bus.publish({"type": "reloading", "module": name, "files": files})
+            try:
+                result = await cluster.call("reload_module", name)
+            except Exception as e:
+                logger.exception("Reloading module %s failed", name)
+                result = {"success": False, "error": str(e)}
+            outcome[name] = bool(result.get("success"))
+            self.last_reload = {
+                "module": name,
+                "files": files,
+                "success": outcome[name],
+                "error": result.get("error"),
+                "seconds": round(time.perf_counter() - started, 4),
+                "at": time.time(),
+            }
+            if outcome[name]:
+                self.reloads += 1
+            else:
+                self.failures += 1
+                logger.warning("Reloading module %s failed: %s", name, result.get("error"))
+                event_bus.publish({"type": "reload_failed", "module": name, "error": result.get("error")})
+        return outcome
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": WATCH_ENABLED,
+            "running": self._task is not None and not self._task.done(),
+            "backend": self.backend,
+            "roots": self.watching,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_reload": self.last_reload,
+        }
+
+
+# Global file watcher
+watcher = ModuleWatcher()
@@ -0,0 +1,144 @@
+"""Bounded worker pools for running blocking KERAG calls off the event loop."""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+# Pool name -> (environment variable, default worker count)
+POOL_DEFAULTS = {
+    "default": ("KERAG_POOL_SIZE", 8),
+    "search": ("KERAG_SEARCH_POOL_SIZE", 2),
+    "modules": ("KERAG_MODULE_POOL_SIZE", 1),
+    "watch": ("KERAG_WATCH_POOL_SIZE", 1),
+}
+QUEUE_DEPTH_ENV = "KERAG_POOL_QUEUE_DEPTH"
+DEFAULT_QUEUE_DEPTH = 64
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when a pool already has its maximum number of queued tasks."""
+
+
+class WorkerPool:
+    """A thread pool with its own concurrency limit and queue-depth metrics."""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int = DEFAULT_QUEUE_DEPTH):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=f"kerag-{name}"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._peak_queued = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_time = 0.0
+        self._run_time = 0.0
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``fn`` on the pool and await its result."""
+        with self._lock:
+            if self.max_queue and self._queued >= self.max_queue:
+                self._rejected += 1
+                raise PoolSaturatedError(
+                    f"Worker pool '{self.name}' is saturated ({self._queued} tasks queued)"
+                )
+            self._queued += 1
+            self._submitted += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+        enqueued_at = time.perf_counter()
+
+        def task():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_time += started_at - enqueued_at
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._run_time += time.perf_counter() - started_at
+                    if failed:
+                        self._failed += 1
+                    else:
+                        self._completed += 1
+
+        # Run in the caller's context, so request-scoped state (the request ID) follows the call
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, context.run, task)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the pool's counters."""
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._queued,
+                "peak_queued": self._peak_queued,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_time / finished * 1000, 3) if finished else 0.0,
+                "avg_run_ms": round(self._run_time / finished * 1000, 3) if finished else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and release the threads."""
+        self._executor.shutdown(wait=wait)
+
+
+class PoolRegistry:
+    """Named worker pools, configured from the environment on first use."""
+
+    def __init__(self):
+        self._pools: Dict[str, WorkerPool] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str = "default") -> WorkerPool:
+        """Get (or lazily create) a pool by name."""
+        pool = self._pools.get(name)
+        if pool is not None:
+            return pool
+        with self._lock:
+            if name not in self._pools:
+                env_name, default_size = POOL_DEFAULTS.get(name, POOL_DEFAULTS["default"])
+                max_workers = int(os.getenv(env_name, str(default_size)))
+                max_queue = int(os.getenv(QUEUE_DEPTH_ENV, str(DEFAULT_QUEUE_DEPTH)))
+                self._pools[name] = WorkerPool(name, max_workers, max_queue)
+            return self._pools[name]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get the counters of every pool created so far."""
+        return {name: pool.stats() for name, pool in list(self._pools.items())}
+
+    def shutdown(self, wait: bool = True):
+        """Shut down all pools."""
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait=wait)
+
+
+# Global pool registry
+pools = PoolRegistry()
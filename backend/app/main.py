@@ -1,31 +1,43 @@
 """Main FastAPI application."""
 
+import asyncio
 import os
 import sys
 import logging
-import traceback
 from pathlib import Path
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 # Add KERAG root to path to import kerag
 sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent))
 
-from .api.routes import modules, nodes, search, status, settings
+from .api.routes import modules, nodes, search, status, settings, debug, events
 from .core.kerag_client import client
-
-# 配置日志
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from .core.worker_pool import pools, PoolSaturatedError
+from .core.cluster import cluster, ClusterSyncMiddleware
+from .core.regex_sandbox import regex_sandbox
+from .core.jobs import jobs
+from .core.snapshots import configure_snapshots
+from .core.startup import PRELOAD_ENV, read_manifest, startup, warm_up
+from .core.static_assets import StaticManifest
+from .core.encoding import CompressionMiddleware, FastJSONResponse
+from .core.metrics import PROMETHEUS_MEDIA_TYPE, MetricsMiddleware, metrics
+from .core.request_state import set_access_level
+from .core.logs import configure_logging
+from .core.profiling import ProfilingMiddleware
+from .core.watcher import watcher
+
+# 配置日志 (level from KERAG_LOG_LEVEL, written by a background thread)
+configure_logging()
 logger = logging.getLogger(__name__)
+# Module snapshot cache (KERAG_SNAPSHOT_CACHE)
+configure_snapshots()
 app = FastAPI(
     title="KERAG Web API",
     description="Web API for KERAG Knowledge Base",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 # CORS middleware
 app.add_middleware(
@@ -36,51 +48,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add global exception handler to catch all unhandled exceptions
-@app.middleware("http")
-async def catch_exceptions_middleware(request: Request, call_next):
-    try:
-        logger.info(f"API Request: {request.method} {request.url.path}")
-        response = await call_next(request)
-
-        # Catch all 4xx and 5xx errors
-        if response.status_code >= 400:
-            # Clone response body to read error details
-            response_body = b""
-            async for chunk in response.body_iterator:
-                response_body += chunk
-
-            # Recreate response body
-            response = JSONResponse(
-                status_code=response.status_code,
-                content=response_body.decode() if response_body else {"error": "Unknown error"}
-            )
-
-            # Print error information
-            error_msg = f"\n{'='*80}\n[ERROR] API Response Error {response.status_code}: {request.method} {request.url.path}\n{'='*80}"
-            error_msg += f"\nResponse Content: {response_body.decode()}\n{'='*80}\n"
-
-            logger.error(error_msg)
-            print(error_msg, file=sys.stderr)
-
-        return response
-    except Exception as exc:
-        # Print full error info to console and logs
-        error_msg = f"\n{'='*80}\n[ERROR] Uncaught Exception: {exc.__class__.__name__}: {str(exc)}\n{'='*80}"
-        error_msg += f"\nRequest Info:\n  - Method: {request.method}\n  - URL: {request.url}\n  - Client IP: {request.client.host if request.client else 'unknown'}"
-        error_msg += f"\n\nFull Traceback:\n{traceback.format_exc()}\n{'='*80}\n"
-
-        logger.error(error_msg)
-        print(error_msg, file=sys.stderr)
-
-        return JSONResponse(
-            status_code=500,
-            content={
-                "error": "Internal server error",
-                "detail": str(exc),
-                "traceback": traceback.format_exc()
-            }
-        )
+# Bring this worker's modules up to date before each request (multi-worker mode)
+app.add_middleware(ClusterSyncMiddleware)
+
+# Compress large responses
+app.add_middleware(CompressionMiddleware)
+
+# On-demand profiling and the slow-request buffer (reads the state MetricsMiddleware sets up)
+app.add_middleware(ProfilingMiddleware)
+
+# Request metrics and the handler of last resort (outermost, so it sees what is sent)
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(PoolSaturatedError)
+async def pool_saturated_handler(request: Request, exc: PoolSaturatedError):
+    """Shed load with 503 when a KERAG worker pool is full."""
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
 
 # Include routers with /api prefix (with trailing slash support)
 app.include_router(modules.router, prefix="/api", tags=["modules"])
@@ -88,6 +71,8 @@ app.include_router(nodes.router, prefix="/api", tags=["nodes"])
 app.include_router(search.router, prefix="/api", tags=["search"])
 app.include_router(status.router, prefix="/api", tags=["status"])
 app.include_router(settings.router, prefix="/api", tags=["settings"])
+app.include_router(debug.router, prefix="/api", tags=["debug"])
+app.include_router(events.router, prefix="/api", tags=["events"])
 
 # Initialize KERAG API on startup
 @app.on_event("startup")
@@ -98,9 +83,36 @@ async def startup_event():
     local_root = os.getenv("KERAG_LOCAL", "")
     global_root = os.getenv("KERAG_HOME", "")
 
-    logger.info(f"Initializing KERAG with local root: {local_root}, global root: {global_root} and language: {lang}")
-    client.init_api(local_root=local_root, global_root=global_root, lang=lang)
-    logger.info(f"KERAG initialized with local root: {local_root}, global root: {global_root} and language: {lang}")
+    if cluster.active:
+        # Forked worker: the master already loaded KERAG, preloaded and warmed up
+        logger.info("Worker %s (pid %d) sharing the master's knowledge base", cluster.worker_id, os.getpid())
+        await cluster.catch_up()
+        watcher.start()
+        return
+
+    logger.info("Initializing KERAG with local root: %s, global root: %s and language: %s", local_root, global_root, lang)
+    with startup.phase("kerag_init"):
+        client.init_from_env()
+    logger.info("KERAG initialized with local root: %s, global root: %s and language: %s", local_root, global_root, lang)
+
+    # Preload and warm in the background; /api/ready reports when done
+    asyncio.get_running_loop().create_task(warm_up(startup, read_manifest(os.getenv(PRELOAD_ENV))))
+    # Reload modules whose files change
+    watcher.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release KERAG worker pools and worker processes."""
+    watcher.stop()
+    pools.shutdown(wait=False)
+    regex_sandbox.shutdown()
+    jobs.shutdown()
+
+# Prometheus metrics
+@app.get("/api/metrics")
+async def get_metrics():
+    """Request, KERAG-call and worker-pool metrics in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_MEDIA_TYPE)
 
 # Health check
 @app.get("/api/health")
@@ -108,35 +120,45 @@ async def health():
     """Health check endpoint."""
     return {"status": "healthy"}
 
+# Readiness check
+@app.get("/api/ready")
+async def ready():
+    """Readiness endpoint: 200 once preloading and warm-up are done, 503 before."""
+    if not startup.ready:
+        # Expected while starting up: probes polling for it are not errors
+        set_access_level(logging.INFO)
+    return JSONResponse(status_code=200 if startup.ready else 503, content=startup.to_dict())
+
 # Mount static files
 # In production, frontend/dist contains the built assets
 app_dir = Path(__file__).parent
 # Case 1: Package installation (dist is inside kerag_web package)
 static_path = app_dir.parent / "dist"
 
-# Case 2: Source development (dist is in ../../../frontend/dist)
+# Case 2: Source development (dist is in ../../frontend/dist)
 if not static_path.exists():
-    static_path = app_dir.parent.parent.parent / "frontend" / "dist"
+    static_path = app_dir.parent.parent / "frontend" / "dist"
 
 if static_path.exists():
-    logger.info(f"Serving static files from: {static_path}")
-    app.mount("/assets", StaticFiles(directory=str(static_path / "assets")), name="assets")
+    logger.info("Serving static files from: %s", static_path)
+    static_manifest = StaticManifest(static_path)
 
-    @app.get("/{full_path:path}")
+    @app.api_route("/{full_path:path}", methods=["GET", "HEAD"])
     async def serve_spa(request: Request, full_path: str):
         # Prevent accessing /api routes here (though include_router usually handles it)
         if full_path.startswith("api"):
             return JSONResponse(status_code=404, content={"error": "API endpoint not found"})
 
         # If the file exists in dist, serve it
-        file_path = static_path / full_path
-        if file_path.is_file():
-            return FileResponse(str(file_path))
-
-        # Otherwise, serve index.html for SPA routing
-        return FileResponse(str(static_path / "index.html"))
+        asset = static_manifest.get(full_path)
+        if asset is None:
+            if full_path.startswith("assets/"):
+                return JSONResponse(status_code=404, content={"error": "Asset not found"})
+            # Otherwise, serve index.html for SPA routing
+            asset = static_manifest.get("index.html")
+        return static_manifest.response(request, asset)
 else:
-    logger.warning(f"Static directory not found at {static_path}. Running in API-only mode.")
+    logger.warning("Static directory not found at %s. Running in API-only mode.", static_path)
 
     @app.get("/")
     async def root():
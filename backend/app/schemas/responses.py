@@ -66,7 +66,7 @@ class SearchResult(BaseModel):
     type: str
     module: Optional[str] = None
     score: float = 0.0
-    highlights: List[Dict[str, str]] = Field(default_factory=list)
+    highlights: List[Dict[str, Any]] = Field(default_factory=list)
 
 
 # API Response Models
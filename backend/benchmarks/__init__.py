@@ -0,0 +1 @@
+"""Benchmarks of the web API against synthetic or real knowledge bases."""
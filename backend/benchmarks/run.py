@@ -0,0 +1,369 @@
+"""Benchmark runner: drives the API in-process and compares with a stored baseline.
+
+Run from the ``backend`` directory::
+
+    python -m benchmarks                            # in-memory stand-in, default sizes
+    python -m benchmarks --depth 5 --fanout 6       # a bigger synthetic knowledge base
+    python -m benchmarks --kerag real --modules-list mymodule
+    python -m benchmarks --save-baseline --runs 10  # record benchmarks/baseline.json
+
+Each scenario sends its requests concurrently through an ASGI client
+(no sockets) and reports p50/p95/p99 latency and requests per second.
+The run fails (exit status 1) on request errors, or when a latency or
+throughput figure is worse than the baseline by more than its tolerance.
+
+A baseline recorded with ``--runs N`` stores the median of N runs, each in
+a fresh process so no cache carries over, and for each scenario and figure
+a tolerance of ``SPREAD_FACTOR`` times the spread (standard deviation over
+median) seen between those runs, at least ``MIN_TOLERANCE``.
+``--tolerance`` replaces them with one value for every figure.
+
+``baseline.json`` is committed, recorded with the stand-in at the default
+sizes on a developer machine. Its figures only hold on comparable hardware,
+so record a local baseline before relying on the check elsewhere.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from .synthetic import StandInKERAGAPI, SyntheticKB, configure
+
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+# Used when neither --tolerance / --min-delta-ms nor the baseline set them
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_MIN_DELTA_MS = 1.0
+READY_TIMEOUT = 300.0
+JOB_POLL_SECONDS = 0.005
+# Per-scenario figures compared with the baseline; lower is better except rps
+LATENCY_FIGURES = ("p50_ms", "p95_ms")
+FIGURES = LATENCY_FIGURES + ("rps",)
+# A figure's saved tolerance: its spread between runs times this (about three standard deviations), at least MIN_TOLERANCE
+SPREAD_FACTOR = 3.0
+MIN_TOLERANCE = 0.2
+# Runs needed to measure the spread when saving a baseline
+MIN_SPREAD_RUNS = 3
+WORD = re.compile(r"[^\W\d_]{4,}")
+
+
+def install_stand_in(kb: SyntheticKB):
+    """Serve ``kb`` through the stand-in in place of ``kerag.api.KERAGAPI``."""
+    configure(kb)
+    package = types.ModuleType("kerag")
+    api_module = types.ModuleType("kerag.api")
+    api_module.KERAGAPI = StandInKERAGAPI
+    package.api = api_module
+    sys.modules["kerag"] = package
+    sys.modules["kerag.api"] = api_module
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Run the app's startup and shutdown handlers around the benchmark."""
+    inbox: asyncio.Queue = asyncio.Queue()
+    outbox: asyncio.Queue = asyncio.Queue()
+    task = asyncio.ensure_future(app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}},
+                                     inbox.get, outbox.put))
+    await inbox.put({"type": "lifespan.startup"})
+    message = await outbox.get()
+    if message["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"Startup failed: {message.get('message')}")
+    try:
+        yield
+    finally:
+        await inbox.put({"type": "lifespan.shutdown"})
+        await outbox.get()
+        await task
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies: List[float], errors: int, seconds: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "rps": round(len(latencies) / seconds, 1) if seconds else 0.0,
+    }
+
+
+async def drive(send: Callable[[int], Awaitable[httpx.Response]], count: int, concurrency: int,
+                warmup: int = 0) -> Dict[str, Any]:
+    """Send ``count`` requests from ``concurrency`` concurrent tasks; ``warmup`` more go first, unmeasured."""
+    for i in range(warmup):
+        await send(count + i)
+
+    latencies: List[float] = []
+    errors = 0
+    indices = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for i in indices:
+            started = time.perf_counter()
+            response = await send(i)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def wait_for_job(client: httpx.AsyncClient, response: httpx.Response) -> httpx.Response:
+    """Poll a module job until it finishes; a failed job is returned as a 500."""
+    job = response.json()["data"]
+    while job["state"] in ("queued", "running"):
+        await asyncio.sleep(JOB_POLL_SECONDS)
+        job = (await client.get(f"/api/modules/jobs/{job['id']}")).json()["data"]
+    return httpx.Response(200 if job["state"] == "done" else 500, json=job)
+
+
+async def run_scenarios(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    from app.main import app
+    from app.core.corpus import corpus
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    results: Dict[str, Dict[str, Any]] = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app), httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                               timeout=READY_TIMEOUT) as client:
+        deadline = time.monotonic() + READY_TIMEOUT
+        while (await client.get("/api/ready")).status_code != 200:
+            if time.monotonic() > deadline:
+                raise RuntimeError("The app did not become ready")
+            await asyncio.sleep(0.05)
+
+        available = (await client.get("/api/modules/")).json()["data"]["available_modules"]
+        modules = args.modules_list.split(",") if args.modules_list else available
+        response = await client.post("/api/modules/load/bulk", json={"modules": modules},
+                                     params={"background": True})
+        loaded = await wait_for_job(client, response)
+        if loaded.status_code != 200:
+            raise RuntimeError(f"Could not load modules: {loaded.json()['errors']}")
+
+        snapshot = corpus.snapshot()
+        records = [record for tree in snapshot.modules.values() for record in tree.records]
+        node_ids = [record.node_id for record in records]
+        sections = [record.node_id for record in records if record.children] or node_ids
+        words = sorted({word.lower() for record in rng.sample(records, min(len(records), 500))
+                        for word in WORD.findall(f"{record.title} {record.content}")})
+        print(f"{len(modules)} modules, {len(records)} nodes, {len(words)} search terms")
+
+        def pick(values: List[str]) -> List[str]:
+            return [rng.choice(values) for _ in range(args.requests + args.warmup)]
+
+        detail_ids = pick(node_ids)
+        scenarios: Dict[str, Callable[[int], Awaitable[httpx.Response]]] = {
+            "nodes_detail": lambda i: client.get("/api/nodes/detail", params={
+                "node_id": detail_ids[i], "format": "markdown", "depth": 1}),
+        }
+        preview_ids = pick(sections)
+        scenarios["nodes_preview_children"] = lambda i: client.get("/api/nodes/preview_children", params={
+            "node_id": preview_ids[i]})
+        search_terms = pick(words)
+        scenarios["search"] = lambda i: client.get("/api/search/", params={
+            "q": search_terms[i], "max_results": 50})
+        scenarios["search_bm25"] = lambda i: client.get("/api/search/", params={
+            "q": search_terms[i], "max_results": 50, "rank": "bm25"})
+
+        for name, send in scenarios.items():
+            results[name] = await drive(send, args.requests, args.concurrency, args.warmup)
+
+        # Loading is serialized by KERAG; measure whole load jobs one at a time
+        module = modules[0]
+
+        async def load(i: int) -> httpx.Response:
+            params = {"module_name": module, "background": True}
+            await wait_for_job(client, await client.delete("/api/modules/unload", params=params))
+            return await wait_for_job(client, await client.post("/api/modules/load", params=params))
+
+        results["modules_load"] = await drive(load, args.load_cycles, 1)
+    return results
+
+
+def run_once(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """Run every scenario once."""
+    return asyncio.run(run_scenarios(args))
+
+
+def run_isolated(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """Run the scenarios in a forked process, so no cache or loaded module carries over between runs."""
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("fork")) as executor:
+        return executor.submit(run_once, args).result()
+
+
+def median_results(runs: List[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Per-scenario medians of the runs' figures (errors are summed)."""
+    results = {}
+    for name, first in runs[0].items():
+        result = {key: round(statistics.median(run[name][key] for run in runs), 3) for key in first}
+        result["errors"] = sum(run[name]["errors"] for run in runs)
+        result["requests"] = first["requests"]
+        results[name] = result
+    return results
+
+
+def spread_tolerances(runs: List[Dict[str, Dict[str, Any]]],
+                      medians: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Per-scenario, per-figure tolerances from the spread between runs."""
+    tolerances = {}
+    for name, median in medians.items():
+        tolerances[name] = {}
+        for figure in FIGURES:
+            spread = statistics.stdev(run[name][figure] for run in runs) / median[figure] if median[figure] else 0.0
+            tolerances[name][figure] = round(max(MIN_TOLERANCE, SPREAD_FACTOR * spread), 2)
+    return tolerances
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerances: Dict[str, Dict[str, float]],
+            tolerance: float, min_delta_ms: float) -> List[str]:
+    """Regressions of ``results`` against the baseline's results.
+
+    A figure is allowed its entry in ``tolerances``, else ``tolerance``.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        allowed = {figure: tolerances.get(name, {}).get(figure, tolerance) for figure in FIGURES}
+        for figure in LATENCY_FIGURES:
+            if result[figure] > base[figure] * (1 + allowed[figure]) and result[figure] - base[figure] >= min_delta_ms:
+                regressions.append(f"{name}: {figure} {result[figure]} > baseline {base[figure]} "
+                                   f"(+{allowed[figure]:.0%})")
+        if result["rps"] < base["rps"] / (1 + allowed["rps"]):
+            regressions.append(f"{name}: rps {result['rps']} < baseline {base['rps']} (-{allowed['rps']:.0%})")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, Any]]):
+    print(f"{'scenario':<24}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for name, r in results.items():
+        print(f"{name:<24}{r['requests']:>9}{r['errors']:>8}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+              f"{r['p99_ms']:>10}{r['rps']:>10}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="KERAG Web benchmarks")
+    parser.add_argument("--kerag", choices=("stand-in", "real"), default="stand-in",
+                        help="Serve a synthetic knowledge base from the in-memory stand-in, or use real KERAG "
+                             "(KERAG_HOME / --kerag-home) (default: stand-in)")
+    parser.add_argument("--kerag-home", help="Knowledge base root for --kerag real")
+    parser.add_argument("--modules-list", help="Comma-separated modules to load (default: all available)")
+    parser.add_argument("--modules", type=int, default=4, help="Synthetic modules (default: 4)")
+    parser.add_argument("--depth", type=int, default=4, help="Synthetic tree depth (default: 4)")
+    parser.add_argument("--fanout", type=int, default=5, help="Synthetic children per section (default: 5)")
+    parser.add_argument("--words", type=int, default=80, help="Synthetic words per node (default: 80)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per scenario (default: 500)")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per scenario (default: 20)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent requests (default: 16)")
+    parser.add_argument("--load-cycles", type=int, default=5, help="Measured module loads (default: 5)")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE,
+                        help=f"Baseline file (default: {DEFAULT_BASELINE.name} next to this script)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--runs", type=int, default=1,
+                        help="Runs whose median is reported; with --save-baseline and at least "
+                             f"{MIN_SPREAD_RUNS}, also sets each figure's tolerance from their spread (default: 1)")
+    parser.add_argument("--tolerance", type=float,
+                        help="Allowed relative regression of every figure against the baseline, instead of the "
+                             "baseline's per-figure tolerances; saved with --save-baseline "
+                             f"(default: the baseline's, else {DEFAULT_TOLERANCE})")
+    parser.add_argument("--min-delta-ms", type=float,
+                        help="Ignore latency regressions smaller than this; saved with --save-baseline "
+                             f"(default: the baseline's, else {DEFAULT_MIN_DELTA_MS})")
+    parser.add_argument("--output", type=Path, help="Also write the results to this JSON file")
+    parser.add_argument("--snapshots", action="store_true", help="Enable the module snapshot cache")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's log output")
+    args = parser.parse_args(argv)
+
+    config = {"kerag": args.kerag, "concurrency": args.concurrency, "requests": args.requests,
+              "modules_list": args.modules_list, "seed": args.seed}
+    if args.kerag == "stand-in":
+        kb = SyntheticKB(modules=args.modules, depth=args.depth, fanout=args.fanout,
+                         words_per_node=args.words, seed=args.seed)
+        install_stand_in(kb)
+        config.update(modules=args.modules, depth=args.depth, fanout=args.fanout, words=args.words)
+    elif args.kerag_home:
+        os.environ["KERAG_HOME"] = args.kerag_home
+    os.environ["KERAG_SNAPSHOT_CACHE"] = "1" if args.snapshots else "0"
+
+    runs = []
+    for run in range(args.runs):
+        if args.runs > 1:
+            print(f"Run {run + 1} of {args.runs}")
+        runs.append(run_isolated(args) if args.runs > 1 else run_once(args))
+    results = median_results(runs) if len(runs) > 1 else runs[0]
+    if len(runs) > 1:
+        print(f"Median of {len(runs)} runs:")
+    print_table(results)
+    report = {"config": config, "results": results}
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+    failed = False
+    errors = {name: r["errors"] for name, r in results.items() if r["errors"]}
+    if errors:
+        print(f"Request errors: {errors}")
+        failed = True
+
+    if args.save_baseline:
+        report["tolerance"] = DEFAULT_TOLERANCE if args.tolerance is None else args.tolerance
+        report["min_delta_ms"] = DEFAULT_MIN_DELTA_MS if args.min_delta_ms is None else args.min_delta_ms
+        if args.tolerance is None and len(runs) >= MIN_SPREAD_RUNS:
+            report["tolerances"] = spread_tolerances(runs, results)
+        elif args.tolerance is None:
+            print(f"Record with --runs {MIN_SPREAD_RUNS} or more to set per-figure tolerances; "
+                  f"saving tolerance {report['tolerance']:.0%} for every figure")
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+    elif args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline.get("config") != config:
+            print(f"Baseline {args.baseline} was recorded with a different configuration; not compared")
+        else:
+            tolerance = baseline.get("tolerance", DEFAULT_TOLERANCE) if args.tolerance is None else args.tolerance
+            tolerances = baseline.get("tolerances", {}) if args.tolerance is None else {}
+            min_delta_ms = (baseline.get("min_delta_ms", DEFAULT_MIN_DELTA_MS) if args.min_delta_ms is None
+                            else args.min_delta_ms)
+            regressions = compare(results, baseline, tolerances, tolerance, min_delta_ms)
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+            if regressions:
+                failed = True
+            else:
+                allowed = "per-figure tolerances" if tolerances else f"tolerance {tolerance:.0%}"
+                print(f"No regressions against {args.baseline} ({allowed})")
+    else:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+    return 1 if failed else 0
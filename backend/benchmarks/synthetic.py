@@ -0,0 +1,281 @@
+"""Synthetic knowledge bases and an in-memory stand-in of ``KERAGAPI``.
+
+``SyntheticKB`` generates deterministic modules of configurable depth and
+fan-out. Words follow a Zipf-like distribution, so searches range from
+very common to rare terms. ``StandInKERAGAPI`` serves a ``SyntheticKB``
+through the subset of the ``KERAGAPI`` interface the backend uses, with
+the same response shapes (``success``/``data``/``error``/``metadata``).
+"""
+
+import random
+import re
+from typing import Any, Dict, List, Optional
+
+
+ROOT_ID = "::ROOT"
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "ze", "qu", "dr", "phi", "el", "an", "or"]
+
+
+def _ok(data: Any, **metadata) -> Dict[str, Any]:
+    return {"success": True, "data": data, "metadata": metadata}
+
+
+def _error(message: str) -> Dict[str, Any]:
+    return {"success": False, "data": None, "error": message, "metadata": {}}
+
+
+class SyntheticKB:
+    """Deterministic node trees: ``modules`` modules of ``fanout`` children per section down to ``depth``."""
+
+    def __init__(self, modules: int = 4, depth: int = 4, fanout: int = 5, words_per_node: int = 80,
+                 vocabulary: int = 2000, seed: int = 0):
+        self.depth = depth
+        self.fanout = fanout
+        self.words_per_node = words_per_node
+        rng = random.Random(seed)
+        self.words = self._vocabulary(rng, vocabulary)
+        # Zipf-like weights: the n-th word is 1/n as frequent as the first
+        self._weights = [1.0 / (rank + 1) for rank in range(len(self.words))]
+        self.modules: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for index in range(modules):
+            name = f"bench{index}"
+            self.modules[name] = self._module(rng, name)
+
+    @staticmethod
+    def _vocabulary(rng: random.Random, size: int) -> List[str]:
+        words: List[str] = []
+        seen = set()
+        while len(words) < size:
+            word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        return words
+
+    def _text(self, rng: random.Random, count: int) -> str:
+        return " ".join(rng.choices(self.words, weights=self._weights, k=count))
+
+    def _module(self, rng: random.Random, name: str) -> Dict[str, Dict[str, Any]]:
+        nodes: Dict[str, Dict[str, Any]] = {}
+
+        def add(node_id: str, parent_id: str, level: int, label: str, path: str):
+            node = {
+                "node_id": node_id,
+                "label": label,
+                "title": self._text(rng, 3).title(),
+                "type": "section" if level < self.depth else "content",
+                "module": name,
+                "content": self._text(rng, self.words_per_node),
+                "parent_id": parent_id,
+                "children_ids": [],
+                "path": path,
+            }
+            nodes[node_id] = node
+            if level >= self.depth:
+                return
+            for i in range(self.fanout):
+                child_label = f"s{i}"
+                relative = node_id.split("::", 1)[1]
+                child_id = f"{name}::{relative}/{child_label}" if relative else f"{name}::{child_label}"
+                # One file per top-level section
+                child_path = f"{name}/{child_label}.md" if level == 0 else path
+                node["children_ids"].append(child_id)
+                add(child_id, node_id, level + 1, child_label, child_path)
+
+        add(f"{name}::", ROOT_ID, 0, name, f"{name}/index.md")
+        return nodes
+
+    def node_count(self) -> int:
+        return sum(len(nodes) for nodes in self.modules.values())
+
+    def file_count(self, module: str) -> int:
+        return len({node["path"] for node in self.modules[module].values()})
+
+
+# The knowledge base served by StandInKERAGAPI instances created after configure()
+_knowledge_base: Optional[SyntheticKB] = None
+
+
+def configure(kb: SyntheticKB):
+    """Make ``kb`` the knowledge base of stand-in instances created from now on."""
+    global _knowledge_base
+    _knowledge_base = kb
+
+
+class StandInKERAGAPI:
+    """In-memory implementation of the ``KERAGAPI`` methods used by the backend."""
+
+    def __init__(self, local_root: Optional[str] = None, global_root: Optional[str] = None,
+                 lang: Optional[str] = None):
+        self.kb = _knowledge_base or SyntheticKB()
+        self.loaded: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.current = ROOT_ID
+        self.history = [ROOT_ID]
+        self.cursor = 0
+
+    # Modules
+
+    def get_all_modules(self):
+        modules = [
+            {"name": name, "loaded": name in self.loaded, "file_count": self.kb.file_count(name)}
+            for name in self.kb.modules
+        ]
+        return _ok({"modules": modules, "available_modules": list(self.kb.modules),
+                    "loaded_modules": list(self.loaded)})
+
+    def get_loaded_roots(self):
+        return _ok([dict(nodes[f"{name}::"], content=None) for name, nodes in self.loaded.items()])
+
+    def load_module(self, name: str):
+        if name not in self.kb.modules:
+            return _error(f"Module not found: {name}")
+        self.loaded[name] = self.kb.modules[name]
+        return _ok({"module": name, "node_count": len(self.loaded[name])})
+
+    def unload_module(self, name: str):
+        if name not in self.loaded:
+            return _error(f"Module not loaded: {name}")
+        del self.loaded[name]
+        return _ok({"module": name})
+
+    def purge(self):
+        self.loaded.clear()
+        return _ok({})
+
+    def get_status(self):
+        return _ok({"loaded_modules": list(self.loaded), "current": self.current})
+
+    # Nodes
+
+    def _node(self, node_id: str) -> Optional[Dict[str, Any]]:
+        if node_id == ROOT_ID:
+            return {"node_id": ROOT_ID, "label": "ROOT", "title": "ROOT", "type": "section", "module": None,
+                    "parent_id": None, "children_ids": [f"{name}::" for name in self.loaded], "content": ""}
+        module = node_id.split("::", 1)[0]
+        nodes = self.loaded.get(module)
+        return nodes.get(node_id) if nodes is not None else None
+
+    def _breadcrumb(self, node_id: str) -> List[Dict[str, str]]:
+        items = []
+        while node_id:
+            node = self._node(node_id)
+            if node is None:
+                break
+            items.append({"id": node_id, "label": node["label"]})
+            node_id = node["parent_id"]
+        return items[::-1]
+
+    def resolve_target_id(self, target: str):
+        if self._node(target) is not None:
+            return _ok({"node_id": target})
+        candidates = [node_id for nodes in self.loaded.values() for node_id in nodes
+                      if node_id.endswith("/" + target) or node_id.endswith("::" + target)]
+        if len(candidates) == 1:
+            return _ok({"node_id": candidates[0]})
+        if candidates:
+            return _ok({"candidates": candidates})
+        return _error(f"Cannot resolve target: {target}")
+
+    def get_node_view(self, node_id: str, depth: int = 1, include_content: bool = True,
+                      include_see_also: bool = True, format: str = "text", show_metadata: bool = False,
+                      display_mode: str = "none"):
+        node = self._node(node_id)
+        if node is None:
+            return _error(f"Node not found: {node_id}")
+        view = dict(node, has_children=bool(node["children_ids"]))
+        if not include_content:
+            view["content"] = None
+        lines = []
+
+        def render(current: Dict[str, Any], level: int):
+            lines.append(f"{'#' * min(level + 1, 6)} {current['title']}")
+            if include_content and current["content"]:
+                lines.append(current["content"])
+            if level < depth:
+                for child_id in current["children_ids"]:
+                    render(self._node(child_id), level + 1)
+
+        render(node, 0)
+        return _ok({"node": view, "formatted_content": {format: "\n\n".join(lines)}})
+
+    def get_children(self, node_id: str):
+        node = self._node(node_id)
+        if node is None:
+            return _error(f"Node not found: {node_id}")
+        return _ok(list(node["children_ids"]))
+
+    def preview_children(self, node_id: str, node_type: str = "all", sort_by: str = "order"):
+        node = self._node(node_id)
+        if node is None:
+            return _error(f"Node not found: {node_id}")
+        children = [self._node(child_id) for child_id in node["children_ids"]]
+        if node_type != "all":
+            children = [child for child in children if child["type"] == node_type]
+        if sort_by in ("title", "label"):
+            children.sort(key=lambda child: child[sort_by])
+        return _ok([
+            {"node_id": child["node_id"], "label": child["label"], "title": child["title"], "type": child["type"],
+             "has_children": bool(child["children_ids"]), "content_preview": child["content"][:100]}
+            for child in children
+        ])
+
+    # Navigation
+
+    def get_current_node(self):
+        return _ok(self._node(self.current), breadcrumb=self._breadcrumb(self.current))
+
+    def _go(self, node_id: str):
+        return _ok(self._node(node_id), breadcrumb=self._breadcrumb(node_id))
+
+    def navigate_to(self, target: str):
+        result = self.resolve_target_id(target)
+        if not result["success"] or "node_id" not in result["data"]:
+            return _error(f"Cannot navigate to: {target}")
+        node_id = result["data"]["node_id"]
+        if node_id != self.current:
+            self.history = self.history[:self.cursor + 1] + [node_id]
+            self.cursor += 1
+            self.current = node_id
+        return self._go(node_id)
+
+    def navigate_back(self, steps: int = 1):
+        self.cursor = max(0, self.cursor - steps)
+        self.current = self.history[self.cursor]
+        return self._go(self.current)
+
+    def navigate_forward(self, steps: int = 1):
+        self.cursor = min(len(self.history) - 1, self.cursor + steps)
+        self.current = self.history[self.cursor]
+        return self._go(self.current)
+
+    def up(self, levels: int = 1):
+        for _ in range(levels):
+            parent_id = self._node(self.current)["parent_id"]
+            if parent_id:
+                self.current = parent_id
+        return self._go(self.current)
+
+    def get_breadcrumb(self):
+        return _ok(self._breadcrumb(self.current))
+
+    def get_history(self):
+        return _ok({"items": self.history, "cursor": self.cursor, "size": len(self.history)})
+
+    # Search
+
+    def search(self, keyword: str, scope: str = "all", max_results: int = 50, whole_word: bool = False,
+               case_sensitive: bool = False, use_regex: bool = False):
+        pattern = keyword if use_regex else re.escape(keyword)
+        if whole_word:
+            pattern = rf"\b{pattern}\b"
+        matcher = re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+        fields = ("title", "label", "content") if scope == "all" else (scope,)
+        hits = []
+        for nodes in self.loaded.values():
+            for node in nodes.values():
+                if any(matcher.search(node[field] or "") for field in fields):
+                    hits.append({"node_id": node["node_id"], "label": node["label"], "title": node["title"],
+                                 "type": node["type"], "content_preview": node["content"][:100]})
+                    if len(hits) >= max_results:
+                        return _ok(hits, total=len(hits))
+        return _ok(hits, total=len(hits))
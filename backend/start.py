@@ -2,6 +2,7 @@
 """Backend startup script."""
 
 import uvicorn
+import importlib
 import os
 import sys
 import argparse
@@ -31,6 +32,58 @@ def main():
         help="Server port (default: KERAG_PORT env or 8001)"
     )
 
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Worker processes sharing one loaded knowledge base (default: KERAG_WORKERS env or 1)"
+    )
+    parser.add_argument(
+        "--preload",
+        help="Modules to load and warm up at startup: comma-separated names or a manifest file (default: KERAG_PRELOAD env)"
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["debug", "info", "warning", "error"],
+        help="Log level (default: KERAG_LOG_LEVEL env or info)"
+    )
+    parser.add_argument(
+        "--access-log-sample",
+        type=float,
+        help="Fraction of successful requests written to the access log; errors are always logged "
+             "(default: KERAG_ACCESS_LOG_SAMPLE env or 1.0)"
+    )
+    parser.add_argument(
+        "--no-watch",
+        action="store_true",
+        help="Do not reload modules when their files change (default: KERAG_WATCH env or on)"
+    )
+    parser.add_argument(
+        "--snapshot-cache",
+        action="store_true",
+        help="Cache the web-side mirror and indexes of each module on disk so restarts skip rebuilding "
+             "them; KERAG still parses every module (default: KERAG_SNAPSHOT_CACHE env or off)"
+    )
+    parser.add_argument(
+        "--profile-token",
+        help="Token enabling on-demand request profiling via the X-KERAG-Profile header or _profile "
+             "query parameter (default: KERAG_PROFILE_TOKEN env; unset disables it)"
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        help="Worker threads for KERAG navigation and content calls (default: KERAG_POOL_SIZE env or 8)"
+    )
+    parser.add_argument(
+        "--search-pool-size",
+        type=int,
+        help="Worker threads reserved for KERAG searches (default: KERAG_SEARCH_POOL_SIZE env or 2)"
+    )
+    parser.add_argument(
+        "--pool-queue-depth",
+        type=int,
+        help="Maximum queued KERAG calls per pool before requests get 503 (default: KERAG_POOL_QUEUE_DEPTH env or 64)"
+    )
+
     args = parser.parse_args()
 
     # Set default paths relative to this script
@@ -46,6 +99,26 @@ def main():
         os.environ["KERAG_LOCAL"] = args.local_root
     if args.lang:
         os.environ["KERAG_LANG"] = args.lang
+    if args.preload:
+        os.environ["KERAG_PRELOAD"] = args.preload
+    if args.log_level:
+        os.environ["KERAG_LOG_LEVEL"] = args.log_level
+    if args.access_log_sample is not None:
+        os.environ["KERAG_ACCESS_LOG_SAMPLE"] = str(args.access_log_sample)
+    if args.no_watch:
+        os.environ["KERAG_WATCH"] = "0"
+    if args.snapshot_cache:
+        os.environ["KERAG_SNAPSHOT_CACHE"] = "1"
+    if args.profile_token:
+        os.environ["KERAG_PROFILE_TOKEN"] = args.profile_token
+    log_level = os.getenv("KERAG_LOG_LEVEL", "info").lower()
+    shutdown_timeout = float(os.getenv("KERAG_SHUTDOWN_TIMEOUT", "5"))
+    if args.pool_size:
+        os.environ["KERAG_POOL_SIZE"] = str(args.pool_size)
+    if args.search_pool_size:
+        os.environ["KERAG_SEARCH_POOL_SIZE"] = str(args.search_pool_size)
+    if args.pool_queue_depth is not None:
+        os.environ["KERAG_POOL_QUEUE_DEPTH"] = str(args.pool_queue_depth)
 
     # Determine port from args, env, or default
     if args.port:
@@ -68,12 +141,26 @@ def main():
         sys.path.insert(0, str(backend_dir.parent))
         app_module = "app.main:app"
 
+    workers = args.workers or int(os.getenv("KERAG_WORKERS", "1"))
+    if workers > 1 and not hasattr(os, "fork"):
+        print("Multiple workers need os.fork(); starting a single worker")
+        workers = 1
+    if workers > 1:
+        print(f"Workers: {workers}")
+        cluster = importlib.import_module(app_module.split(":")[0].rsplit(".", 1)[0] + ".core.cluster")
+        cluster.serve(app_module, host="localhost", port=port, workers=workers, log_level=log_level,
+                      shutdown_timeout=shutdown_timeout)
+        return
+
     uvicorn.run(
         app_module,
         host="localhost",
         port=port,
         reload=False,  # Disable reload for production packaging
-        log_level="info"
+        log_level=log_level,
+        log_config=None,  # uvicorn's records go through the app's logging queue
+        access_log=False,  # the app writes its own (sampled) access log
+        timeout_graceful_shutdown=shutdown_timeout  # event streams never finish by themselves
     )
 
 if __name__ == "__main__":
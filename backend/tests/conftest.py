@@ -0,0 +1,60 @@
+"""Shared fixtures: the app served over the benchmark suite's in-memory stand-in of KERAG."""
+
+import os
+import time
+
+import pytest
+
+# Settings read at import time; set before the app is imported
+os.environ.setdefault("KERAG_WATCH", "0")
+os.environ.setdefault("KERAG_SNAPSHOT_CACHE", "0")
+os.environ.setdefault("KERAG_LOG_LEVEL", "WARNING")
+
+from benchmarks.run import install_stand_in  # noqa: E402
+from benchmarks.synthetic import SyntheticKB  # noqa: E402
+
+try:
+    # The installed KERAG, if any, for tests comparing with it before the stand-in takes its place
+    from kerag.api import KERAGAPI as REAL_KERAGAPI
+except ImportError:
+    REAL_KERAGAPI = None
+
+# Small enough to load in milliseconds; words repeat, so searches find several nodes
+KB = SyntheticKB(modules=3, depth=2, fanout=3, words_per_node=20, vocabulary=60, seed=1)
+install_stand_in(KB)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+READY_TIMEOUT = 30.0
+
+
+def wait_for_job(http: TestClient, response) -> dict:
+    """Poll a module job until it finishes and return its final state."""
+    job = response.json()["data"]
+    deadline = time.monotonic() + READY_TIMEOUT
+    while job["state"] in ("queued", "running"):
+        assert time.monotonic() < deadline, f"job {job['id']} did not finish"
+        time.sleep(0.01)
+        job = http.get(f"/api/modules/jobs/{job['id']}").json()["data"]
+    return job
+
+
+@pytest.fixture(scope="session")
+def http():
+    """Client of the started app, with every synthetic module loaded."""
+    with TestClient(app) as http:
+        deadline = time.monotonic() + READY_TIMEOUT
+        while http.get("/api/ready").status_code != 200:
+            assert time.monotonic() < deadline, "the app did not become ready"
+            time.sleep(0.02)
+        job = wait_for_job(http, http.post("/api/modules/load/bulk", params={"background": True},
+                                           json={"modules": list(KB.modules)}))
+        assert job["state"] == "done", job
+        yield http
+
+
+@pytest.fixture
+def kb() -> SyntheticKB:
+    return KB
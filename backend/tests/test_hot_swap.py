@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from app.core.corpus import corpus
+from app.core.kerag_client import KERAGClient, client
+from conftest import KB, wait_for_job
+
+SETTINGS = {"kerag_home": "", "kerag_local": "", "kerag_lang": ""}
+
+
+@pytest.fixture
+def reload_modules(http):
+    """Load the synthetic modules into whatever instance the test leaves behind."""
+    yield
+    job = wait_for_job(http, http.post("/api/modules/load/bulk", params={"background": True},
+                                       json={"modules": list(KB.modules)}))
+    assert job["state"] == "done", job
+
+
+def wait_for_switch(http, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        status = http.get("/api/settings/status").json()["data"]
+        if status["state"] in ("done", "failed"):
+            return status
+        assert time.monotonic() < deadline, status
+        time.sleep(0.01)
+
+
+def test_apply_answers_once_the_new_instance_serves(http, reload_modules):
+    old_api, generation = client.api, corpus.generation
+    result = http.post("/api/settings/apply", json=dict(SETTINGS, kerag_lang="en")).json()
+    assert result["success"]
+    assert result["data"]["kerag_lang"] == "en"
+    assert result["metadata"]["switch"]["state"] in ("draining", "done")
+    assert client.api is not old_api
+    assert corpus.generation > generation
+    assert http.get("/api/settings/").json()["data"]["kerag_lang"] == "en"
+    assert wait_for_switch(http)["state"] == "done"
+
+
+def test_background_apply_reports_progress(http, reload_modules):
+    result = http.post("/api/settings/apply", params={"background": True}, json=SETTINGS).json()
+    assert result["data"]["state"] in ("pending", "building", "warming", "swapping", "draining", "done")
+    status = wait_for_switch(http)
+    assert status["state"] == "done"
+    assert set(status["phase_seconds"]) >= {"building", "warming", "swapping", "draining"}
+    assert http.get("/api/settings/").json()["data"] == SETTINGS
+
+
+class LocalClient(KERAGClient):
+    """A client of its own rather than the app's singleton."""
+    _instance = None
+
+
+def test_calls_keep_the_instance_they_started_on():
+    local = LocalClient()
+    old, new = object(), object()
+    local._api = old
+    started, release = threading.Event(), threading.Event()
+    seen = []
+
+    def running_call():
+        with local._using(False) as api:
+            seen.append(api)
+            started.set()
+            release.wait()
+
+    thread = threading.Thread(target=running_call)
+    thread.start()
+    started.wait()
+    try:
+        assert local.swap(new) is old
+        assert local.inflight(old) == 1
+        with local._using(False) as api:
+            assert api is new
+    finally:
+        release.set()
+        thread.join()
+    assert seen == [old]
+    assert local.inflight(old) == 0
@@ -0,0 +1,47 @@
+from app.core.corpus import corpus
+from conftest import wait_for_job
+
+
+def test_load_and_unload_answer_when_done(http):
+    unloaded = http.delete("/api/modules/unload", params={"module_name": "bench2"})
+    assert unloaded.status_code == 200
+    assert unloaded.json()["success"]
+    assert "bench2" not in corpus.modules
+
+    loaded = http.post("/api/modules/load", params={"module_name": "bench2"}).json()
+    assert loaded["success"]
+    assert loaded["data"]["module"] == "bench2"
+    assert "bench2" in corpus.modules
+    assert "bench2" in http.get("/api/modules/").json()["data"]["loaded_modules"]
+
+
+def test_failed_loads_are_400(http):
+    response = http.post("/api/modules/load", params={"module_name": "missing"})
+    assert response.status_code == 400
+    assert "missing" in response.json()["detail"]
+
+
+def test_background_jobs_report_progress(http):
+    response = http.delete("/api/modules/unload", params={"module_name": "bench1", "background": True})
+    assert response.json()["data"]["state"] in ("queued", "running", "done")
+    assert wait_for_job(http, response)["state"] == "done"
+
+    response = http.post("/api/modules/load/bulk", params={"background": True},
+                         json={"modules": ["bench1", "missing", "bench1"]})
+    job = response.json()["data"]
+    assert job["modules"] == ["bench1", "missing"]
+    assert response.json()["metadata"]["job_id"] == job["id"]
+    job = wait_for_job(http, response)
+    assert job["state"] == "done"
+    assert job["modules"] == ["bench1", "missing"]
+    assert list(job["errors"]) == ["missing"]
+    assert job["progress"]["modules_done"] == 1
+    assert job["progress"]["nodes_built"] == len(corpus.modules["bench1"])
+    assert job["progress"]["files_parsed"] == job["progress"]["files_total"] > 0
+    assert job["elapsed"] >= 0
+    assert http.get(f"/api/modules/jobs/{job['id']}").json()["data"]["state"] == "done"
+    assert http.get("/api/modules/jobs").json()["data"][0]["id"] == job["id"]
+
+
+def test_unknown_jobs_are_404(http):
+    assert http.get("/api/modules/jobs/nothing").status_code == 404
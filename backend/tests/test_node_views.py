@@ -0,0 +1,88 @@
+import pytest
+
+from app.api.routes import nodes
+from app.core.corpus import corpus
+from app.core.node_views import etag_matches, view_cache
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Node IDs rendered through KERAG (cache misses) during the test."""
+    rendered = []
+
+    def counting(api, key):
+        rendered.append(key[0])
+        return render(api, key)
+
+    render = nodes.render_view
+    monkeypatch.setattr(nodes, "render_view", counting)
+    view_cache.clear()
+    return rendered
+
+
+def detail(http, headers=None, **params):
+    return http.get("/api/nodes/detail", params=dict({"node_id": "bench0::s1", "format": "json"}, **params),
+                    headers=headers)
+
+
+def test_repeat_fetches_revalidate_with_304(http, renders):
+    first = detail(http)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.json()["data"]["node"]["node_id"] == "bench0::s1"
+
+    again = detail(http, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+    assert detail(http, headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert detail(http, headers={"If-None-Match": '"other"'}).status_code == 200
+    assert renders == ["bench0::s1"]
+
+
+def test_compressed_views_keep_their_etag(http, renders):
+    gzip = {"Accept-Encoding": "gzip"}
+    plain = detail(http, headers={"Accept-Encoding": "identity"}, node_id="bench0::", depth=2)
+    compressed = detail(http, headers=gzip, node_id="bench0::", depth=2)
+    assert "content-encoding" not in plain.headers
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.content == plain.content
+    assert compressed.headers["etag"] == plain.headers["etag"]
+
+    again = detail(http, headers={**gzip, "If-None-Match": plain.headers["etag"]}, node_id="bench0::", depth=2)
+    assert again.status_code == 304
+    assert again.headers["etag"] == plain.headers["etag"]
+    assert "Accept-Encoding" in again.headers["vary"]
+    assert renders == ["bench0::"]
+
+
+def test_every_rendering_option_has_its_own_entry(http, renders):
+    etags = {detail(http, **options).headers["etag"] for options in (
+        {}, {"depth": 0}, {"format": "markdown"}, {"include_content": False}, {"show_metadata": True},
+        {"display_mode": "label"}, {"include_see_also": False})}
+    assert len(renders) == 7
+    # Views that render differently are told apart by their ETag
+    assert len(etags) > 1
+
+
+def test_reloading_a_module_invalidates_only_its_views(http, renders, monkeypatch):
+    detail(http)
+    detail(http, node_id="bench1::s1")
+    tree = corpus.modules["bench0"]
+    monkeypatch.setattr(tree, "generation", tree.generation + 1000)
+    detail(http)
+    detail(http, node_id="bench1::s1")
+    assert renders == ["bench0::s1", "bench1::s1", "bench0::s1"]
+
+
+def test_unknown_nodes_are_404(http, renders):
+    assert detail(http, node_id="bench0::nowhere").status_code == 404
+
+
+def test_etag_matches():
+    assert etag_matches('"a"', '"a"')
+    assert etag_matches('W/"a"', '"a"')
+    assert etag_matches('"b", "a"', '"a"')
+    assert etag_matches("*", '"a"')
+    assert not etag_matches('"b"', '"a"')
+    assert not etag_matches(None, '"a"')
@@ -0,0 +1,24 @@
+import logging
+
+from app.core.startup import startup
+
+
+def access_levels(caplog, path):
+    return [record.levelno for record in caplog.records
+            if record.name == "kerag_web.access" and f" {path} " in record.getMessage()]
+
+
+def test_not_ready_is_logged_as_info(http, caplog, monkeypatch):
+    caplog.set_level(logging.INFO, logger="kerag_web.access")
+    monkeypatch.setattr(startup, "ready", False)
+    response = http.get("/api/ready")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+    assert access_levels(caplog, "/api/ready") == [logging.INFO]
+
+
+def test_other_errors_keep_their_level(http, caplog):
+    caplog.set_level(logging.INFO, logger="kerag_web.access")
+    assert http.get("/api/ready").status_code == 200
+    assert http.get("/api/modules/jobs/nothing").status_code == 404
+    assert access_levels(caplog, "/api/modules/jobs/nothing") == [logging.WARNING]
@@ -0,0 +1,68 @@
+import re
+import time
+
+import pytest
+
+from app.core import search_index
+from app.core.corpus import CorpusSnapshot, ModuleTree, NodeRecord
+from app.core.regex_sandbox import RegexSandbox, SearchBudget
+
+
+def tree_of(*texts):
+    records = [NodeRecord(node_id=f"m::n{i}", module="m", label="", title="", type="content", content=text,
+                          parent_id="m::", children=()) for i, text in enumerate(texts)]
+    return ModuleTree("m", records)
+
+
+@pytest.fixture
+def sandbox():
+    sandbox = RegexSandbox(spare_workers=1)
+    yield sandbox
+    sandbox.shutdown()
+
+
+def run(sandbox, trees, pattern, limit=None, timeout=10.0):
+    budget = SearchBudget(timeout)
+    work = [(i, list(range(len(tree)))) for i, tree in enumerate(trees)]
+    found = list(sandbox.matches(1, trees, re.compile(pattern), ["content"], work, limit, budget))
+    return [(tree, position) for tree, position, _ in found], budget
+
+
+def test_matches_are_found_and_the_worker_is_reused(sandbox):
+    trees = [tree_of("alpha", "beta", "alphabet")]
+    assert run(sandbox, trees, "alpha")[0] == [(0, 0), (0, 2)]
+    assert run(sandbox, trees, "alpha", limit=1)[0] == [(0, 0)]
+    assert sandbox.stats()["loads"] == 1
+
+
+def test_a_catastrophic_pattern_is_cut_off_at_the_budget(sandbox):
+    trees = [tree_of("a" * 40, "a" * 40 + "b")]
+    run(sandbox, trees, "a")  # Load a worker before timing
+    started = time.monotonic()
+    found, budget = run(sandbox, trees, "(a+)+$x", timeout=0.5)
+    assert budget.truncated
+    assert found == []
+    assert time.monotonic() - started < 2.0
+    assert sandbox.stats()["timeouts"] == 1
+    # The killed worker is replaced and the next query is answered
+    assert run(sandbox, trees, "b$")[0] == [(0, 1)]
+
+
+def test_closing_a_scan_closes_its_sandbox_generator(monkeypatch):
+    closed = []
+
+    def matches(*args):
+        try:
+            yield 0, 0, {"content": [(0, 1)]}
+            yield 0, 1, {"content": [(0, 1)]}
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(search_index.regex_sandbox, "matches", matches)
+    tree = tree_of("aa", "ab")
+    tree.build_indexes()
+    hits = search_index.iter_matches(CorpusSnapshot(-1, {"m": tree}), re.compile("a"), "a",
+                                     scope="content", use_regex=True, budget=SearchBudget())
+    next(hits)
+    hits.close()
+    assert closed == [True]
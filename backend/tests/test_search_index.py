@@ -0,0 +1,52 @@
+import re
+
+import pytest
+
+from app.core.corpus import CorpusSnapshot, ModuleTree, NodeRecord
+from app.core.search_index import fold_case, search_corpus, trigrams
+
+
+def snapshot_of(*texts):
+    records = [NodeRecord(node_id=f"m::n{i}", module="m", label=f"n{i}", title="", type="content", content=text,
+                          parent_id="m::", children=()) for i, text in enumerate(texts)]
+    tree = ModuleTree("m", records)
+    tree.build_indexes()
+    return CorpusSnapshot(-1, {"m": tree})
+
+
+def test_fold_case_agrees_with_re_ignorecase():
+    # Every character re.IGNORECASE takes for another must fold to the same character
+    for code in range(0x10000):
+        char = chr(code)
+        if 0xD800 <= code < 0xE000:
+            continue
+        pattern = re.compile(re.escape(char), re.IGNORECASE)
+        for other in {char.lower(), char.upper(), char.casefold(), char.title(), fold_case(char)}:
+            if len(other) == 1 and pattern.fullmatch(other):
+                assert fold_case(char) == fold_case(other), (char, other)
+        assert len(fold_case(char)) == 1
+
+
+@pytest.mark.parametrize("text,query", [
+    ("ΟΔΥΣΣΕΥΣ", "οδυσσευς"),
+    ("Strasse ſtraße", "STRASSE"),
+    ("Kelvin", "kelvin"),
+    ("İstanbul", "istanbul"),
+    ("ıgloo", "IGLOO"),
+    ("5 µsec", "ΜSEC"),
+])
+def test_case_insensitive_queries_find_non_ascii_text(text, query):
+    assert trigrams(query) & trigrams(text)
+    result = search_corpus(snapshot_of("unrelated", text), query)
+    assert [item["node_id"] for item in result["data"]] == ["m::n1"]
+
+
+def test_case_sensitive_queries_are_verified_after_the_prefilter():
+    snapshot = snapshot_of("Alpha beta", "alpha Beta")
+    result = search_corpus(snapshot, "Alpha", case_sensitive=True)
+    assert [item["node_id"] for item in result["data"]] == ["m::n0"]
+
+
+def test_literals_without_trigrams_scan_every_node():
+    result = search_corpus(snapshot_of("ab", "xy", "zab"), "ab")
+    assert [item["node_id"] for item in result["data"]] == ["m::n0", "m::n2"]
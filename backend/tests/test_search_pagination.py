@@ -0,0 +1,60 @@
+import json
+
+from app.core.corpus import corpus
+
+
+def page_through(http, **params):
+    items, cursor, pages = [], None, 0
+    while True:
+        page = http.get("/api/search/", params=dict(params, cursor=cursor) if cursor else params).json()
+        assert page["success"], page
+        items += [item["node_id"] for item in page["data"]]
+        pages += 1
+        cursor = page["metadata"]["next_cursor"]
+        if cursor is None:
+            return items, pages
+
+
+def test_pages_add_up_to_the_full_result(http):
+    full = [item["node_id"] for item in http.get("/api/search/", params={"q": "e", "max_results": 1000}).json()["data"]]
+    assert len(full) > 10
+    items, pages = page_through(http, q="e", page_size=4)
+    assert items == full
+    assert pages == -(-len(full) // 4)
+
+
+def test_ranked_pages_add_up_to_the_ranked_result(http):
+    params = {"q": "quan", "rank": "bm25"}
+    full = [item["node_id"] for item in http.get("/api/search/", params=dict(params, max_results=1000)).json()["data"]]
+    items, _ = page_through(http, page_size=3, **params)
+    assert items == full
+
+
+def test_bad_and_expired_cursors_are_rejected(http, monkeypatch):
+    assert http.get("/api/search/", params={"q": "e", "cursor": "not-a-cursor"}).status_code == 400
+    cursor = http.get("/api/search/", params={"q": "e", "page_size": 2}).json()["metadata"]["next_cursor"]
+    monkeypatch.setattr(corpus, "_snapshot", corpus.snapshot()._replace(generation=corpus.generation + 1000))
+    response = http.get("/api/search/", params={"q": "e", "cursor": cursor})
+    assert response.status_code == 400
+    assert "expired" in response.json()["detail"]
+
+
+def test_paging_waits_for_the_index(http, monkeypatch):
+    monkeypatch.setattr(corpus, "ready", False)
+    for params in ({"q": "e", "page_size": 5}, {"q": "e", "cursor": "abc"}):
+        response = http.get("/api/search/", params=params)
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+    # Unpaginated searches are answered by KERAG meanwhile
+    response = http.get("/api/search/", params={"q": "e"})
+    assert response.status_code == 200
+    assert response.json()["data"]
+
+
+def test_stream_yields_every_match_then_an_end_event(http):
+    full = [item["node_id"] for item in http.get("/api/search/", params={"q": "e", "max_results": 1000}).json()["data"]]
+    lines = [json.loads(line) for line in http.get("/api/search/stream", params={"q": "e"}).text.splitlines()]
+    assert [line["data"]["node_id"] for line in lines[:-1]] == full
+    assert lines[-1]["event"] == "end"
+    assert lines[-1]["metadata"]["count"] == len(full)
+    assert lines[-1]["metadata"]["complete"] is True
@@ -0,0 +1,54 @@
+"""The indexed search returns what ``KERAGAPI.search`` returns, for every option combination."""
+
+import itertools
+import os
+
+import pytest
+
+from app.core.corpus import CorpusSnapshot, build_module_tree, loaded_module_roots
+from app.core.kerag_client import client
+from app.core.search_index import search_corpus
+from conftest import REAL_KERAGAPI
+
+LITERALS = ["quan", "Rulo", "ulo", "ulo vi", "s1", "S1", "e", "zz"]
+REGEXES = ["qu[a-z]+", "ru(lo|ka)", "^Rulo", "lo|an", "k.e", r"\bvi", "s[0-9]$", "(ka)?or"]
+OPTIONS = list(itertools.product(["all", "title", "label", "content"], [False, True], [False, True]))
+# Fields every search hit carries in both implementations
+FIELDS = ("node_id", "label", "title", "type")
+
+
+def hits(result):
+    assert result["success"], result
+    return [tuple(item.get(field) for field in FIELDS) for item in result["data"]]
+
+
+def check_parity(api, search, use_regex):
+    for keyword in REGEXES if use_regex else LITERALS:
+        for scope, whole_word, case_sensitive in OPTIONS:
+            options = dict(keyword=keyword, scope=scope, max_results=1000, whole_word=whole_word,
+                           case_sensitive=case_sensitive, use_regex=use_regex)
+            assert hits(search(**options)) == hits(api.search(**options)), options
+
+
+@pytest.mark.parametrize("use_regex", [False, True])
+def test_search_matches_kerag(http, use_regex):
+    def search(keyword, **options):
+        params = dict(options, q=keyword)
+        response = http.get("/api/search/", params=params)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    check_parity(client.api, search, use_regex)
+
+
+@pytest.mark.skipif(REAL_KERAGAPI is None or not os.getenv("KERAG_PARITY_HOME"),
+                    reason="set KERAG_PARITY_HOME to a knowledge base to compare with the installed KERAG")
+@pytest.mark.parametrize("use_regex", [False, True])
+def test_search_matches_installed_kerag(use_regex):
+    api = REAL_KERAGAPI(None, os.environ["KERAG_PARITY_HOME"], None)
+    for module in api.get_all_modules()["data"]["available_modules"]:
+        api.load_module(module)
+    modules = {name: build_module_tree(api, name, root_ids) for name, root_ids in loaded_module_roots(api).items()}
+    # A generation the app's corpus never reaches, so the regex sandbox loads this text
+    snapshot = CorpusSnapshot(-1, modules)
+    check_parity(api, lambda **options: search_corpus(snapshot, **options), use_regex)
@@ -0,0 +1,56 @@
+from app.core.jobs import jobs
+from app.core.sessions import ROOT_ID, SESSION_HEADER
+
+
+def session_headers(http):
+    """Headers of a brand-new navigation session."""
+    http.cookies.clear()
+    session_id = http.get("/api/nodes/history").headers[SESSION_HEADER]
+    http.cookies.clear()
+    return {SESSION_HEADER: session_id}
+
+
+def test_new_sessions_start_at_the_root(http):
+    headers = session_headers(http)
+    current = http.get("/api/nodes/current", headers=headers).json()
+    assert current["data"]["node_id"] == ROOT_ID
+    assert http.get("/api/nodes/history", headers=headers).json()["data"] == {
+        "items": [ROOT_ID], "cursor": 0, "size": 1}
+
+
+def test_sessions_keep_their_own_cursor_and_history(http):
+    first, second = session_headers(http), session_headers(http)
+    assert http.post("/api/nodes/navigate", params={"target": "bench0::s0"}, headers=first).status_code == 200
+    assert http.post("/api/nodes/navigate", params={"target": "bench0::s0/s1"}, headers=first).status_code == 200
+    assert http.post("/api/nodes/navigate", params={"target": "bench1::s2"}, headers=second).status_code == 200
+
+    assert http.get("/api/nodes/current", headers=first).json()["data"]["node_id"] == "bench0::s0/s1"
+    assert http.get("/api/nodes/current", headers=second).json()["data"]["node_id"] == "bench1::s2"
+    history = http.get("/api/nodes/history", headers=first).json()["data"]
+    assert history == {"items": [ROOT_ID, "bench0::s0", "bench0::s0/s1"], "cursor": 2, "size": 3}
+
+    back = http.post("/api/nodes/back", headers=first).json()
+    assert back["data"]["node_id"] == "bench0::s0"
+    assert http.get("/api/nodes/current", headers=second).json()["data"]["node_id"] == "bench1::s2"
+    forward = http.post("/api/nodes/forward", headers=first).json()
+    assert forward["data"]["node_id"] == "bench0::s0/s1"
+
+    breadcrumb = http.get("/api/nodes/breadcrumb", headers=first).json()["data"]
+    assert [item["id"] for item in breadcrumb] == [ROOT_ID, "bench0::", "bench0::s0", "bench0::s0/s1"]
+    up = http.post("/api/nodes/up", headers=second).json()
+    assert up["data"]["node_id"] == "bench1::"
+
+
+def test_navigate_resolves_shorthand_without_moving_other_sessions(http):
+    headers, other = session_headers(http), session_headers(http)
+    result = http.post("/api/nodes/navigate", params={"target": "bench2::s1/s2"}, headers=headers).json()
+    assert result["data"]["node_id"] == "bench2::s1/s2"
+    assert http.get("/api/nodes/current", headers=other).json()["data"]["node_id"] == ROOT_ID
+
+
+def test_navigate_into_an_unloaded_module_does_not_load_it(http):
+    submitted = len(jobs.recent())
+    response = http.post("/api/nodes/navigate", params={"target": "elsewhere::s0"}, headers=session_headers(http))
+    assert response.status_code == 404
+    assert "Module not loaded: elsewhere" in response.json()["detail"]
+    assert len(jobs.recent()) == submitted
@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+from app.core import snapshots
+from app.core.corpus import ModuleTree, NodeRecord, corpus
+from app.core.snapshots import LazyIndexes, SnapshotStore, configure_snapshots
+
+
+@pytest.fixture
+def sources(tmp_path):
+    """Two source files of a small module, in their own directory."""
+    directory = tmp_path / "kb"
+    directory.mkdir()
+    for name, text in (("index.md", "# Guide\nfirst"), ("intro.md", "# Intro\nsecond")):
+        (directory / name).write_text(text)
+    return directory
+
+
+def make_tree(sources) -> ModuleTree:
+    index, intro = str(sources / "index.md"), str(sources / "intro.md")
+    records = [
+        NodeRecord("guide::", "guide", "guide", "Guide", "section", "first words", None, ("guide::intro",), index),
+        NodeRecord("guide::intro", "guide", "intro", "Intro", "content", "second wörds", "guide::", (), intro),
+    ]
+    tree = ModuleTree("guide", records)
+    tree.build_indexes()
+    return tree
+
+
+@pytest.fixture
+def store(http, tmp_path):
+    # path_for keys snapshots by the client's knowledge base settings, set up with the app
+    return SnapshotStore(str(tmp_path / "snapshots"))
+
+
+def test_snapshot_round_trip(store, sources):
+    tree = make_tree(sources)
+    store.save(tree, ["guide::"])
+    mapped = store.load("guide", ["guide::"])
+
+    assert mapped is not None and mapped.snapshot == store.path_for("guide", ["guide::"])
+    assert list(mapped.records) == list(tree.records)
+    assert mapped.get("guide::intro") == tree.records[1]
+    assert isinstance(mapped.indexes, LazyIndexes)
+    for name, index in tree.indexes.items():
+        if hasattr(index, "dump"):
+            assert not mapped.indexes.loaded(name)
+            assert type(mapped.indexes[name]) is type(index)
+
+    trigram, restored = tree.indexes["trigram"], mapped.indexes["trigram"]
+    for scope, postings in trigram.postings.items():
+        assert postings and all(restored.postings[scope].get(gram) == list(positions)
+                                for gram, positions in postings.items())
+    assert (store.saves, store.hits, store.misses) == (1, 1, 0)
+
+
+def test_touched_sources_with_the_same_content_stay_fresh(store, sources):
+    store.save(make_tree(sources), ["guide::"])
+    stat = os.stat(sources / "intro.md")
+    os.utime(sources / "intro.md", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert store.load("guide", ["guide::"]) is not None
+
+
+@pytest.mark.parametrize("change", ["content", "size", "new file", "removed file"])
+def test_changed_sources_invalidate_the_snapshot(store, sources, change):
+    store.save(make_tree(sources), ["guide::"])
+    intro = sources / "intro.md"
+    stat = os.stat(intro)
+    if change == "content":
+        intro.write_text("# Intro\nSECOND")
+        os.utime(intro, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    elif change == "size":
+        intro.write_text("# Intro\nsecond, longer")
+    elif change == "new file":
+        (sources / "outro.md").write_text("# Outro")
+    else:
+        intro.unlink()
+
+    assert store.load("guide", ["guide::"]) is None
+    assert (store.stale, store.misses) == (1, 1)
+
+
+def test_snapshots_of_other_formats_or_roots_are_ignored(store, sources, monkeypatch):
+    store.save(make_tree(sources), ["guide::"])
+    assert store.load("guide", ["guide::", "guide::appendix"]) is None
+
+    monkeypatch.setattr(snapshots, "FORMAT_VERSION", snapshots.FORMAT_VERSION + 1)
+    path = store.path_for("guide", ["guide::"])
+    assert store.load("guide", ["guide::"]) is None
+    assert os.path.exists(path) and store.stale == 0
+
+    with open(path, "r+b") as f:
+        f.write(b"NOTASNAP")
+    monkeypatch.undo()
+    assert store.load("guide", ["guide::"]) is None
+    assert store.misses == 3
+
+
+def test_modules_without_source_files_are_not_saved(store, sources):
+    tree = make_tree(sources)
+    for record in tree.records:
+        record.path = None
+    store.save(tree, ["guide::"])
+    assert store.saves == 0 and not os.path.exists(store.directory)
+
+
+def test_configure_snapshots_sets_the_corpus_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(corpus, "store", None)
+    store = configure_snapshots(True, str(tmp_path))
+    assert corpus.store is store and store.directory == str(tmp_path)
+    assert configure_snapshots(False) is None and corpus.store is None
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.worker_pool import PoolSaturatedError, WorkerPool, pools
+
+
+def test_pool_rejects_work_beyond_its_queue_depth():
+    pool = WorkerPool("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run(release.wait))
+        while not pool.stats()["running"]:
+            await asyncio.sleep(0.001)
+        queued = asyncio.ensure_future(pool.run(lambda: "queued"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(lambda: "rejected")
+        release.set()
+        return await running, await queued
+
+    try:
+        assert asyncio.run(scenario()) == (True, "queued")
+        stats = pool.stats()
+        assert stats["rejected"] == 1
+        assert stats["completed"] == 2
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_saturated_pool_answers_503(http, monkeypatch):
+    saturated = WorkerPool("default", max_workers=1, max_queue=1)
+    saturated._queued = saturated.max_queue
+    monkeypatch.setitem(pools._pools, "default", saturated)
+
+    response = http.get("/api/modules/")
+    assert response.status_code == 503
+    assert "saturated" in response.json()["detail"]
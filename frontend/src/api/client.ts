@@ -6,9 +6,16 @@ import type {
   NodeView,
   BreadcrumbItem,
   SearchResult,
-  NodeInfo
+  Suggestion,
+  NodeInfo,
+  ModuleSkeleton,
+  ModuleJob,
+  SettingsSwitch,
+  ServerEvent
 } from '@/types';
 
+const JOB_POLL_MS = 300;
+
 class APIClient {
   private client: AxiosInstance;
 
@@ -29,20 +36,48 @@ class APIClient {
     return response.data;
   }
 
-  async loadModule(name: string): Promise<BaseResponse<any>> {
+  async loadModule(name: string): Promise<BaseResponse<ModuleJob>> {
     const response = await this.client.post('/modules/load', null, {
-      params: { module_name: name }
+      params: { module_name: name, background: true }
     });
-    return response.data;
+    return this.waitForJob(response.data);
+  }
+
+  async loadModulesBulk(names: string[]): Promise<BaseResponse<ModuleJob>> {
+    const response = await this.client.post('/modules/load/bulk', { modules: names }, {
+      params: { background: true }
+    });
+    return this.waitForJob(response.data);
   }
 
-  async unloadModule(name: string): Promise<BaseResponse<any>> {
+  async unloadModule(name: string): Promise<BaseResponse<ModuleJob>> {
     const response = await this.client.delete('/modules/unload', {
-      params: { module_name: name }
+      params: { module_name: name, background: true }
     });
+    return this.waitForJob(response.data);
+  }
+
+  async getModuleJob(id: string): Promise<BaseResponse<ModuleJob>> {
+    const response = await this.client.get(`/modules/jobs/${id}`);
     return response.data;
   }
 
+  // Load/unload are started as background jobs; poll until the job finishes
+  private async waitForJob(response: BaseResponse<ModuleJob>): Promise<BaseResponse<ModuleJob>> {
+    let job = response.data;
+    while (job.state === 'queued' || job.state === 'running') {
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_MS));
+      job = (await this.getModuleJob(job.id)).data;
+    }
+    const errors = Object.values(job.errors);
+    return {
+      success: job.state === 'done',
+      data: job,
+      error: errors.length ? errors.join('; ') : undefined,
+      metadata: response.metadata
+    };
+  }
+
   async purgeModules(): Promise<BaseResponse<any>> {
     const response = await this.client.post('/modules/purge');
     return response.data;
@@ -53,6 +88,13 @@ class APIClient {
     return response.data;
   }
 
+  async getModuleSkeleton(name: string, depth: number = 64): Promise<BaseResponse<ModuleSkeleton>> {
+    const response = await this.client.get('/modules/skeleton', {
+      params: { module_name: name, depth }
+    });
+    return response.data;
+  }
+
   // Nodes
   async getCurrentNode(): Promise<BaseResponse<NodeDetail>> {
     const response = await this.client.get('/nodes/current/');
@@ -92,6 +134,28 @@ class APIClient {
     return response.data;
   }
 
+  // Resolves several targets (e.g. every link of a page) in one request
+  async resolveNodeIds(targets: string[]): Promise<BaseResponse<Array<{
+    target: string;
+    success: boolean;
+    data: { node_id?: string, candidates?: string[] } | null;
+    error?: string;
+  }>>> {
+    const response = await this.client.post('/nodes/resolve/batch', { targets });
+    return response.data;
+  }
+
+  // Breadcrumbs and depths of several nodes (null for unknown ones)
+  async getAncestry(nodeIds: string[], ancestor?: string): Promise<BaseResponse<Array<{
+    node_id: string;
+    breadcrumb: BreadcrumbItem[];
+    depth: number;
+    is_ancestor?: boolean;
+  } | null>>> {
+    const response = await this.client.post('/nodes/ancestry/batch', { node_ids: nodeIds, ancestor });
+    return response.data;
+  }
+
   async getNodeDetail(
     id: string,
     depth: number = 1,
@@ -136,6 +200,21 @@ class APIClient {
     return response.data;
   }
 
+  async batchNodes(items: Array<{
+    node_id: string;
+    op: 'children' | 'preview_children' | 'detail';
+    [option: string]: any;
+  }>): Promise<BaseResponse<Array<{
+    node_id: string;
+    op: string;
+    success: boolean;
+    data: any;
+    error?: string;
+  }>>> {
+    const response = await this.client.post('/nodes/batch', { items });
+    return response.data;
+  }
+
   // Search
   async search(
     q: string,
@@ -143,7 +222,8 @@ class APIClient {
     maxResults: number = 50,
     wholeWord: boolean = false,
     caseSensitive: boolean = false,
-    useRegex: boolean = false
+    useRegex: boolean = false,
+    rank: 'none' | 'bm25' = 'none'
   ): Promise<BaseResponse<SearchResult[]>> {
     const response = await this.client.get('/search', {
       params: {
@@ -152,12 +232,77 @@ class APIClient {
         max_results: maxResults,
         whole_word: wholeWord,
         case_sensitive: caseSensitive,
-        use_regex: useRegex
+        use_regex: useRegex,
+        rank
       }
     });
     return response.data;
   }
 
+  // Type-ahead completions of titles, labels and node IDs
+  async suggest(q: string, limit: number = 10, fuzzy: boolean = false): Promise<BaseResponse<Suggestion[]>> {
+    const response = await this.client.get('/search/suggest', { params: { q, limit, fuzzy } });
+    return response.data;
+  }
+
+  // Streams matches as they are found; abort the signal to cancel the scan
+  async streamSearch(
+    q: string,
+    onResult: (result: SearchResult) => void,
+    options: {
+      scope?: 'all' | 'content' | 'title' | 'label';
+      maxResults?: number;
+      wholeWord?: boolean;
+      caseSensitive?: boolean;
+      useRegex?: boolean;
+      signal?: AbortSignal;
+    } = {}
+  ): Promise<Record<string, any>> {
+    const params = new URLSearchParams({
+      q,
+      scope: options.scope || 'all',
+      max_results: String(options.maxResults || 1000),
+      whole_word: String(!!options.wholeWord),
+      case_sensitive: String(!!options.caseSensitive),
+      use_regex: String(!!options.useRegex)
+    });
+    const baseURL = import.meta.env.VITE_API_BASE_URL || '/api';
+    const response = await fetch(`${baseURL}/search/stream?${params}`, { signal: options.signal });
+    if (!response.ok || !response.body) {
+      throw new Error(`Search failed: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let metadata: Record<string, any> = {};
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop() || '';
+      for (const line of lines) {
+        if (!line) continue;
+        const event = JSON.parse(line);
+        if (event.event === 'result') onResult(event.data);
+        else if (event.event === 'end') metadata = event.metadata;
+        else if (event.event === 'error') throw new Error(event.error);
+      }
+    }
+    return metadata;
+  }
+
+  // Change events (Server-Sent Events); returns a function closing the stream
+  subscribeEvents(onEvent: (event: ServerEvent) => void): () => void {
+    const baseURL = import.meta.env.VITE_API_BASE_URL || '/api';
+    const source = new EventSource(`${baseURL}/events`);
+    for (const type of ['corpus', 'reloading', 'reload_failed']) {
+      source.addEventListener(type, (message) => onEvent(JSON.parse((message as MessageEvent).data)));
+    }
+    return () => source.close();
+  }
+
   // Status
   async getStatus(): Promise<BaseResponse<any>> {
     const response = await this.client.get('/status');
@@ -187,7 +332,15 @@ class APIClient {
     kerag_local: string
     kerag_lang: string
   }): Promise<BaseResponse<any>> {
-    const response = await this.client.post('/settings/apply', settings)
+    // Returns at once; the store polls getSettingsStatus until the switch is done
+    const response = await this.client.post('/settings/apply', settings, {
+      params: { background: true }
+    })
+    return response.data
+  }
+
+  async getSettingsStatus(): Promise<BaseResponse<SettingsSwitch | null>> {
+    const response = await this.client.get('/settings/status')
     return response.data
   }
 }
@@ -1,17 +1,25 @@
 import { defineStore } from 'pinia';
 import type {
   AppState,
+  CorpusEvent,
   NodeDetail,
   NodeInfo,
+  ServerEvent,
 } from '@/types';
 import { api } from '@/api/client';
 
+// Open /api/events stream (one per page)
+let closeEvents: (() => void) | null = null;
+
 // Extended state
 interface ExtendedAppState extends AppState {
   moduleRoots: Record<string, NodeDetail | NodeDetail[]>;
   nodeChildren: Record<string, string[]>; // IDs
   nodeChildrenInfo: Record<string, NodeInfo[]>; // Detailed objects for tree rendering
   nodeCache: Record<string, { node: NodeDetail, breadcrumb: any[] }>;
+  moduleGenerations: Record<string, number> | null; // From the last corpus event
+  resolvedTargets: Record<string, string>; // Link target -> full node ID
+  searchPaths: Record<string, string>; // Search result -> ancestor labels
 }
 
 export const useAppStore = defineStore('app', {
@@ -50,16 +58,57 @@ export const useAppStore = defineStore('app', {
     moduleRoots: {},
     nodeChildren: {},
     nodeChildrenInfo: {},
-    nodeCache: {}
+    nodeCache: {},
+    moduleGenerations: null,
+    resolvedTargets: {},
+    searchPaths: {}
   }),
 
   actions: {
     // Initialize app
     async initialize() {
+      this.subscribeToChanges();
       await this.loadModules();
       await this.loadCurrentNode();
     },
 
+    // Follow server-side module changes instead of polling for them
+    subscribeToChanges() {
+      if (closeEvents) return;
+      closeEvents = api.subscribeEvents((event: ServerEvent) => {
+        if (event.type === 'corpus') {
+          this.onCorpusEvent(event);
+        } else if (event.type === 'reload_failed') {
+          console.warn(`Reloading module ${event.module} failed:`, event.error);
+        }
+      });
+    },
+
+    async onCorpusEvent(event: CorpusEvent) {
+      const known = this.moduleGenerations;
+      this.moduleGenerations = event.modules;
+      // The first event of a stream is the current state; compare it with what we know
+      if (!known) return;
+      const changed = Object.keys(event.modules).filter(name => known[name] !== event.modules[name]);
+      const removed = Object.keys(known).filter(name => !(name in event.modules));
+      if (!changed.length && !removed.length) return;
+
+      const stale = (id: string) => [...changed, ...removed].some(name => id.startsWith(`${name}::`));
+      const keep = <T>(entries: Record<string, T>) =>
+        Object.fromEntries(Object.entries(entries).filter(([id]) => !stale(id)));
+      this.nodeCache = keep(this.nodeCache);
+      // A shorthand may now resolve into another module
+      this.resolvedTargets = {};
+      this.nodeChildren = keep(this.nodeChildren);
+      this.nodeChildrenInfo = keep(this.nodeChildrenInfo);
+
+      await this.loadModules();
+      const current = this.navigation.currentNode;
+      if (current && stale(current.node_id)) {
+        await this.loadCurrentNode();
+      }
+    },
+
     // Module actions
     async loadModules() {
       this.modules.loading = true;
@@ -159,6 +208,7 @@ export const useAppStore = defineStore('app', {
         if (response.success) {
           this.navigation.currentNode = response.data;
           this.navigation.breadcrumb = response.metadata?.breadcrumb || [];
+          this.prefetchLinkTargets(response.data);
 
           // Fetch full history metadata
           const histRes = await api.getHistory();
@@ -213,23 +263,24 @@ export const useAppStore = defineStore('app', {
     async loadNodeChildren(nodeId: string) {
       console.log(`[Store] Loading children for: ${nodeId}`);
       try {
-        // 1. Get raw ID list
-        const idResponse = await api.getChildren(nodeId);
-        if (idResponse.success) {
-          console.log(`[Store] IDs received for ${nodeId}:`, idResponse.data);
+        // Raw ID list and detailed previews for tree rendering in one round trip
+        const response = await api.batchNodes([
+          { node_id: nodeId, op: 'children' },
+          { node_id: nodeId, op: 'preview_children' }
+        ]);
+        const [idResult, previewResult] = response.data;
+        if (idResult?.success) {
+          console.log(`[Store] IDs received for ${nodeId}:`, idResult.data);
           this.nodeChildren = {
             ...this.nodeChildren,
-            [nodeId]: idResponse.data
+            [nodeId]: idResult.data
           };
         }
-
-        // 2. Get detailed preview for tree rendering
-        const previewResponse = await api.previewChildren(nodeId);
-        if (previewResponse.success) {
-          console.log(`[Store] Previews received for ${nodeId}:`, previewResponse.data);
+        if (previewResult?.success) {
+          console.log(`[Store] Previews received for ${nodeId}:`, previewResult.data);
           this.nodeChildrenInfo = {
             ...this.nodeChildrenInfo,
-            [nodeId]: previewResponse.data
+            [nodeId]: previewResult.data
           };
         }
       } catch (error) {
@@ -242,19 +293,22 @@ export const useAppStore = defineStore('app', {
 
       this.navigation.loading = true;
       try {
-        // 1. Resolve target to full node ID first
-        const resolveRes = await api.resolveNodeId(target);
-        if (!resolveRes.success) {
-          throw new Error(resolveRes.error || 'Failed to resolve ID');
-        }
+        // 1. Resolve target to full node ID first (links of the last page are resolved already)
+        let targetId = this.resolvedTargets[target];
+        if (!targetId) {
+          const resolveRes = await api.resolveNodeId(target);
+          if (!resolveRes.success) {
+            throw new Error(resolveRes.error || 'Failed to resolve ID');
+          }
 
-        if (resolveRes.data.candidates && resolveRes.data.candidates.length > 1) {
-          throw new Error(`Ambiguous ID: ${target}. Found ${resolveRes.data.candidates.length} candidates.`);
-        }
+          if (resolveRes.data.candidates && resolveRes.data.candidates.length > 1) {
+            throw new Error(`Ambiguous ID: ${target}. Found ${resolveRes.data.candidates.length} candidates.`);
+          }
 
-        const targetId = resolveRes.data.node_id || resolveRes.data.id;
-        if (!targetId) {
-          throw new Error(`Could not resolve ID: ${target}`);
+          targetId = resolveRes.data.node_id || resolveRes.data.id || '';
+          if (!targetId) {
+            throw new Error(`Could not resolve ID: ${target}`);
+          }
         }
 
         // Use resolved ID for cache lookup
@@ -306,6 +360,7 @@ export const useAppStore = defineStore('app', {
             }
           };
 
+          this.prefetchLinkTargets(updatedNode);
           if (updatedNode.type === 'section' && updatedNode.has_children) {
             await this.loadNodeChildren(updatedNode.node_id);
           }
@@ -384,6 +439,26 @@ export const useAppStore = defineStore('app', {
       this.navigation.expandedNodes = newExpandedNodes;
     },
 
+    // Resolve every link of a page in one request so following one skips /nodes/resolve
+    async prefetchLinkTargets(node: any) {
+      const targets = [
+        ...(node.inline_links || []).map((link: any) => link.target_id),
+        ...(node.see_also || []).map((link: any) => link.node_id)
+      ].filter((target: string) => target && !(target in this.resolvedTargets));
+      if (!targets.length) return;
+      try {
+        const response = await api.resolveNodeIds([...new Set<string>(targets)]);
+        if (!response.success) return;
+        const resolved: Record<string, string> = {};
+        for (const item of response.data) {
+          if (item.success && item.data?.node_id) resolved[item.target] = item.data.node_id;
+        }
+        this.resolvedTargets = { ...this.resolvedTargets, ...resolved };
+      } catch (error) {
+        console.warn('Failed to resolve link targets:', error);
+      }
+    },
+
     async performSearch(query: string, scope: 'all' | 'content' | 'title' | 'label' = 'all') {
       this.search.query = query;
       this.search.scope = scope;
@@ -400,6 +475,7 @@ export const useAppStore = defineStore('app', {
         );
         if (response.success) {
           this.search.results = response.data;
+          this.loadSearchPaths();
         }
       } catch (error) {
         console.error('Search failed:', error);
@@ -409,9 +485,34 @@ export const useAppStore = defineStore('app', {
       }
     },
 
+    // Ancestor paths of all results in one request
+    async loadSearchPaths() {
+      const ids = this.search.results.map(result => result.node_id);
+      this.searchPaths = {};
+      if (!ids.length) return;
+      try {
+        const response = await api.getAncestry(ids);
+        if (!response.success) return;
+        const paths: Record<string, string> = {};
+        for (const entry of response.data) {
+          if (!entry) continue;
+          // Without the virtual root and the node itself
+          paths[entry.node_id] = entry.breadcrumb
+            .slice(0, -1)
+            .filter(item => item.id !== '::ROOT')
+            .map(item => item.label)
+            .join(' / ');
+        }
+        this.searchPaths = paths;
+      } catch (error) {
+        console.warn('Failed to load search result paths:', error);
+      }
+    },
+
     clearSearch() {
       this.search.query = '';
       this.search.results = [];
+      this.searchPaths = {};
     }
   }
 });
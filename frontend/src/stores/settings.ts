@@ -2,6 +2,8 @@ import { defineStore } from 'pinia'
 import { ref, computed } from 'vue'
 import { api } from '@/api/client'
 
+const SWITCH_POLL_MS = 500
+
 export const useSettingsStore = defineStore('settings', () => {
   const keragHome = ref('')
   const keragLocal = ref('')
@@ -52,6 +54,15 @@ export const useSettingsStore = defineStore('settings', () => {
       })
 
       if (response.success) {
+        // The new knowledge base is built in the background; wait for the swap
+        let status = response.data
+        while (status && status.state !== 'done' && status.state !== 'failed') {
+          await new Promise(resolve => setTimeout(resolve, SWITCH_POLL_MS))
+          status = (await api.getSettingsStatus()).data
+        }
+        if (status?.state === 'failed') {
+          throw new Error(status.error || 'Failed to apply settings')
+        }
         isModalOpen.value = false
         window.location.reload()
       } else {
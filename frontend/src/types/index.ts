@@ -32,6 +32,73 @@ export interface NodeDetail extends NodeInfo {
   formatted_content?: FormattedContent;
 }
 
+// Columnar module hierarchy: node i has children child_index[child_offsets[i]..child_offsets[i+1]]
+export interface ModuleSkeleton {
+  module: string;
+  depth: number;
+  count: number;
+  total: number;
+  id_prefix: string;
+  ids: string[];
+  labels: string[];
+  titles: Array<string | null>;
+  type_names: string[];
+  types: number[];
+  parent: number[];
+  has_children: number[];
+  child_offsets: number[];
+  child_index: number[];
+}
+
+export interface ModuleJob {
+  id: string;
+  action: 'load' | 'unload';
+  modules: string[];
+  state: 'queued' | 'running' | 'done' | 'failed';
+  progress: {
+    modules_total: number;
+    modules_done: number;
+    files_total: number;
+    files_parsed: number;
+    nodes_built: number;
+  };
+  elapsed: number;
+  created_at: number;
+  finished_at: number | null;
+  errors: Record<string, string>;
+  results: Record<string, any>;
+}
+
+export interface SettingsSwitch {
+  id: string;
+  state: 'pending' | 'building' | 'warming' | 'swapping' | 'draining' | 'done' | 'failed';
+  settings: Record<string, string>;
+  error: string | null;
+  started_at: number;
+  finished_at: number | null;
+  phase_seconds: Record<string, number>;
+  modules: string[];
+  draining_calls: number;
+}
+
+// Events from /api/events
+export interface CorpusEvent {
+  type: 'corpus';
+  generation: number;
+  modules: Record<string, number>;
+  changed: string[];
+  removed: string[];
+}
+
+export interface ReloadEvent {
+  type: 'reloading' | 'reload_failed';
+  module: string;
+  files?: string[];
+  error?: string;
+}
+
+export type ServerEvent = CorpusEvent | ReloadEvent;
+
 export interface BreadcrumbItem {
   id: string;
   label: string;
@@ -56,6 +123,20 @@ export interface SearchResult {
   type: string;
   file_id?: string;
   excerpt?: string;
+  module?: string;
+  content_preview?: string;
+  score?: number;
+  highlights?: Array<{ field: 'title' | 'label' | 'content'; start: number; end: number }>;
+}
+
+export interface Suggestion {
+  node_id: string;
+  label: string;
+  title?: string;
+  type: string;
+  module: string;
+  match: 'label' | 'title' | 'id';
+  fuzzy: boolean;
 }
 
 // Store Types